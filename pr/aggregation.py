@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import metrics
+import storage
+import user_cache
+
+# Dashboard aggregates come from two places:
+# - Rollups (mood counts and value sums per day/week/month, goal status counts) that storage keeps up to
+#   date in the same transaction as each write. Reading them costs the same however long the history is.
+# - A vectorized path over a user's MoodSeries columns for ad-hoc date ranges the rollups don't cover.
+# Results are memoized in user_cache, so they're only re-read after the user's data changes.
+
+PERIODS = ("day", "week", "month")
+GOAL_STATUSES = ["Completed", "In Progress", "To Do", "Cancelled"]
+
+
+# --- Rollup reads ---
+def mood_distribution(username, period="day"):
+    """Returns mood counts per bucket (rows, oldest first) and mood label (columns), from the rollups."""
+    return user_cache.derived(username, f"mood_distribution:{period}", lambda: _read_distribution(username, period))
+
+
+@metrics.timed("aggregation.read_distribution")
+def _read_distribution(username, period):
+    rows = storage.get_connection().execute(
+        "SELECT bucket, mood_text, count FROM mood_rollups WHERE username = ? AND period = ? ORDER BY bucket",
+        (username, period)
+    ).fetchall()
+    df = pd.DataFrame([tuple(r) for r in rows], columns=["Bucket", "Mood", "Count"])
+    if df.empty:
+        return pd.DataFrame()
+    distribution = df.pivot(index="Bucket", columns="Mood", values="Count").fillna(0).astype(int)
+    distribution.index = pd.to_datetime(distribution.index)
+    return distribution
+
+
+def mean_mood(username, period="day"):
+    """Returns the mean mood value per bucket (oldest first), from the rollups."""
+    return user_cache.derived(username, f"mean_mood:{period}", lambda: _read_mean(username, period))
+
+
+@metrics.timed("aggregation.read_mean")
+def _read_mean(username, period):
+    rows = storage.get_connection().execute(
+        "SELECT bucket, SUM(value_sum) / SUM(value_count) FROM mood_rollups "
+        "WHERE username = ? AND period = ? GROUP BY bucket HAVING SUM(value_count) > 0 ORDER BY bucket",
+        (username, period)
+    ).fetchall()
+    return pd.Series([r[1] for r in rows], index=pd.to_datetime([r[0] for r in rows]), name="Mean Mood", dtype=float)
+
+
+def goal_status_counts(username):
+    """Returns {status: count} for the user's goals, from the maintained counters (statuses with 0 omitted)."""
+    def read():
+        rows = storage.get_connection().execute(
+            "SELECT status, count FROM goal_status_counts WHERE username = ? AND count > 0", (username,)
+        ).fetchall()
+        return {r["status"]: r["count"] for r in rows}
+    return user_cache.derived(username, "goal_status_counts", read)
+
+
+# --- Vectorized path for ad-hoc ranges ---
+@metrics.timed("aggregation.series_frame")
+def series_frame(series, lo=0, hi=None):
+    """Returns positions lo..hi-1 of a MoodSeries as a DataFrame (Datetime, Mood Value, Mood), without per-entry Python work."""
+    hi = len(series) if hi is None else hi
+    codes = np.frombuffer(series.codes, dtype=np.int16)[lo:hi]
+    label_texts = np.array([label for label, _, _ in series.labels], dtype=object)
+    label_values = np.array([value for _, _, value in series.labels], dtype=float)
+    return pd.DataFrame({
+        "Datetime": pd.to_datetime(np.frombuffer(series.timestamps, dtype=np.int64)[lo:hi], unit="us"),
+        "Mood Value": label_values[codes],
+        "Mood": label_texts[codes]
+    })
+
+
+def _buckets(datetimes, period):
+    """Maps a Series of datetimes to the start of their day, week (Monday) or month."""
+    days = datetimes.dt.floor("D")
+    if period == "week":
+        return days - pd.to_timedelta(days.dt.weekday, unit="D")
+    if period == "month":
+        return days.dt.to_period("M").dt.start_time
+    return days
+
+
+@metrics.timed("aggregation.range_distribution")
+def range_distribution(frame, period="day"):
+    """Returns mood counts per bucket and label for a frame from series_frame()."""
+    if frame.empty:
+        return pd.DataFrame()
+    return pd.crosstab(_buckets(frame["Datetime"], period).rename("Bucket"), frame["Mood"])
+
+
+@metrics.timed("aggregation.range_mean")
+def range_mean(frame, period="day"):
+    """Returns the mean mood value per bucket for a frame from series_frame()."""
+    if frame.empty:
+        return pd.Series(dtype=float, name="Mean Mood")
+    return frame.groupby(_buckets(frame["Datetime"], period))["Mood Value"].mean().rename("Mean Mood")
@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from urllib.parse import urlsplit, parse_qs
+import credentials
+import metrics
+from services import MoodService, JournalService, GoalService
+from services.batch import ValidationError, MAX_PAGE
+from services.goals import SORT_OPTIONS
+from goal_repository import STATUSES
+
+# A JSON HTTP API next to the Streamlit app, for integrations that log moods, journal entries and goals
+# in bulk. It is a separate entry point over the same database and services:
+#   python api.py [--host 127.0.0.1] [--port 8080]
+#   curl -X POST localhost:8080/api/login -d '{"username": "amy", "password": "..."}'      -> {"token": ...}
+#   curl -X POST localhost:8080/api/moods -H "Authorization: Bearer <token>" \
+#        -d '{"entries": [{"mood_text": "Calm", "description": "Long walk", "timestamp": "2024-06-01T08:30:00"}]}'
+#   curl "localhost:8080/api/moods?limit=50" -H "Authorization: Bearer <token>"            -> {"items", "next_cursor"}
+# Connections are served by an asyncio event loop (the standard library's, so nothing else is needed to
+# run it locally); the database and password work runs on a small thread pool so it never blocks the loop.
+# Each batch is validated as a whole and then written in a single transaction: all of it is saved or none.
+# Every request is timed as an "api.request" metrics span (with its method, path and status; see metrics.py),
+# and unexpected errors are logged with their traceback through the "api" logger.
+
+WORKERS = int(os.environ.get("SOULSYNC_API_WORKERS", "8"))
+MAX_BODY = 8 * 1024 * 1024 # Largest request body accepted, in bytes
+MAX_LINE = 16 * 1024 # Longest request line or header line accepted, in bytes
+MAX_HEADERS = 100 # Most header lines accepted per request
+READ_TIMEOUT = 30 # Seconds to wait for the rest of a request (and between requests on a kept-alive connection)
+DEFAULT_PAGE = 50
+
+_STATUS_TEXT = {
+    200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error"
+}
+
+log = logging.getLogger("api")
+
+
+class HTTPError(Exception):
+    """Ends a request with the given status and a JSON {"error": message} body."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Session(NamedTuple):
+    username: str # None on routes that don't require a session
+    token: str
+
+
+# --- Routes: handler(session, query, body) -> (status, JSON-serializable result), run on the thread pool ---
+ROUTES = {} # (method, path) -> (handler, requires a session)
+
+
+def route(method, path, auth=True):
+    def register(handler):
+        ROUTES[(method, path)] = (handler, auth)
+        return handler
+    return register
+
+
+def _limit(query):
+    try:
+        return max(1, min(int(query.get("limit", DEFAULT_PAGE)), MAX_PAGE))
+    except ValueError:
+        raise HTTPError(400, "limit must be a number.") from None
+
+
+def _entries(body, key="entries"):
+    if key not in body:
+        raise HTTPError(400, f"Expected a JSON object with an '{key}' list.")
+    return body[key]
+
+
+@route("GET", "/api/health", auth=False)
+def health(session, query, body):
+    return 200, {"status": "ok"}
+
+
+@route("POST", "/api/login", auth=False)
+def login(session, query, body):
+    token = credentials.login(str(body.get("username", "")).strip().lower(), str(body.get("password", "")))
+    if token is None:
+        raise HTTPError(401, "Invalid username or password.")
+    return 200, {"token": token, "expires_in": int(credentials.SESSION_TTL)}
+
+
+@route("POST", "/api/logout")
+def logout(session, query, body):
+    credentials.logout(session.token)
+    return 200, {"status": "logged out"}
+
+
+@route("POST", "/api/moods")
+def add_moods(session, query, body):
+    seqs = MoodService(session.username).add_many(_entries(body))
+    return 201, {"created": len(seqs), "seqs": seqs}
+
+
+@route("GET", "/api/moods")
+def list_moods(session, query, body):
+    page = MoodService(session.username).history_page(_limit(query), query.get("cursor"))
+    return 200, page._asdict()
+
+
+@route("POST", "/api/journals")
+def add_journals(session, query, body):
+    seqs = JournalService(session.username).add_many(_entries(body))
+    return 201, {"created": len(seqs), "seqs": seqs}
+
+
+@route("GET", "/api/journals")
+def list_journals(session, query, body):
+    page = JournalService(session.username).history_page(_limit(query), query.get("cursor"))
+    return 200, page._asdict()
+
+
+@route("POST", "/api/goals")
+def add_goals(session, query, body):
+    goals = GoalService(session.username).add_many(_entries(body, "goals"))
+    return 201, {"created": len(goals), "goals": goals}
+
+
+@route("GET", "/api/goals")
+def list_goals(session, query, body):
+    statuses = [s for s in query.get("status", "").split(",") if s] or list(STATUSES)
+    sort_by = query.get("sort", "None")
+    if sort_by not in SORT_OPTIONS:
+        raise HTTPError(400, f"sort must be one of: {', '.join(SORT_OPTIONS)}.")
+    try:
+        offset = max(0, int(query.get("offset", 0)))
+    except ValueError:
+        raise HTTPError(400, "offset must be a number.") from None
+    goals = GoalService(session.username).list(statuses, sort_by)
+    return 200, {"items": goals[offset:offset + _limit(query)], "total": len(goals)}
+
+
+# --- HTTP plumbing ---
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="soulsync-api")
+
+
+def _call(handler, needs_auth, headers, query, body):
+    """Authenticates the request and runs its handler (on a worker thread). Returns (status, result)."""
+    session = Session(None, None)
+    if needs_auth:
+        authorization = headers.get("authorization", "")
+        token = authorization[len("Bearer "):].strip() if authorization.startswith("Bearer ") else None
+        session = Session(credentials.session_user(token), token)
+        if session.username is None:
+            raise HTTPError(401, "Log in first (POST /api/login) and send 'Authorization: Bearer <token>'.")
+    with metrics.span(f"api.{handler.__name__}"):
+        return handler(session, query, body)
+
+
+async def _dispatch(method, target, headers, raw_body):
+    """Routes one request. Returns (status, JSON-serializable body)."""
+    url = urlsplit(target)
+    path = url.path.rstrip("/") or "/"
+    entry = ROUTES.get((method, path))
+    try:
+        if entry is None:
+            if any(p == path for _, p in ROUTES):
+                raise HTTPError(405, f"{method} is not supported on {path}.")
+            raise HTTPError(404, f"No such endpoint: {path}")
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPError(400, "The request body must be JSON.") from None
+        if not isinstance(body, dict):
+            raise HTTPError(400, "The request body must be a JSON object.")
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        handler, needs_auth = entry
+        return await asyncio.get_running_loop().run_in_executor(_executor, _call, handler, needs_auth, headers, query, body)
+    except HTTPError as e:
+        return e.status, {"error": str(e)}
+    except ValidationError as e:
+        return 422, {"error": str(e), "errors": e.errors}
+    except ValueError as e: # e.g. a malformed cursor
+        return 400, {"error": str(e)}
+    except Exception:
+        log.exception("Error handling %s %s", method, path)
+        return 500, {"error": "Internal server error."}
+
+
+def _response(status, result, keep_alive):
+    payload = json.dumps(result).encode()
+    head = (
+        f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + payload
+
+
+async def _read_line(reader):
+    """Reads one line of the request head; one longer than MAX_LINE ends the request with a 431."""
+    try:
+        return await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+    except ValueError: # The stream's limit (MAX_LINE) was reached without a line ending
+        raise HTTPError(431, f"Request and header lines are limited to {MAX_LINE} bytes.") from None
+
+
+async def _read_request(reader):
+    """Reads one request. Returns (method, target, version, headers, body), None at end of stream."""
+    request_line = await _read_line(reader)
+    if not request_line.strip():
+        return None
+    parts = request_line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise HTTPError(400, "Malformed request line.")
+    headers = {}
+    for _ in range(MAX_HEADERS + 1):
+        line = await _read_line(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HTTPError(431, f"Requests are limited to {MAX_HEADERS} headers.")
+    if "transfer-encoding" in headers:
+        raise HTTPError(411, "Send the body with a Content-Length.")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length.") from None
+    if length > MAX_BODY:
+        raise HTTPError(413, f"Request bodies are limited to {MAX_BODY} bytes.")
+    body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b""
+    return parts[0].upper(), parts[1], parts[2], headers, body
+
+
+async def _serve_connection(reader, writer):
+    """Serves requests on one connection until the client closes it (HTTP/1.1 keep-alive)."""
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except HTTPError as e: # Can't trust the rest of the stream; answer and hang up
+                writer.write(_response(e.status, {"error": str(e)}, keep_alive=False))
+                await writer.drain()
+                break
+            if request is None:
+                break
+            method, target, version, headers, body = request
+            with metrics.span("api.request", method=method, path=urlsplit(target).path) as span:
+                status, result = await _dispatch(method, target, headers, body)
+                span.set(status=str(status), ok=status < 500)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(_response(status, result, keep_alive))
+                await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+        pass # Idle, truncated or dropped connections are just closed
+    finally:
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=8080):
+    server = await asyncio.start_server(_serve_connection, host, port, limit=MAX_LINE)
+    print(f"SoulSync API on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the SoulSync JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
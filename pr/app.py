@@ -1,11 +1,21 @@
 import streamlit as st
 import os # Import the os module
 from auth import login_or_register
+import credentials
+import metrics
 from modules.goals import goal_page     # Updated import path
 from modules.mood import mood_page      # Updated import path
 from modules.journal import journal_page # Updated import path
 from modules.dashboard import dashboard_page # Updated import path
 from modules.chatbot import chatbot_page # Import the new chatbot_page
+from modules.performance import performance_page
+from services import GoalService
+
+@st.cache_resource
+def load_css(css_file_path):
+    """Reads the stylesheet once per process; every rerun after that reuses the text."""
+    with open(css_file_path) as f:
+        return f.read()
 
 def main():
     """Main function to run the SoulSync application."""
@@ -14,8 +24,7 @@ def main():
     # os.path.join constructs a path safely across different operating systems
     css_file_path = os.path.join(os.path.dirname(__file__), "assets", "style.css")
     try:
-        with open(css_file_path) as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+        st.markdown(f"<style>{load_css(css_file_path)}</style>", unsafe_allow_html=True)
     except FileNotFoundError:
         st.error(f"Error: style.css not found at {css_file_path}. Please ensure it's in the 'assets' folder.")
 
@@ -29,6 +38,8 @@ def main():
         st.session_state.current_page = "Chatbot" # Changed default page to Chatbot
 
     user = st.session_state.logged_in_user
+    if user is not None and credentials.session_user(st.session_state.get("session_token")) != user:
+        user = st.session_state.logged_in_user = None # Session expired, ended elsewhere, or the server restarted
 
     if user is None:
         # If not logged in, show login/register page
@@ -40,36 +51,51 @@ def main():
     else:
         # If logged in, show the main application pages
         st.sidebar.write(f"Logged in as: **{user}**")
+
+        # Goal reminders on every page: binary searches over the cached record's due-date index
+        overdue_goals, due_soon_goals = GoalService(user).reminders()
+        if overdue_goals:
+            st.sidebar.warning(f"⏰ {len(overdue_goals)} goal(s) overdue: " + ", ".join(g.get("title", "Unnamed Goal") for g in overdue_goals[:3]))
+        if due_soon_goals:
+            st.sidebar.info(f"📅 {len(due_soon_goals)} goal(s) due in the next 7 days")
         
         # Sidebar navigation
+        pages = ["Chatbot", "Goals", "Mood Tracker", "Journal", "Visual Dashboard", "Reflection Mode"] # Added Chatbot to navigation
+        if credentials.is_admin(user):
+            pages.append("Performance") # Span timings, for the users listed in SOULSYNC_ADMINS
         app_menu = st.sidebar.radio(
             "Navigation",
-            ["Chatbot", "Goals", "Mood Tracker", "Journal", "Visual Dashboard", "Reflection Mode"], # Added Chatbot to navigation
-            index=["Chatbot", "Goals", "Mood Tracker", "Journal", "Visual Dashboard", "Reflection Mode"].index(st.session_state.current_page)
+            pages,
+            index=pages.index(st.session_state.current_page) if st.session_state.current_page in pages else 0
         )
         st.session_state.current_page = app_menu # Update current page in session state
 
         if st.sidebar.button("Logout"):
+            credentials.logout(st.session_state.get("session_token"))
             st.session_state.logged_in_user = None
+            st.session_state.session_token = None
             st.session_state.login_menu = "Login" # Reset menu to login
             st.session_state.current_page = "Chatbot" # Reset page on logout
             st.rerun() # Rerun to go back to login page
         
-        # Display the selected page
-        if st.session_state.current_page == "Chatbot": # New Chatbot page
-            chatbot_page(user)
-        elif st.session_state.current_page == "Goals":
-            goal_page(user)
-        elif st.session_state.current_page == "Mood Tracker":
-            mood_page(user)
-        elif st.session_state.current_page == "Journal":
-            journal_page(user)
-        elif st.session_state.current_page == "Visual Dashboard":
-            dashboard_page(user)
-        elif st.session_state.current_page == "Reflection Mode": # Placeholder for Reflection Mode
-            st.header("🔄 Reflection Mode (Coming Soon!)")
-            st.info("This feature will summarize your emotions, achievements, and stressors like a journal at the end of the week.")
-            st.markdown("*(Future features could include AI-driven summaries and insights based on your mood and journal entries.)*")
+        # Display the selected page, timed as one span per page (when metrics are on)
+        with metrics.span("page." + st.session_state.current_page.lower().replace(" ", "_")):
+            if st.session_state.current_page == "Chatbot": # New Chatbot page
+                chatbot_page(user)
+            elif st.session_state.current_page == "Goals":
+                goal_page(user)
+            elif st.session_state.current_page == "Mood Tracker":
+                mood_page(user)
+            elif st.session_state.current_page == "Journal":
+                journal_page(user)
+            elif st.session_state.current_page == "Visual Dashboard":
+                dashboard_page(user)
+            elif st.session_state.current_page == "Reflection Mode": # Placeholder for Reflection Mode
+                st.header("🔄 Reflection Mode (Coming Soon!)")
+                st.info("This feature will summarize your emotions, achievements, and stressors like a journal at the end of the week.")
+                st.markdown("*(Future features could include AI-driven summaries and insights based on your mood and journal entries.)*")
+            elif st.session_state.current_page == "Performance":
+                performance_page(user)
 
 
 if __name__ == "__main__":
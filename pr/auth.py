@@ -1,38 +1,32 @@
 import streamlit as st
-import json
-import os
+import credentials
+import storage
+import user_cache
 
-USER_DATA_FILE = "users.json"
+def load_user(username):
+    """
+    Loads one user's data (goals, moods, journals; chat lives in chat_history). Returns {} for unknown users.
+    Served from the process-wide cache, so reruns that changed nothing don't hit the database.
+    """
+    return user_cache.get_user(username) or {}
+
+def save_user(username, user_data):
+    """Saves one user's data atomically without touching any other user."""
+    storage.replace_user(username, user_data)
+    user_cache.invalidate(username)
 
 def load_users():
-    """Loads user data from the JSON file."""
-    if os.path.exists(USER_DATA_FILE):
-        with open(USER_DATA_FILE, "r") as file:
-            try:
-                users = json.load(file)
-                # Ensure each user has 'goals', 'moods', and 'journals' keys
-                for user_data in users.values():
-                    if "goals" not in user_data:
-                        user_data["goals"] = []
-                    if "moods" not in user_data:
-                        user_data["moods"] = []
-                    if "journals" not in user_data: # Add journals initialization
-                        user_data["journals"] = []
-                return users
-            except json.JSONDecodeError:
-                return {}
-    return {}
+    """Loads every user's data from the database (users.json shape). Prefer load_user() for one user."""
+    return storage.load_all_users()
 
 def save_users(users):
-    """Saves user data to the JSON file."""
-    with open(USER_DATA_FILE, "w") as file:
-        json.dump(users, file, indent=4)
+    """Saves a users.json-shaped dict back to the database in a single transaction."""
+    storage.replace_all_users(users)
+    user_cache.invalidate()
 
 def login_or_register():
     """Handles user login and registration."""
     st.title("🔐 SoulSync Login")
-    users = load_users()
-
     # Use session state to manage the current view (Login/Register)
     if "login_menu" not in st.session_state:
         st.session_state.login_menu = "Login"
@@ -50,10 +44,12 @@ def login_or_register():
         password = st.text_input("Password", type="password", key="login_password").strip()
 
         if st.button("Login", key="login_button"):
-            if username in users and users[username]["password"] == password:
+            token = credentials.login(username, password) # Reads only the user's credentials row
+            if token:
                 st.success(f"Welcome back, {username}!")
                 user = username
                 st.session_state.logged_in_user = username # Store logged-in user in session state
+                st.session_state.session_token = token # Checked on each rerun instead of the password
             else:
                 st.error("Invalid username or password.")
 
@@ -64,17 +60,9 @@ def login_or_register():
         email = st.text_input("Email", key="register_email").strip()
 
         if st.button("Register", key="register_button"):
-            if new_username in users:
+            if not credentials.register(new_username, new_password, email):
                 st.warning("Username already exists.")
             else:
-                users[new_username] = {
-                    "password": new_password,
-                    "email": email,
-                    "goals": [], # Initialize an empty list for goals for new users
-                    "moods": [],  # Initialize an empty list for moods for new users
-                    "journals": [] # Initialize an empty list for journal entries for new users
-                }
-                save_users(users)
                 st.success("Account created! Please log in.")
                 st.session_state.login_menu = "Login" # Switch to login after registration
                 st.rerun() # Rerun to show login form
@@ -0,0 +1,325 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Synthetic-load benchmarks for the data layer, run headless through the services:
+#   python bench.py run [--users N] [--moods N] [--journals N] [--goals N] [--chat N] [--rounds N]
+#                       [--save-baseline] [--fail-on-regression]
+#   python bench.py generate users.json [scale flags]     (writes the dataset as a users.json file)
+# A run generates users.json-shaped users at the requested scale, loads them into a fresh database in a
+# temporary directory, then times the services' write methods, user loading and the full dashboard
+# view. If Streamlit is installed it also reruns app.py's pages headless (streamlit.testing's AppTest) as a
+# logged-in user and reports the server CPU time per rerun, i.e. what one interaction costs. Results
+# (latency percentiles, throughput, peak traced memory) are compared with the baseline stored in
+# BASELINES_FILE for the same scale, so a storage or caching change comes with numbers.
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baselines.json")
+REGRESSION_THRESHOLD = 1.25 # A p50 or p95 this many times the baseline's is reported as a regression
+SAMPLE_USERS = 50 # Benchmarks pick their users from this many, so caches see realistic reuse
+MEMORY_ROUNDS = 5 # Calls repeated under tracemalloc (which slows them down) to find peak memory
+PAGE_USERS = 5 # Users (each with one open app session per page) the page rerun benchmarks cycle through
+PAGES = ("Mood Tracker", "Journal", "Goals", "Visual Dashboard")
+SEED = 1234
+
+_WORDS = (
+    "work sleep friends family exercise walk tired anxious happy deadline meeting coffee rain sunshine "
+    "project exam study music dinner run yoga stress calm grateful lonely weekend phone reading garden "
+    "headache doctor therapy partner argument laugh movie cooking budget travel train late early"
+).split()
+_GOAL_STATUSES = ("To Do", "In Progress", "Completed", "Cancelled")
+
+
+# --- Synthetic data ---
+def _sentence(rng, words):
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_user(rng, moods, journals, goals, chat, password_hash, today=None):
+    """Returns one users.json-shaped record with the given numbers of entries, spread over the past days."""
+    from records import MOOD_EMOJIS
+    today = today or datetime.datetime(2024, 6, 30, 21, 0)
+    days = max(moods, journals, 1) // 2 + 1 # About two entries a day
+    labels = list(MOOD_EMOJIS)
+
+    def timestamp(i, count):
+        moment = today - datetime.timedelta(days=days * (count - i) / count, minutes=rng.randrange(600))
+        return moment.isoformat(timespec="seconds")
+
+    mood_entries = []
+    for i in range(moods):
+        label = rng.choice(labels)
+        mood_entries.append({
+            "timestamp": timestamp(i, moods), "mood_text": label, "mood_emoji": MOOD_EMOJIS[label],
+            "description": _sentence(rng, rng.randrange(4, 12)) if rng.random() < 0.6 else ""
+        })
+    journal_entries = []
+    for i in range(journals):
+        ts = timestamp(i, journals)
+        journal_entries.append({
+            "timestamp": ts, "date": ts[:10],
+            "content": " ".join(_sentence(rng, rng.randrange(6, 16)) for _ in range(rng.randrange(2, 8)))
+        })
+    goal_entries = [{
+        "id": f"goal-{i}", "title": _sentence(rng, 3), "description": _sentence(rng, 10),
+        "due_date": (today.date() + datetime.timedelta(days=rng.randrange(-60, 90))).isoformat() if rng.random() < 0.7 else None,
+        "status": rng.choice(_GOAL_STATUSES)
+    } for i in range(goals)]
+    chat_history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": _sentence(rng, rng.randrange(5, 30))}
+        for i in range(chat)
+    ]
+    return {
+        "password": password_hash, "email": "synthetic@example.com",
+        "goals": goal_entries, "moods": mood_entries, "journals": journal_entries, "chat_history": chat_history
+    }
+
+
+def synthetic_users(scale, seed=SEED):
+    """Yields (username, record) pairs lazily, so even 100k users are never all in memory at once."""
+    import passwords
+    rng = random.Random(seed)
+    password_hash = passwords.hash_password("password", log_n=10) # One cheap hash shared by every user
+    for i in range(scale["users"]):
+        yield f"user{i:06d}", synthetic_user(rng, scale["moods"], scale["journals"], scale["goals"], scale["chat"], password_hash)
+
+
+def write_users_json(path, scale):
+    """Streams a synthetic dataset to a users.json file. Returns the number of users written."""
+    count = 0
+    with open(path, "w") as file:
+        file.write("{")
+        for username, user_data in synthetic_users(scale):
+            file.write(("," if count else "") + f"\n{json.dumps(username)}: {json.dumps(user_data)}")
+            count += 1
+        file.write("\n}\n")
+    return count
+
+
+# --- Measuring ---
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))]
+
+
+def measure(fn, rounds, args_for, clock=time.perf_counter):
+    """
+    Calls fn(*args_for(i)) `rounds` times. Returns latency percentiles (ms), throughput and peak memory (KiB).
+    With clock=time.process_time the "latencies" are the CPU time the process spent per call instead.
+    """
+    latencies = []
+    for i in range(rounds):
+        args = args_for(i)
+        call_started = clock()
+        fn(*args)
+        latencies.append(clock() - call_started)
+    elapsed = sum(latencies) # Time inside fn only, not preparing its arguments
+    latencies.sort()
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for i in range(min(rounds, MEMORY_ROUNDS)):
+            args = args_for(rounds + i)
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            fn(*args)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "rounds": rounds,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "ops_per_s": round(rounds / elapsed, 1) if elapsed else None,
+        "peak_kib": round(peak / 1024, 1)
+    }
+
+
+# --- The benchmarks ---
+def _benchmarks(usernames, rounds):
+    """Returns [(name, fn, rounds, args_for)] for the functions under test. Imported here, after the DB is chosen."""
+    import storage
+    import user_cache
+    from services import MoodService, JournalService, GoalService, DashboardService
+
+    rng = random.Random(SEED + 1)
+    pick = lambda i: usernames[i % len(usernames)]
+
+    def load_user_cold(username):
+        user_cache.invalidate(username) # Measure the database load, not a cache hit
+        return user_cache.get_user(username)
+
+    def some_goal(i):
+        username = pick(i)
+        goals = GoalService(username).goals()
+        goal_id = goals[i % len(goals)]["id"] if goals else "missing"
+        return (username, goal_id, _sentence(rng, 3), _sentence(rng, 10), None, rng.choice(_GOAL_STATUSES))
+
+    return [
+        ("MoodService.add", lambda u, *a: MoodService(u).add(*a), rounds,
+         lambda i: (pick(i), "Happy", "😀", _sentence(rng, 8))),
+        ("JournalService.add", lambda u, *a: JournalService(u).add(*a), rounds,
+         lambda i: (pick(i), " ".join(_sentence(rng, 12) for _ in range(4)))),
+        ("GoalService.add", lambda u, *a: GoalService(u).add(*a), rounds,
+         lambda i: (pick(i), _sentence(rng, 3), _sentence(rng, 10), datetime.date(2024, 7, 1 + i % 28), "To Do")),
+        ("GoalService.update", lambda u, *a: GoalService(u).update(*a), rounds, some_goal),
+        ("load_user (cold)", load_user_cold, rounds, lambda i: (pick(i),)),
+        ("load_user (cached)", user_cache.get_user, rounds, lambda i: (pick(i),)),
+        ("DashboardService.view (warm)", lambda u: DashboardService(u).view(), rounds, lambda i: (pick(i),)),
+        ("load_users (whole store)", storage.load_all_users, max(1, rounds // 20), lambda i: ())
+    ]
+
+
+def _page_benchmarks(usernames, rounds):
+    """
+    Returns [(name, fn, rounds, args_for, clock)] that rerun each page of app.py for a logged-in user, timed in
+    process CPU time (the app script runs on a thread of this process). Empty if Streamlit isn't installed.
+    """
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return []
+    import credentials
+    app_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    sessions = {}
+
+    def session(username, page):
+        """An app session showing `page`, already run once (the first run of a session isn't an interaction)."""
+        app = sessions.get((username, page))
+        if app is None:
+            app = AppTest.from_file(app_file, default_timeout=60)
+            app.session_state["logged_in_user"] = username
+            app.session_state["session_token"] = credentials.login(username, "password")
+            app.session_state["current_page"] = page
+            app.run()
+            sessions[(username, page)] = app
+        return app
+
+    page_users = usernames[:PAGE_USERS]
+    return [
+        (f"rerun {page} (cpu)", lambda app: app.run(), max(1, rounds // 10),
+         lambda i, page=page: (session(page_users[i % len(page_users)], page),), time.process_time)
+        for page in PAGES
+    ]
+
+
+def run(scale, rounds, keep_db=None):
+    """Builds the dataset in a fresh database and runs every benchmark. Returns {name: result}."""
+    directory = tempfile.mkdtemp(prefix="soulsync-bench-")
+    os.environ["SOULSYNC_DB"] = keep_db or os.path.join(directory, "bench.db")
+    os.environ.setdefault("SOULSYNC_COMPACT_INTERVAL", "0") # Checkpoints would only add noise
+    os.chdir(directory) # Keeps the legacy users.json importer from picking up a real file
+    import storage
+
+    started = time.perf_counter()
+    count = storage.import_users(synthetic_users(scale))
+    print(f"Loaded {count} synthetic user(s) in {time.perf_counter() - started:.1f}s into {os.environ['SOULSYNC_DB']}")
+
+    usernames = storage.list_usernames()[:SAMPLE_USERS]
+    benchmarks = [b + (time.perf_counter,) for b in _benchmarks(usernames, rounds)] + _page_benchmarks(usernames, rounds)
+    # Warm up: the first dashboard view per user fills lazily built indexes and caches
+    from services import DashboardService
+    for username in usernames:
+        DashboardService(username).view()
+
+    results = {}
+    for name, fn, bench_rounds, args_for, clock in benchmarks:
+        results[name] = measure(fn, bench_rounds, args_for, clock)
+        print(f"  {name:<30} {_format(results[name])}")
+    print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+    return results
+
+
+def _format(result):
+    return (f"p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  p99 {result['p99_ms']:9.3f} ms  "
+            f"{result['ops_per_s']:9.1f} ops/s  peak {result['peak_kib']:9.1f} KiB")
+
+
+# --- Baselines ---
+def scale_key(scale):
+    return "users={users} moods={moods} journals={journals} goals={goals} chat={chat}".format(**scale)
+
+
+def load_baselines():
+    try:
+        with open(BASELINES_FILE) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(scale, results):
+    baselines = load_baselines()
+    baselines[scale_key(scale)] = {
+        "recorded": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "results": results
+    }
+    with open(BASELINES_FILE, "w") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def compare(scale, results):
+    """Prints each benchmark's change against the stored baseline. Returns the names that regressed."""
+    baseline = load_baselines().get(scale_key(scale))
+    if baseline is None:
+        print("No baseline stored for this scale (use --save-baseline to record one).")
+        return []
+    print(f"Compared with the baseline from {baseline['recorded']}:")
+    regressed = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        ratios = [result[k] / before[k] for k in ("p50_ms", "p95_ms") if before[k]]
+        worst = max(ratios, default=1.0)
+        flag = "  REGRESSION" if worst > REGRESSION_THRESHOLD else ""
+        if flag:
+            regressed.append(name)
+        print(f"  {name:<30} p50 {result['p50_ms'] / before['p50_ms'] if before['p50_ms'] else 0:5.2f}x  "
+              f"p95 {result['p95_ms'] / before['p95_ms'] if before['p95_ms'] else 0:5.2f}x{flag}")
+    return regressed
+
+
+def _add_scale_arguments(parser):
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--moods", type=int, default=500, help="mood entries per user")
+    parser.add_argument("--journals", type=int, default=200, help="journal entries per user")
+    parser.add_argument("--goals", type=int, default=20, help="goals per user")
+    parser.add_argument("--chat", type=int, default=200, help="chat messages per user")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the data layer against synthetic users.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="load a synthetic dataset and time the data-layer functions")
+    _add_scale_arguments(run_parser)
+    run_parser.add_argument("--rounds", type=int, default=200, help="calls per benchmark")
+    run_parser.add_argument("--db", default=None, help="build the dataset in this database file instead of a temporary one")
+    run_parser.add_argument("--save-baseline", action="store_true", help=f"record the results in {os.path.basename(BASELINES_FILE)}")
+    run_parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 if any benchmark regressed")
+    generate_parser = commands.add_parser("generate", help="write a synthetic users.json file")
+    generate_parser.add_argument("path")
+    _add_scale_arguments(generate_parser)
+    args = parser.parse_args()
+
+    scale = {k: getattr(args, k) for k in ("users", "moods", "journals", "goals", "chat")}
+    if args.command == "generate":
+        print(f"Wrote {write_users_json(args.path, scale)} user(s) to {args.path}.")
+        sys.exit(0)
+    bench_results = run(scale, args.rounds, os.path.abspath(args.db) if args.db else None)
+    regressions = compare(scale, bench_results)
+    if args.save_baseline:
+        save_baseline(scale, bench_results)
+        print(f"Baseline saved to {BASELINES_FILE}.")
+    sys.exit(1 if regressions and args.fail_on_regression else 0)
@@ -0,0 +1,139 @@
+import datetime
+import json
+import llm
+import storage
+
+# Chat history, stored apart from the record the other pages load so a long conversation doesn't make
+# them any slower. Only the most recent messages are kept verbatim, as a ring buffer of about
+# RECENT_MESSAGES. Once FOLD_BATCH more have piled up, the oldest FOLD_BATCH are folded into a short
+# summary and deleted. Summaries beyond MAX_SUMMARIES are merged pairwise, oldest first. Storage per user
+# stays bounded, and the page only renders the messages the user pages back to.
+
+RECENT_MESSAGES = 40
+FOLD_BATCH = 20
+MAX_SUMMARIES = 6
+PAGE_SIZE = 10 # Messages shown per page in the chatbot
+SUMMARY_MODEL = "llama3-8b-8192"
+SUMMARY_CHARS = 800 # Longest summary kept
+
+_SUMMARY_PROMPT = (
+    "Summarize this part of a conversation between a user and SoulSync, their wellness assistant, in at most "
+    "five sentences. Keep what the user shared about themselves, how they felt, and any suggestions given. "
+    "Write in the third person about 'the user'."
+)
+
+
+def _message_from_row(row):
+    return {"seq": row["seq"], "role": row["role"], "content": json.loads(row["content"])}
+
+
+def message_count(username):
+    """Returns how many messages are kept verbatim for the user."""
+    row = storage.get_connection().execute(
+        "SELECT COUNT(*) FROM chat_history WHERE username = ?", (username,)
+    ).fetchone()
+    return row[0]
+
+
+def recent_messages(username, limit):
+    """Returns the user's last `limit` messages ({"seq", "role", "content"}), oldest first."""
+    rows = storage.get_connection().execute(
+        "SELECT seq, role, content FROM chat_history WHERE username = ? ORDER BY seq DESC LIMIT ?", (username, limit)
+    ).fetchall()
+    return [_message_from_row(r) for r in reversed(rows)]
+
+
+def summaries(username):
+    """Returns the summaries of the user's older conversation ({"content", "message_count", "created"}), oldest first."""
+    rows = storage.get_connection().execute(
+        "SELECT content, message_count, created FROM chat_summaries WHERE username = ? ORDER BY seq", (username,)
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def latest_summary(username):
+    """Returns the text of the most recent summary, or None."""
+    row = storage.get_connection().execute(
+        "SELECT content FROM chat_summaries WHERE username = ? ORDER BY seq DESC LIMIT 1", (username,)
+    ).fetchone()
+    return row["content"] if row else None
+
+
+def append_turn(username, messages):
+    """Stores a completed turn ({"role", "content"} dicts), then folds old messages into a summary if due."""
+    storage.append_chat_messages(username, messages)
+    fold_if_due(username)
+
+
+def _summarize(text):
+    """Summarizes conversation text with the LLM, falling back to a plain excerpt if it's unavailable."""
+    try:
+        summary = "".join(llm.stream_chat(
+            [{"role": "system", "content": _SUMMARY_PROMPT}, {"role": "user", "content": text}],
+            model=SUMMARY_MODEL, temperature=0.3, max_tokens=200
+        )).strip()
+    except llm.LLMError:
+        summary = ""
+    if not summary:
+        questions = [line[len("user: "):] for line in text.splitlines() if line.startswith("user: ")]
+        summary = "The user asked about: " + "; ".join(q[:80] for q in questions) if questions else text
+    return summary[:SUMMARY_CHARS]
+
+
+def _transcript(messages):
+    return "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+
+
+def fold_if_due(username):
+    """Folds the oldest FOLD_BATCH messages into a summary once the buffer is FOLD_BATCH over its size."""
+    if message_count(username) < RECENT_MESSAGES + FOLD_BATCH:
+        return False
+    oldest = storage.get_connection().execute(
+        "SELECT seq, role, content FROM chat_history WHERE username = ? ORDER BY seq LIMIT ?", (username, FOLD_BATCH)
+    ).fetchall()
+    oldest = [_message_from_row(r) for r in oldest]
+    summary = _summarize(_transcript(oldest)) # Outside the transaction: this may take a few seconds
+
+    with storage.transaction() as conn:
+        still_there = conn.execute(
+            "SELECT COUNT(*) FROM chat_history WHERE username = ? AND seq BETWEEN ? AND ?",
+            (username, oldest[0]["seq"], oldest[-1]["seq"])
+        ).fetchone()[0]
+        if still_there != len(oldest):
+            return False # Another session folded these first; keep theirs
+        conn.execute(
+            "DELETE FROM chat_history WHERE username = ? AND seq BETWEEN ? AND ?",
+            (username, oldest[0]["seq"], oldest[-1]["seq"])
+        )
+        conn.execute(
+            "INSERT INTO chat_summaries (username, content, message_count, created) VALUES (?, ?, ?, ?)",
+            (username, summary, len(oldest), datetime.datetime.now().isoformat(timespec="seconds"))
+        )
+    _merge_oldest_summaries(username)
+    return True
+
+
+def _merge_oldest_summaries(username):
+    """Merges the two oldest summaries if there are more than MAX_SUMMARIES."""
+    conn = storage.get_connection()
+    rows = conn.execute(
+        "SELECT seq, content, message_count, created FROM chat_summaries WHERE username = ? ORDER BY seq LIMIT 2",
+        (username,)
+    ).fetchall()
+    count = conn.execute("SELECT COUNT(*) FROM chat_summaries WHERE username = ?", (username,)).fetchone()[0]
+    if count <= MAX_SUMMARIES:
+        return
+    merged = _summarize("\n\n".join(r["content"] for r in rows))
+    with storage.transaction() as conn:
+        still_there = conn.execute(
+            "SELECT COUNT(*) FROM chat_summaries WHERE username = ? AND seq IN (?, ?)",
+            (username, rows[0]["seq"], rows[1]["seq"])
+        ).fetchone()[0]
+        if still_there != 2:
+            return # Another session merged these first
+        # The merged summary takes the older one's place so the order stays chronological
+        conn.execute("DELETE FROM chat_summaries WHERE seq = ?", (rows[1]["seq"],))
+        conn.execute(
+            "UPDATE chat_summaries SET content = ?, message_count = ? WHERE seq = ?",
+            (merged, rows[0]["message_count"] + rows[1]["message_count"], rows[0]["seq"])
+        )
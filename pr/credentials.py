@@ -0,0 +1,95 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+import passwords
+import storage
+
+# Logins and sessions. Checking a password reads only the user's row in the credentials table (never
+# their goals, moods or journals) and costs one deliberately slow scrypt hash (see passwords.py). A
+# successful login returns a session token; later reruns and requests present the token and are checked
+# against the in-process session cache below with a dict lookup, instead of hashing the password again.
+
+SESSION_TTL = float(os.environ.get("SOULSYNC_SESSION_TTL", str(12 * 3600))) # Seconds a session stays valid
+MAX_SESSIONS = 10000 # Oldest sessions are dropped beyond this
+ADMINS = frozenset(u.strip().lower() for u in os.environ.get("SOULSYNC_ADMINS", "").split(",") if u.strip()) # e.g. "amy,sam"
+
+_lock = threading.Lock()
+_sessions = OrderedDict() # token -> (username, expires at), least recently used first
+_dummy_hash = None
+
+
+def _unknown_user_hash():
+    """A hash to verify against for unknown usernames, so they take as long to reject as wrong passwords."""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = passwords.hash_password(secrets.token_urlsafe(16))
+    return _dummy_hash
+
+
+def check_password(username, password):
+    """True if the password is the user's. Hashes made at an older cost are upgraded on success."""
+    stored = storage.get_password_hash(username)
+    if not passwords.verify_password(password, stored or _unknown_user_hash()) or stored is None:
+        return False
+    if passwords.needs_rehash(stored):
+        storage.set_password_hash(username, passwords.hash_password(password))
+    return True
+
+
+def register(username, password, email):
+    """Creates an account. Returns False if the username is already taken."""
+    return storage.create_user(username, passwords.hash_password(password), email)
+
+
+def change_password(username, new_password):
+    """Stores a new password and ends the user's other sessions."""
+    storage.set_password_hash(username, passwords.hash_password(new_password))
+    end_sessions(username)
+
+
+def is_admin(username):
+    """True for the users listed in SOULSYNC_ADMINS, who can see the Performance page."""
+    return username in ADMINS
+
+
+# --- Verified sessions ---
+def login(username, password):
+    """Checks the password and starts a session. Returns the session token, or None if the login failed."""
+    if not check_password(username, password):
+        return None
+    token = secrets.token_urlsafe(32)
+    with _lock:
+        _sessions[token] = (username, time.monotonic() + SESSION_TTL)
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+    return token
+
+
+def session_user(token):
+    """Returns the username a session token belongs to, or None if it is unknown or expired."""
+    if not token:
+        return None
+    with _lock:
+        session = _sessions.get(token)
+        if session is None:
+            return None
+        if session[1] < time.monotonic():
+            del _sessions[token]
+            return None
+        _sessions.move_to_end(token)
+        return session[0]
+
+
+def logout(token):
+    """Ends one session."""
+    with _lock:
+        _sessions.pop(token, None)
+
+
+def end_sessions(username):
+    """Ends every session of one user (e.g. after a password change)."""
+    with _lock:
+        for token in [t for t, (user, _) in _sessions.items() if user == username]:
+            del _sessions[token]
@@ -0,0 +1,78 @@
+import bisect
+import datetime
+
+STATUSES = ("To Do", "In Progress", "Completed", "Cancelled") # Also the order used by "Sort by Status"
+OPEN_STATUSES = ("To Do", "In Progress")
+
+
+class GoalRepository:
+    """
+    One user's goals (the stored dicts, in creation order) with the lookups the pages need built once,
+    when the record is loaded: an id index, per-status lists and a due-date ordered index.
+
+    Lookups by id are O(1), status counts are precomputed, sorting by due date walks the ordered index
+    instead of sorting, and overdue/upcoming queries are a binary search. Indexing, iteration and len()
+    behave like the plain list of goal dicts it replaces. It is read-only: write through storage.
+    """
+
+    def __init__(self, goals=()):
+        self._goals = list(goals)
+        self._by_id = {goal.get("id"): goal for goal in self._goals}
+        self._by_status = {}
+        for goal in self._goals:
+            self._by_status.setdefault(goal.get("status"), []).append(goal)
+        # sorted() is stable, so goals due the same day keep their creation order
+        self._dated = sorted((g for g in self._goals if g.get("due_date")), key=lambda g: g["due_date"])
+        self._due_dates = [g["due_date"] for g in self._dated] # ISO dates sort correctly as strings
+        self._undated = [g for g in self._goals if not g.get("due_date")]
+
+    def __len__(self):
+        return len(self._goals)
+
+    def __iter__(self):
+        return iter(self._goals)
+
+    def __getitem__(self, index):
+        return self._goals[index]
+
+    def get(self, goal_id):
+        """Returns the goal with this id, or None."""
+        return self._by_id.get(goal_id)
+
+    def status_counts(self):
+        """Returns {status: count} for the statuses in use."""
+        return {status: len(goals) for status, goals in self._by_status.items()}
+
+    def with_status(self, statuses):
+        """Returns the goals with any of the given statuses, in creation order."""
+        wanted = set(statuses)
+        return [goal for goal in self._goals if goal.get("status") in wanted]
+
+    def by_status(self, statuses=STATUSES):
+        """Returns the goals with the given statuses grouped in STATUSES order (then any others), creation order within each."""
+        wanted = set(statuses)
+        order = [s for s in STATUSES if s in wanted] + [s for s in self._by_status if s in wanted and s not in STATUSES]
+        return [goal for status in order for goal in self._by_status.get(status, [])]
+
+    def by_due_date(self, statuses=None, descending=False):
+        """Returns goals (optionally only some statuses) by due date, soonest or latest first; undated goals last."""
+        dated = reversed(self._dated) if descending else self._dated
+        if statuses is None:
+            return list(dated) + self._undated
+        wanted = set(statuses)
+        return [g for g in dated if g.get("status") in wanted] + [g for g in self._undated if g.get("status") in wanted]
+
+    def overdue(self, today=None, statuses=OPEN_STATUSES):
+        """Returns open goals due before today, oldest due date first."""
+        today = (today or datetime.date.today()).isoformat()
+        end = bisect.bisect_left(self._due_dates, today)
+        wanted = set(statuses)
+        return [g for g in self._dated[:end] if g.get("status") in wanted]
+
+    def due_within(self, days, today=None, statuses=OPEN_STATUSES):
+        """Returns open goals due from today through the next `days` days, soonest first."""
+        today = today or datetime.date.today()
+        start = bisect.bisect_left(self._due_dates, today.isoformat())
+        end = bisect.bisect_right(self._due_dates, (today + datetime.timedelta(days=days)).isoformat())
+        wanted = set(statuses)
+        return [g for g in self._dated[start:end] if g.get("status") in wanted]
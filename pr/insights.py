@@ -0,0 +1,251 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+import llm
+import metrics
+import storage
+import textproc
+
+# Journal insights for the dashboard, precomputed offline so a page view only reads one row:
+#   python insights.py [--workers N] [--summarize] [--force]
+# Each user is processed in a worker process. Their journals and moods are streamed from the database
+# in chunks, and each chunk is folded into running aggregates (keyword counts, per-word mood sums,
+# per-mood note word counts) with vectorized pandas operations and then dropped, so memory depends on the
+# vocabulary rather than on how much was written. The resulting document is saved
+# as soon as that user is done. The saved document records the user's data
+# version, so a rerun (nightly, or after an interrupted run) only processes users whose data changed
+# since their last document, or who don't have one yet.
+
+INSIGHTS_VERSION = 1 # Bump when the document's contents change, so every user is recomputed
+CHUNK_ROWS = 2000 # Rows fetched and folded in at a time (smaller chunks cost more in per-chunk pandas overhead)
+TOP_KEYWORDS = 15
+TRIGGER_WORDS = 5 # Words listed as triggers / boosters
+MIN_TRIGGER_DAYS = 3 # A word must appear on at least this many days with moods logged to count
+NOTE_KEYWORDS = 5 # Words listed per mood label from mood descriptions
+SUMMARY_MODEL = "llama3-8b-8192"
+
+
+# --- Reading (used by the dashboard) ---
+def load_insights(username):
+    """Returns the user's latest insight document (a dict), or None if none was generated yet."""
+    row = storage.get_connection().execute(
+        "SELECT document FROM insights WHERE username = ? AND insights_version = ?", (username, INSIGHTS_VERSION)
+    ).fetchone()
+    return json.loads(row["document"]) if row else None
+
+
+# --- Computing ---
+def _read_chunks(conn, sql, params, columns):
+    """Yields a query's rows as DataFrames of at most CHUNK_ROWS rows."""
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            return
+        yield pd.DataFrame([tuple(r) for r in rows], columns=columns)
+
+
+def _journal_chunks(conn, username):
+    """
+    Yields the user's journal entries (date, content) in day order, about CHUNK_ROWS at a time. A day is never
+    split across two chunks, so each chunk's word/day pairs can be folded in without checking earlier ones.
+    """
+    carry = None # The last day of the previous chunk, which may continue in the next
+    for journals in _read_chunks(
+        conn, "SELECT json_extract(data, '$.date'), json_extract(data, '$.content') FROM journals "
+        "WHERE username = ? AND timestamp IS NOT NULL ORDER BY timestamp, seq", (username,), ["date", "content"]
+    ):
+        journals = journals.dropna(subset=["date"])
+        if carry is not None:
+            journals = pd.concat([carry, journals], ignore_index=True)
+        if journals.empty:
+            continue
+        on_last_day = journals["date"] == journals["date"].iloc[-1]
+        carry = journals[on_last_day]
+        if not on_last_day.all():
+            yield journals[~on_last_day].reset_index(drop=True)
+    if carry is not None:
+        yield carry.reset_index(drop=True)
+
+
+def _add_counts(total, counts):
+    """Adds one chunk's counts into a running total (None before the first chunk)."""
+    return counts if total is None else total.add(counts, fill_value=0)
+
+
+def _top(counts, n=None):
+    """The n largest counts (all of them if n is None), largest first and ties in index order."""
+    ranked = counts.sort_index().sort_values(ascending=False, kind="stable")
+    return ranked if n is None else ranked.head(n)
+
+
+def _daily_means(conn, username):
+    """Returns the mean mood value per day ('YYYY-MM-DD' index), from the rollups."""
+    rows = conn.execute(
+        "SELECT bucket, SUM(value_sum) / SUM(value_count) FROM mood_rollups "
+        "WHERE username = ? AND period = 'day' GROUP BY bucket HAVING SUM(value_count) > 0",
+        (username,)
+    ).fetchall()
+    return pd.Series({r[0]: r[1] for r in rows}, dtype=float)
+
+
+def _round(value):
+    return None if pd.isna(value) else round(float(value), 2)
+
+
+@metrics.timed("insights.compute")
+def compute_insights(username):
+    """Computes the insight document for one user. Returns (user_version it reflects, document)."""
+    conn = storage.get_connection()
+    user_version = storage.get_user_version(username) # Read first: a write during the run leaves the result stale
+    daily = _daily_means(conn, username)
+    baseline = daily.mean() if len(daily) else float("nan")
+
+    journal_count = 0
+    keyword_counts = None # How many entries mention each word
+    term_moods = None # Per word: the sum and number of the daily mean moods of the days it was written on
+    journal_dates = set()
+    for journals in _journal_chunks(conn, username):
+        journal_count += len(journals)
+        journal_dates.update(journals["date"].unique())
+        tokens = textproc.tokenize_series(journals["content"])
+        entry_terms = pd.DataFrame({"entry": tokens.index, "term": tokens.values}).drop_duplicates()
+        keyword_counts = _add_counts(keyword_counts, entry_terms["term"].value_counts())
+        term_days = pd.DataFrame({
+            "term": entry_terms["term"].values,
+            "date": journals["date"].to_numpy()[entry_terms["entry"].to_numpy(dtype=int)]
+        }).drop_duplicates()
+        term_days["mood"] = term_days["date"].map(daily)
+        term_moods = _add_counts(term_moods, term_days.dropna(subset=["mood"]).groupby("term")["mood"].agg(["sum", "count"]))
+
+    # Triggers and boosters: words written about on days whose mean mood is furthest below/above the baseline
+    if term_moods is None:
+        term_moods = pd.DataFrame({"sum": [], "count": []}, dtype=float)
+    by_term = pd.DataFrame({"mean": term_moods["sum"] / term_moods["count"], "count": term_moods["count"]})
+    by_term = by_term[by_term["count"] >= MIN_TRIGGER_DAYS]
+    triggers = by_term[by_term["mean"] < baseline].sort_values(["mean", "count"], ascending=[True, False]).head(TRIGGER_WORDS)
+    boosters = by_term[by_term["mean"] > baseline].sort_values(["mean", "count"], ascending=[False, False]).head(TRIGGER_WORDS)
+
+    # Mood on days with and without a journal entry
+    journal_days = daily.index.isin(list(journal_dates))
+
+    # What each mood's descriptions mention most
+    note_counts = None # (mood, word) -> mentions
+    for notes in _read_chunks(
+        conn, "SELECT json_extract(data, '$.mood_text'), json_extract(data, '$.description') FROM moods "
+        "WHERE username = ? AND timestamp IS NOT NULL AND COALESCE(json_extract(data, '$.description'), '') != ''",
+        (username,), ["mood", "description"]
+    ):
+        note_tokens = textproc.tokenize_series(notes["description"])
+        note_terms = pd.DataFrame({"mood": notes["mood"].to_numpy()[note_tokens.index.to_numpy(dtype=int)], "term": note_tokens.values})
+        note_counts = _add_counts(note_counts, note_terms.groupby(["mood", "term"]).size())
+    note_keywords = {}
+    if note_counts is not None:
+        for mood, term in _top(note_counts, None).groupby(level="mood").head(NOTE_KEYWORDS).index:
+            note_keywords.setdefault(mood, []).append(term)
+        note_keywords = dict(sorted(note_keywords.items()))
+    keyword_counts = pd.Series(dtype=float) if keyword_counts is None else _top(keyword_counts, TOP_KEYWORDS)
+
+    document = {
+        "generated": datetime.datetime.now().isoformat(timespec="seconds"),
+        "journal_entries": journal_count,
+        "days_with_moods": len(daily),
+        "mood_baseline": _round(baseline),
+        "top_keywords": [[term, int(count)] for term, count in keyword_counts.items()],
+        "triggers": [{"word": t, "mean_mood": _round(r["mean"]), "days": int(r["count"])} for t, r in triggers.iterrows()],
+        "boosters": [{"word": t, "mean_mood": _round(r["mean"]), "days": int(r["count"])} for t, r in boosters.iterrows()],
+        "mood_on_journal_days": _round(daily[journal_days].mean()) if journal_days.any() else None,
+        "mood_on_other_days": _round(daily[~journal_days].mean()) if (~journal_days).any() else None,
+        "mood_note_keywords": note_keywords,
+        "summary": None
+    }
+    return user_version, document
+
+
+def _summarize(document):
+    """Asks the LLM for a short, gentle summary of the statistics. Returns None if it's unavailable."""
+    facts = {k: document[k] for k in ("mood_baseline", "top_keywords", "triggers", "boosters",
+                                      "mood_on_journal_days", "mood_on_other_days", "mood_note_keywords")}
+    prompt = [
+        {"role": "system", "content": (
+            "You are SoulSync, a warm wellness assistant. In two or three sentences, tell the user what their "
+            "journal and mood statistics suggest (mood values are 1-5). Be gentle and don't diagnose."
+        )},
+        {"role": "user", "content": json.dumps(facts)}
+    ]
+    try:
+        return "".join(llm.stream_chat(prompt, model=SUMMARY_MODEL, temperature=0.5, max_tokens=160)).strip() or None
+    except llm.LLMError:
+        return None
+
+
+def _save(username, user_version, document):
+    with storage.transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO insights (username, user_version, insights_version, generated, document) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (username, user_version, INSIGHTS_VERSION, document["generated"], json.dumps(document))
+        )
+
+
+def process_user(username, summarize=False):
+    """Computes and saves one user's insights (runs in a worker process). Returns the username."""
+    user_version, document = compute_insights(username)
+    if summarize and document["journal_entries"]:
+        document["summary"] = _summarize(document)
+    _save(username, user_version, document)
+    return username
+
+
+# --- Batch run ---
+def pending_users(force=False):
+    """Returns the users whose insights are missing, outdated, or (with force) everyone."""
+    rows = storage.get_connection().execute(
+        "SELECT u.username FROM users u "
+        "LEFT JOIN user_versions v ON v.username = u.username "
+        "LEFT JOIN insights i ON i.username = u.username "
+        "WHERE ? OR i.username IS NULL OR i.insights_version != ? OR i.user_version != COALESCE(v.version, 0) "
+        "ORDER BY u.username",
+        (force, INSIGHTS_VERSION)
+    ).fetchall()
+    return [r["username"] for r in rows]
+
+
+def run(workers=None, summarize=False, force=False):
+    """Processes every pending user across a pool of worker processes. Returns (done, failed) counts."""
+    usernames = pending_users(force)
+    if not usernames:
+        print("All insights are up to date.")
+        return 0, 0
+    workers = workers or os.cpu_count() or 1
+    print(f"Generating insights for {len(usernames)} user(s) with {workers} worker(s)...")
+    started = time.perf_counter()
+    done = failed = 0
+    # Spawned, not forked: a forked child would inherit this process's open SQLite connection
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(process_user, username, summarize): username for username in usernames}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                done += 1
+            except Exception as e: # One user's bad data shouldn't stop the others; they're retried next run
+                failed += 1
+                print(f"  {futures[future]}: failed ({e})", file=sys.stderr)
+    print(f"Done: {done} updated, {failed} failed in {time.perf_counter() - started:.1f}s.")
+    return done, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute journal insights for the dashboard.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU core)")
+    parser.add_argument("--summarize", action="store_true", help="add a short LLM-written summary per user")
+    parser.add_argument("--force", action="store_true", help="recompute every user, even if their data hasn't changed")
+    args = parser.parse_args()
+    _, failed_count = run(args.workers, args.summarize, args.force)
+    sys.exit(1 if failed_count else 0)
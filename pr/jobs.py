@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+# A process-wide pool of worker threads for slow work, mainly LLM calls. Pages submit a job and get its
+# id back straight away, so the Streamlit script run finishes in milliseconds; they then poll status()
+# (e.g. from an auto-refreshing st.fragment) and render the text streamed so far. Jobs keep running if
+# the user navigates away, and anything they persist (via on_complete) is saved either way.
+
+WORKERS = int(os.environ.get("SOULSYNC_JOB_WORKERS", "8"))
+FINISHED_TTL = 600 # Seconds a finished job's result stays available for polling
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobStatus(NamedTuple):
+    """A snapshot of a job: its text so far (all of it once done), and the error message if it failed."""
+    id: str
+    kind: str
+    status: str
+    text: str
+    error: str
+    first_chunk_seconds: float # Time from start to the first chunk (time to first token), or None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+
+_lock = threading.Lock()
+_jobs = {} # job id -> dict with the fields of JobStatus plus bookkeeping
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="soulsync-job")
+        return _executor
+
+
+def _purge_finished():
+    """Drops finished jobs older than FINISHED_TTL. Called with _lock held."""
+    cutoff = time.monotonic() - FINISHED_TTL
+    for job_id in [j for j, job in _jobs.items() if job["status"] in FINISHED and job["finished_at"] < cutoff]:
+        del _jobs[job_id]
+
+
+def submit(kind, open_stream, on_complete=None):
+    """
+    Queues a job and returns its id. open_stream() is called on a worker thread and must return an
+    iterator of text chunks (e.g. a generator over an LLM stream). Once it is exhausted, on_complete(text)
+    is called with the full text, still on the worker thread, before the job is marked done.
+    """
+    job_id = uuid.uuid4().hex
+    with _lock:
+        _purge_finished()
+        _jobs[job_id] = {
+            "id": job_id, "kind": kind, "status": QUEUED, "chunks": [], "error": None,
+            "started_at": None, "first_chunk_seconds": None, "finished_at": None, "cancel": False
+        }
+    _get_executor().submit(_run, job_id, open_stream, on_complete)
+    return job_id
+
+
+def _finish(job, status, error=None):
+    with _lock:
+        job["status"], job["error"], job["finished_at"] = status, error, time.monotonic()
+
+
+def _run(job_id, open_stream, on_complete):
+    with _lock:
+        job = _jobs[job_id]
+        if job["cancel"]:
+            job["status"], job["finished_at"] = CANCELLED, time.monotonic()
+            return
+        job["status"], job["started_at"] = RUNNING, time.monotonic()
+    stream = None
+    try:
+        stream = open_stream()
+        for text in stream:
+            with _lock:
+                if job["first_chunk_seconds"] is None:
+                    job["first_chunk_seconds"] = time.monotonic() - job["started_at"]
+                job["chunks"].append(text)
+                cancelled = job["cancel"]
+            if cancelled:
+                _finish(job, CANCELLED)
+                return
+        if on_complete is not None:
+            on_complete("".join(job["chunks"]))
+        _finish(job, DONE)
+    except Exception as e:
+        _finish(job, FAILED, str(e))
+    finally:
+        if stream is not None and hasattr(stream, "close"):
+            stream.close() # Releases the LLM connection when a job is cancelled mid-stream
+
+
+def status(job_id):
+    """Returns a JobStatus snapshot, or None for unknown (or expired) job ids."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return JobStatus(
+            job["id"], job["kind"], job["status"], "".join(job["chunks"]), job["error"], job["first_chunk_seconds"]
+        )
+
+
+def cancel(job_id):
+    """Asks a job to stop. A queued job never starts; a running one stops at its next chunk."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None and job["status"] not in FINISHED:
+            job["cancel"] = True
+
+
+def stats():
+    """Returns the number of jobs in each state and the worker count."""
+    with _lock:
+        counts = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for job in _jobs.values():
+            counts[job["status"]] += 1
+    return dict(counts, workers=WORKERS)
@@ -0,0 +1,99 @@
+import json
+import pandas as pd
+import records
+import storage
+import textproc
+import user_cache
+
+# Per-entry text features of journal entries (sentiment, length, most frequent words and two-word
+# phrases), computed locally with textproc as each entry is saved. Dashboard aggregates such as
+# sentiment trends and recurring phrases are then SQL lookups over these rows instead of LLM calls.
+# Entries without features (older ones, or after a bulk import) are filled in the next time the user's
+# features are read.
+
+TERMS_PER_ENTRY = 20 # Most frequent words/phrases kept per entry
+NEGATIVE_BELOW = -0.2 # Entries scoring below this count as written on a hard day
+
+
+def extract(text):
+    """Returns (sentiment, word_count, {term: count}) for one entry's text."""
+    tokens = textproc.tokenize(text)
+    terms = dict(textproc.term_counts(tokens).most_common(TERMS_PER_ENTRY))
+    return textproc.sentiment(text), len(tokens), terms
+
+
+def _insert(conn, username, rows):
+    """Stores features for (seq, entry dict) pairs."""
+    values = []
+    for seq, entry in rows:
+        entry = records.normalize_journal(entry) or entry # Fills in 'date' for older shapes
+        score, word_count, terms = extract(entry.get("content") or "")
+        values.append((username, seq, entry.get("date"), score, word_count, json.dumps(terms)))
+    conn.executemany(
+        "INSERT OR REPLACE INTO journal_features (username, seq, date, sentiment, word_count, terms) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        values
+    )
+
+
+def record_entry(username, seq, entry):
+    """Stores the features of a just-saved journal entry (by its storage sequence number)."""
+    with storage.transaction() as conn:
+        _insert(conn, username, [(seq, entry)])
+
+
+def record_entries(conn, username, rows):
+    """Stores features for just-saved (seq, entry) pairs inside the caller's transaction (batch writes)."""
+    _insert(conn, username, rows)
+
+
+def _fill_missing(username):
+    """Computes features for any of the user's entries that don't have them yet."""
+    conn = storage.get_connection()
+    sql = (
+        "SELECT j.seq, j.data FROM journals j LEFT JOIN journal_features f ON f.username = j.username AND f.seq = j.seq "
+        "WHERE j.username = ? AND f.seq IS NULL"
+    )
+    if conn.execute(sql + " LIMIT 1", (username,)).fetchone() is None:
+        return
+    with storage.transaction() as conn:
+        missing = conn.execute(sql, (username,)).fetchall()
+        _insert(conn, username, [(r["seq"], json.loads(r["data"])) for r in missing])
+
+
+def sentiment_by_day(username):
+    """Returns a DataFrame indexed by day with the mean journal sentiment, its 7-entry-day average and entry count."""
+    def compute():
+        _fill_missing(username)
+        rows = storage.get_connection().execute(
+            "SELECT date, AVG(sentiment), COUNT(*) FROM journal_features WHERE username = ? AND date IS NOT NULL "
+            "GROUP BY date ORDER BY date",
+            (username,)
+        ).fetchall()
+        if not rows:
+            return pd.DataFrame()
+        daily = pd.Series([r[1] for r in rows], index=pd.to_datetime([r[0] for r in rows]))
+        return pd.DataFrame({
+            "Sentiment": daily,
+            "7-day Average": daily.rolling(7, min_periods=1).mean(),
+            "Entries": [r[2] for r in rows]
+        })
+    return user_cache.derived(username, "journal_sentiment_by_day", compute)
+
+
+def top_terms(username, k=10, negative_only=False):
+    """
+    Returns [(term, count)] for the words and phrases the user writes most, over all entries or only
+    those with a negative sentiment (a cheap list of possible triggers).
+    """
+    def compute():
+        _fill_missing(username)
+        where = "AND f.sentiment < ?" if negative_only else ""
+        params = (username, NEGATIVE_BELOW, k) if negative_only else (username, k)
+        rows = storage.get_connection().execute(
+            "SELECT t.key, SUM(t.value) AS total FROM journal_features f, json_each(f.terms) t "
+            f"WHERE f.username = ? {where} GROUP BY t.key ORDER BY total DESC, t.key LIMIT ?",
+            params
+        ).fetchall()
+        return [(r[0], r[1]) for r in rows]
+    return user_cache.derived(username, f"journal_top_terms:{k}:{negative_only}", compute)
@@ -0,0 +1,248 @@
+import json
+import os
+import random
+import threading
+import time
+import groq
+import httpx
+import metrics
+
+# One gateway for every call to the LLM API. The Groq client (and the HTTP connection pool inside it) is
+# created once per process and shared by all sessions, and each call goes through the same guards:
+# - at most MAX_CONCURRENT calls in flight across the process (extra callers wait up to QUEUE_TIMEOUT)
+# - a per-call timeout (for streams, the longest wait for the next chunk)
+# - retries with jittered exponential backoff on rate limits, timeouts, connection errors and 5xx
+# - a stream that breaks off mid-reply (an API error, or a timeout or dropped connection, which come straight
+#   from httpx rather than wrapped by the SDK) raises LLMUnavailable after the text already yielded
+# - a circuit breaker that fails fast for BREAKER_COOLDOWN seconds after BREAKER_THRESHOLD failed calls
+#   in a row, instead of making every user wait out the retries while the API is down
+#
+# Set GROQ_BASE_URL to point the gateway somewhere else, e.g. the local stub server in this module:
+#   python llm.py stub 8765   and   GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=test streamlit run app.py
+
+MAX_CONCURRENT = int(os.environ.get("SOULSYNC_LLM_CONCURRENCY", "4"))
+QUEUE_TIMEOUT = 30 # Seconds to wait for a free slot before giving up
+REQUEST_TIMEOUT = float(os.environ.get("SOULSYNC_LLM_TIMEOUT", "30"))
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5 # Seconds; attempt n waits a random time up to BACKOFF_BASE * 2**n
+BACKOFF_CAP = 8
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30
+
+_RETRYABLE = (groq.RateLimitError, groq.APIConnectionError, groq.InternalServerError) # APIConnectionError covers timeouts
+
+
+class LLMError(Exception):
+    """A call to the LLM failed; the message can be shown to the user."""
+
+
+class LLMNotConfigured(LLMError):
+    """No API key is set."""
+
+
+class LLMUnavailable(LLMError):
+    """The API is down, rate limited or busy after retries (or the circuit breaker is open)."""
+
+
+class _CircuitBreaker:
+    """Opens after `threshold` consecutive failures; after `cooldown` seconds lets one trial call through."""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.opened_at = time.monotonic() # Half-open: this caller tries, the others keep failing fast
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+_client = None
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+_breaker = _CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+
+
+def get_client():
+    """Returns the process-wide Groq client, creating it on first use."""
+    global _client
+    api_key = os.environ.get("GROQ_API_KEY")
+    if not api_key:
+        raise LLMNotConfigured("Please set the 'GROQ_API_KEY' environment variable. You can get one from console.groq.com.")
+    with _client_lock:
+        if _client is None:
+            _client = groq.Groq(
+                api_key=api_key,
+                base_url=os.environ.get("GROQ_BASE_URL") or None,
+                timeout=REQUEST_TIMEOUT,
+                max_retries=0 # Retries are done here, with jitter and the circuit breaker
+            )
+        return _client
+
+
+def _backoff_delay(attempt, error):
+    """Full-jitter exponential backoff, stretched to the server's Retry-After if it asks for longer."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(delay, min(BACKOFF_CAP, float(retry_after))) if retry_after else delay
+    except ValueError: # Retry-After can also be an HTTP date; fall back to our own delay
+        return delay
+
+
+def _open_stream(client, params, timeout):
+    """Starts a streamed completion, retrying transient failures. Raises LLMError when it can't."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return client.chat.completions.create(**params, stream=True, timeout=timeout)
+        except _RETRYABLE as e:
+            if attempt == MAX_RETRIES:
+                _breaker.record_failure()
+                raise LLMUnavailable(f"The AI service isn't responding right now ({e.__class__.__name__}).") from e
+            time.sleep(_backoff_delay(attempt, e))
+        except groq.APIStatusError as e: # Other 4xx: a bad key or request; retrying won't help
+            raise LLMError(f"The AI service rejected the request (HTTP {e.status_code}).") from e
+
+
+def stream_chat(messages, model, temperature=0.7, max_tokens=None, timeout=REQUEST_TIMEOUT):
+    """
+    Streams a chat completion, yielding text chunks as they arrive. Raises LLMError subclasses on failure.
+    Close the generator to abandon the call early; its connection and concurrency slot are released.
+    """
+    with metrics.span("llm.stream_chat", model=model) as span:
+        if metrics.ENABLED:
+            span.set(prompt_chars=sum(len(str(m.get("content", ""))) for m in messages))
+        yield from _stream_chat(messages, model, temperature, max_tokens, timeout, span)
+
+
+def _stream_chat(messages, model, temperature, max_tokens, timeout, span):
+    client = get_client()
+    if not _breaker.allow():
+        raise LLMUnavailable("The AI service is having trouble right now. Please try again in a little while.")
+    waited = time.perf_counter()
+    if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+        raise LLMUnavailable("The AI service is busy right now. Please try again in a moment.")
+    started = time.perf_counter()
+    stream = None
+    completion_chars = 0
+    try:
+        params = {"messages": messages, "model": model, "temperature": temperature}
+        if max_tokens is not None:
+            params["max_tokens"] = max_tokens
+        stream = _open_stream(client, params, timeout)
+        try:
+            for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None) # Groq reports usage on the last chunk
+                if usage is not None:
+                    span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                if text:
+                    if not completion_chars:
+                        span.set(first_chunk_ms=round((time.perf_counter() - started) * 1000, 3))
+                    completion_chars += len(text)
+                    yield text
+        except (groq.APIError, httpx.TransportError) as e: # Broke off mid-reply; too late to retry
+            _breaker.record_failure()
+            raise LLMUnavailable(f"The AI service stopped responding mid-reply ({e.__class__.__name__}).") from e
+        _breaker.record_success()
+    finally:
+        span.set(queue_ms=round((started - waited) * 1000, 3), completion_chars=completion_chars)
+        if stream is not None:
+            stream.close()
+        _slots.release()
+
+
+# --- Local stub of the chat-completions endpoint, for development and load tests ---
+def serve_stub(port=8765, chunk_delay=0.02, fail_every=0):
+    """
+    Serves a fake POST /openai/v1/chat/completions that echoes the last user message word by word.
+    With fail_every=n, every nth request gets a 429 so the backoff and breaker can be exercised.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    counter = {"requests": 0}
+    counter_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                return self._send_json(404, {"error": {"message": "Not found"}})
+            with counter_lock:
+                counter["requests"] += 1
+                failing = fail_every and counter["requests"] % fail_every == 0
+            if failing:
+                return self._send_json(429, {"error": {"message": "Rate limited (stub)", "type": "rate_limit"}})
+
+            user_messages = [m["content"] for m in request.get("messages", []) if m.get("role") == "user"]
+            words = f"Stub reply to: {user_messages[-1] if user_messages else ''}".split(" ")
+            base = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": request.get("model", "stub")}
+            if not request.get("stream"):
+                return self._send_json(200, dict(base, object="chat.completion", choices=[{
+                    "index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"
+                }]))
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send_event(data):
+                event = f"data: {data}\n\n".encode()
+                self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+                self.wfile.flush()
+
+            for i, word in enumerate(words):
+                delta = {"content": word if i == 0 else " " + word}
+                send_event(json.dumps(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])))
+                time.sleep(chunk_delay)
+            send_event(json.dumps(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])))
+            send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Stub chat-completions server on http://127.0.0.1:{port} (set GROQ_BASE_URL to this)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 2 and sys.argv[1] == "stub":
+        serve_stub(
+            port=int(sys.argv[2]) if len(sys.argv) > 2 else 8765,
+            fail_every=int(sys.argv[3]) if len(sys.argv) > 3 else 0
+        )
+    else:
+        print("Usage: python llm.py stub [port] [fail_every]")
+        sys.exit(1)
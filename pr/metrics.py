@@ -0,0 +1,210 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+# Timing spans around the hot paths (storage loads and saves, record parsing, aggregation, prompt building,
+# LLM calls, page renders and API handlers), written in batches as JSON lines to a local, size-rotated file:
+#   {"ts": 1718000000.123, "span": "llm.stream_chat", "ms": 812.4, "ok": true, "pid": 4242, "prompt_chars": 5120, ...}
+#   with metrics.span("prompt.build") as s:     # or @metrics.timed("aggregation.range_mean") on a function
+#       ...
+#       s.set(tokens=context.tokens)           # extra numbers are averaged per span in the report
+# Off unless SOULSYNC_METRICS=1. When off, span() returns one shared no-op object and timed() returns the
+# function unchanged, so instrumented code costs a flag check at most. Read the results on the admin-only
+# Performance page, or with:  python metrics.py report [--since MINUTES]
+
+ENABLED = os.environ.get("SOULSYNC_METRICS", "0").lower() not in ("", "0", "false", "no")
+METRICS_FILE = os.environ.get("SOULSYNC_METRICS_FILE", "metrics.jsonl")
+MAX_BYTES = int(os.environ.get("SOULSYNC_METRICS_MAX_BYTES", str(5 * 1024 * 1024))) # Rotated beyond this size
+BACKUP_COUNT = 3 # Rotated files kept (metrics.jsonl.1 ... .3), so at most 4 * MAX_BYTES on disk
+BUFFERED_RECORDS = 200 # Records are written in batches of this many (and at exit, or on flush())
+
+_lock = threading.Lock()
+_buffer = [] # Serialized records not yet written
+
+
+def _rotate():
+    """Shifts metrics.jsonl -> .1 -> .2 ..., dropping the oldest (the same scheme as logging's RotatingFileHandler)."""
+    for i in range(BACKUP_COUNT - 1, 0, -1):
+        if os.path.exists(f"{METRICS_FILE}.{i}"):
+            os.replace(f"{METRICS_FILE}.{i}", f"{METRICS_FILE}.{i + 1}")
+    os.replace(METRICS_FILE, f"{METRICS_FILE}.1")
+
+
+def _write_buffer():
+    """Appends the buffered records to the metrics file, rotating it first if they'd take it past MAX_BYTES."""
+    global _buffer
+    lines, _buffer = "".join(_buffer), []
+    try:
+        if os.path.getsize(METRICS_FILE) + len(lines) > MAX_BYTES:
+            _rotate()
+    except FileNotFoundError:
+        pass
+    with open(METRICS_FILE, "a", encoding="utf-8") as file:
+        file.write(lines)
+
+
+def _write(record):
+    line = json.dumps(record) + "\n"
+    with _lock:
+        _buffer.append(line)
+        if len(_buffer) >= BUFFERED_RECORDS: # Batched, so the hot paths don't pay for a file write per span
+            _write_buffer()
+
+
+def flush():
+    """Writes out the spans still buffered in this process (also done at exit)."""
+    with _lock:
+        if _buffer:
+            try:
+                _write_buffer()
+            except OSError:
+                pass
+
+
+atexit.register(flush)
+
+
+class _Span:
+    """Times a with-block and writes one record when it ends (also when it raises or, for generators, is closed)."""
+    __slots__ = ("name", "attrs", "started")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Attaches numbers (sizes, token counts) or labels to the span's record."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        failed = exc_type is not None and issubclass(exc_type, Exception) # Not st.rerun() or a closed generator
+        record = {"ts": round(time.time(), 3), "span": self.name,
+                  "ms": round((time.perf_counter() - self.started) * 1000, 3), "ok": not failed, "pid": os.getpid()}
+        if failed:
+            record["error"] = exc_type.__name__
+        record.update(self.attrs)
+        try:
+            _write(record)
+        except (OSError, TypeError, ValueError): # A full disk or an odd attribute must never break the app
+            pass
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **attrs):
+    """Returns a context manager that times its block as `name` (a shared no-op when metrics are off)."""
+    if not ENABLED:
+        return _NO_SPAN
+    return _Span(name, attrs)
+
+
+def timed(name):
+    """Decorator form of span(); with metrics off the function is returned as it is."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# --- Reading the metrics back ---
+def _files():
+    """The metrics file and its rotated copies, oldest first."""
+    paths = [f"{METRICS_FILE}.{i}" for i in range(BACKUP_COUNT, 0, -1)] + [METRICS_FILE]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def read_spans(since=None):
+    """Yields the span records kept on disk (optionally only those after the `since` epoch time), oldest first."""
+    for path in _files():
+        try:
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue # A line cut short by a crash or a concurrent rotation
+                    if since is None or record.get("ts", 0) >= since:
+                        yield record
+        except FileNotFoundError: # Rotated away while we were reading
+            continue
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (as in bench.py)."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))]
+
+
+def summary(since=None):
+    """
+    Returns one dict per span name: count, errors, p50/p95/p99/max/total in ms, and the mean of each numeric
+    attribute (e.g. prompt_tokens), sorted by total time spent, largest first.
+    """
+    flush() # Include this process's latest spans
+    durations, errors, sums = {}, {}, {}
+    for record in read_spans(since):
+        name = record.get("span")
+        if name is None or not isinstance(record.get("ms"), (int, float)):
+            continue
+        durations.setdefault(name, []).append(record["ms"])
+        errors[name] = errors.get(name, 0) + (not record.get("ok", True))
+        attr_sums = sums.setdefault(name, {})
+        for key, value in record.items():
+            if key not in ("ts", "ms", "pid") and isinstance(value, (int, float)) and not isinstance(value, bool):
+                total, count = attr_sums.get(key, (0, 0))
+                attr_sums[key] = (total + value, count + 1)
+    rows = []
+    for name, ordered in durations.items():
+        ordered.sort()
+        row = {
+            "span": name, "count": len(ordered), "errors": errors[name],
+            "p50_ms": _percentile(ordered, 50), "p95_ms": _percentile(ordered, 95), "p99_ms": _percentile(ordered, 99),
+            "max_ms": ordered[-1], "total_ms": round(sum(ordered), 3),
+        }
+        row.update({f"avg_{key}": round(total / count, 1) for key, (total, count) in sums[name].items()})
+        rows.append(row)
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarize the span timings in the metrics file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report_parser = commands.add_parser("report", help="print p50/p95/p99 per span")
+    report_parser.add_argument("--since", type=float, help="only the last this many minutes")
+    args = parser.parse_args()
+    rows = summary(time.time() - args.since * 60 if args.since else None)
+    if not rows:
+        print(f"No spans recorded in {METRICS_FILE} (run with SOULSYNC_METRICS=1).")
+    print("\n".join(
+        f"{r['span']:<36} n={r['count']:<7} p50={r['p50_ms']:>9.2f}ms  p95={r['p95_ms']:>9.2f}ms  "
+        f"p99={r['p99_ms']:>9.2f}ms  max={r['max_ms']:>9.2f}ms  errors={r['errors']}"
+        for r in rows
+    ))
@@ -1,133 +1,174 @@
 import streamlit as st
 import pandas as pd
-import datetime
-from auth import load_users
+from services import DashboardService, TransferService
 
 def dashboard_page(username):
     """
     Displays the visual dashboard for the logged-in user.
-    Includes mood trends, goal summaries, and placeholders for other insights.
+    Includes mood trends, goal summaries and precomputed journal insights (all prepared by DashboardService).
     """
     st.title(f"📊 {username}'s Visual Dashboard")
-
-    users = load_users()
-    user_data = users.get(username, {})
-    user_moods = user_data.get("moods", [])
-    user_goals = user_data.get("goals", [])
-    user_journals = user_data.get("journals", [])
+    dashboard = DashboardService(username)
 
     st.markdown("---")
 
     # --- Mood Trend Visualization ---
     st.header("Mood Trends Over Time")
 
-    if not user_moods:
+    mood_span = dashboard.mood_span()
+    if mood_span is None:
         st.info("No mood data available. Log your moods in the 'Mood Tracker' to see trends here!")
     else:
-        # Map mood text to numerical values for charting
-        # Ensure these map to the 'mood' values in your users.json (case-insensitive)
-        mood_to_value = {
-            "happy": 5, "excited": 4, "neutral": 3,
-            "anxious": 2, "stressed": 2, "sad": 1, "angry": 1,
-            "calm": 3.5, "energized": 4.5 # Added mapping for 'calm' and 'energized' from your example data
-        }
-        
-        # Prepare data for DataFrame
-        mood_data = []
-        for entry in user_moods:
-            try:
-                # Prioritize 'timestamp' if it exists (for new entries)
-                if "timestamp" in entry and entry["timestamp"]:
-                    timestamp_dt = datetime.datetime.fromisoformat(entry["timestamp"])
-                    mood_label = entry.get("mood_text") or entry.get("mood") # Try both keys
-                else:
-                    # Fallback for older entries without 'timestamp'
-                    date_str = entry.get("date")
-                    # Assume a default time if not present, as older entries might not have 'time'
-                    time_str = entry.get("time", "00:00:00") 
-                    mood_label = entry.get("mood") # For older entries, 'mood' is the key
-
-                    if date_str:
-                        full_datetime_str = f"{date_str} {time_str}"
-                        timestamp_dt = datetime.datetime.fromisoformat(full_datetime_str)
-                    else:
-                        st.warning(f"Skipping mood entry due to missing 'date' (and no 'timestamp'): {entry}")
-                        continue
-
-                if mood_label:
-                    mood_value = mood_to_value.get(mood_label.lower(), 0) # Convert to lower to match keys
-                    mood_data.append({"Datetime": timestamp_dt, "Mood Value": mood_value, "Mood": mood_label})
-                else:
-                    st.warning(f"Skipping mood entry: {entry}. Missing valid 'mood' or 'mood_text'.")
-                    continue
-            except ValueError as e:
-                st.warning(f"Could not parse timestamp or date/time for entry: {entry}. Error: {e}. Skipping this mood entry.")
-                continue
-            except TypeError as e:
-                st.warning(f"Mood entry has unexpected format: {entry}. Error: {e}. Skipping this mood entry.")
-                continue
+        first_day, last_day = mood_span
+        date_range = st.date_input("Show moods between", value=(first_day, last_day), min_value=first_day, max_value=last_day, key="dashboard_mood_range")
+        if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+            start_day, end_day = date_range
+        else:
+            start_day, end_day = first_day, last_day # Only one end picked so far
 
-        if mood_data:
-            df_moods = pd.DataFrame(mood_data)
-            df_moods = df_moods.sort_values(by="Datetime")
+        period_label = st.radio("Group moods by", ["Day", "Week", "Month"], horizontal=True, key="dashboard_mood_period")
+        mood_overview = dashboard.mood_overview(start_day, end_day, period_label.lower())
 
+        if mood_overview.frame is not None:
             st.write("### Your Mood Over Time")
-            st.line_chart(df_moods.set_index("Datetime")["Mood Value"])
-
-            st.write("### Daily Mood Distribution")
-            # Group by date and count mood occurrences
-            if 'Mood' in df_moods.columns:
-                df_moods['DateOnly'] = df_moods['Datetime'].dt.date
-                daily_mood_counts = df_moods.groupby(['DateOnly', 'Mood']).size().unstack(fill_value=0)
-                st.bar_chart(daily_mood_counts)
-            else:
-                st.info("Not enough diverse mood data for daily distribution chart.")
+            st.line_chart(mood_overview.frame.set_index("Datetime")["Mood Value"])
 
-        else:
-            st.info("No valid mood entries to display after parsing.")
+            st.write(f"### Average Mood per {period_label}")
+            st.line_chart(mood_overview.average)
+
+            st.write(f"### Mood Distribution per {period_label}")
+            st.bar_chart(mood_overview.distribution)
 
+        else:
+            st.info("No mood entries in the selected date range.")
+
+        # --- Rolling statistics ---
+        st.write("### Trends & Streaks")
+        mood_stats, mood_trends = dashboard.mood_stats()
+        if mood_stats:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("7-day Average", mood_stats["moving_average_7d"])
+            col2.metric("30-day Average", mood_stats["moving_average_30d"])
+            col3.metric("Trend", mood_stats["trend"], mood_stats["trend_direction"], delta_color="off")
+            col4.metric("Day-to-day Volatility", mood_stats["day_to_day_volatility"])
+            st.write(
+                f"**Positive streak:** {mood_stats['current_positive_streak']} day(s) now, {mood_stats['longest_positive_streak']} at best  \n"
+                f"**Negative streak:** {mood_stats['current_negative_streak']} day(s) now, {mood_stats['longest_negative_streak']} at worst"
+            )
+            st.line_chart(mood_trends)
 
     st.markdown("---")
 
     # --- Goal Achievement Summary ---
     st.header("Goal Progress Summary")
 
-    if not user_goals:
+    goal_summary = dashboard.goal_summary()
+    if goal_summary is None:
         st.info("No goals set yet. Add goals in the 'Goals' section to see your progress here!")
     else:
-        total_goals = len(user_goals)
-        # Use .get() for safe access to 'status'
-        completed_goals = sum(1 for goal in user_goals if goal.get("status") == "Completed")
-        in_progress_goals = sum(1 for goal in user_goals if goal.get("status") == "In Progress")
-        to_do_goals = sum(1 for goal in user_goals if goal.get("status") == "To Do")
-        cancelled_goals = sum(1 for goal in user_goals if goal.get("status") == "Cancelled")
-
-        st.write(f"**Total Goals:** {total_goals}")
-        st.write(f"**Completed:** {completed_goals}")
-        st.write(f"**In Progress:** {in_progress_goals}")
-        st.write(f"**To Do:** {to_do_goals}")
-        st.write(f"**Cancelled:** {cancelled_goals}")
-
-        # Create a simple pie chart for goal statuses
-        goal_status_counts = pd.DataFrame({
-            'Status': ['Completed', 'In Progress', 'To Do', 'Cancelled'],
-            'Count': [completed_goals, in_progress_goals, to_do_goals, cancelled_goals]
-        })
-        # Filter out statuses with 0 count for better visualization
-        goal_status_counts = goal_status_counts[goal_status_counts['Count'] > 0]
-
-        if not goal_status_counts.empty:
-            st.bar_chart(goal_status_counts.set_index('Status'))
+        st.write(f"**Total Goals:** {goal_summary.total}")
+        st.write(f"**Completed:** {goal_summary.counts['Completed']}")
+        st.write(f"**In Progress:** {goal_summary.counts['In Progress']}")
+        st.write(f"**To Do:** {goal_summary.counts['To Do']}")
+        st.write(f"**Cancelled:** {goal_summary.counts['Cancelled']}")
+
+        # Create a simple bar chart for goal statuses
+        if not goal_summary.chart.empty:
+            st.bar_chart(goal_summary.chart)
         else:
             st.info("No goals with counts to display in the chart.")
 
 
     st.markdown("---")
 
-    # --- Common Triggers from Journal Entries (Placeholder) ---
+    # --- Common Triggers from Journal Entries (precomputed by `python insights.py`) ---
     st.header("Common Triggers & Insights from Journal Entries")
-    if not user_journals:
+    journal_overview = dashboard.journal_overview()
+    journal_insights = journal_overview.insights if journal_overview else None
+    if journal_overview:
+        if not journal_overview.sentiment.empty:
+            st.subheader("Journal Sentiment Over Time")
+            st.caption("How positive or negative your entries read, from -1 to +1.")
+            st.line_chart(journal_overview.sentiment[["Sentiment", "7-day Average"]])
+        col_common, col_hard = st.columns(2)
+        with col_common:
+            st.subheader("Recurring Themes")
+            for term, count in journal_overview.themes:
+                st.write(f"- **{term}** ({count})")
+        with col_hard:
+            st.subheader("On Harder Days")
+            for term, count in journal_overview.hard_day_themes:
+                st.write(f"- **{term}** ({count})")
+            if not journal_overview.hard_day_themes:
+                st.write("None of your entries read as negative. 🌱")
+
+    if not journal_overview:
         st.info("No journal entries available. Write some entries in the 'Journal' section to unlock insights here!")
+    elif journal_insights is None:
+        st.info("Your journal insights haven't been generated yet. They're refreshed overnight, so check back tomorrow!")
     else:
-        st.info("This section will analyze your journal entries to identify common themes, emotions, or triggers over time. (Coming Soon!)")
-        st.markdown("*(Future features could include keyword extraction, sentiment analysis, and correlation with mood data.)*")
\ No newline at end of file
+        st.caption(f"Based on {journal_insights['journal_entries']} journal entries, last updated {journal_insights['generated'][:16].replace('T', ' ')}.")
+        if journal_insights.get("summary"):
+            st.info(journal_insights["summary"])
+
+        if journal_insights["top_keywords"]:
+            st.subheader("What You Write About Most")
+            keyword_df = pd.DataFrame(journal_insights["top_keywords"], columns=["Word", "Entries"]).set_index("Word")
+            st.bar_chart(keyword_df)
+
+        col_triggers, col_boosters = st.columns(2)
+        with col_triggers:
+            st.subheader("Possible Triggers")
+            st.caption(f"Words from days when your mood averaged below your usual {journal_insights['mood_baseline']}.")
+            for item in journal_insights["triggers"] or []:
+                st.write(f"- **{item['word']}**: mood {item['mean_mood']} over {item['days']} days")
+            if not journal_insights["triggers"]:
+                st.write("Nothing stands out yet.")
+        with col_boosters:
+            st.subheader("Mood Boosters")
+            st.caption(f"Words from days when your mood averaged above your usual {journal_insights['mood_baseline']}.")
+            for item in journal_insights["boosters"] or []:
+                st.write(f"- **{item['word']}**: mood {item['mean_mood']} over {item['days']} days")
+            if not journal_insights["boosters"]:
+                st.write("Nothing stands out yet.")
+
+        if journal_insights["mood_on_journal_days"] is not None and journal_insights["mood_on_other_days"] is not None:
+            st.write(
+                f"On days you journaled, your mood averaged **{journal_insights['mood_on_journal_days']}**, "
+                f"compared with **{journal_insights['mood_on_other_days']}** on other days."
+            )
+        if journal_insights["mood_note_keywords"]:
+            with st.expander("What your mood notes mention, by mood"):
+                for mood, words in journal_insights["mood_note_keywords"].items():
+                    st.write(f"**{mood}**: {', '.join(words)}")
+
+    st.markdown("---")
+
+    # --- Import & Export ---
+    st.header("Import & Export")
+    transfer_service = TransferService(username)
+    col_export, col_import = st.columns(2)
+    with col_export:
+        st.subheader("Download Your Data")
+        export_format = st.selectbox("Format", ["jsonl", "csv", "columnar"], key="export_format",
+                                     format_func={"jsonl": "JSON Lines", "csv": "CSV", "columnar": "Columnar (JSON Lines)"}.get)
+        if st.button("Prepare Download", key="prepare_export"): # Only builds the file when asked, not on every rerun
+            with transfer_service.export(export_format) as export_file:
+                st.download_button("Download", export_file,
+                                   file_name=transfer_service.file_name(export_format), key="download_export")
+    with col_import:
+        st.subheader("Import Moods, Journal Entries & Goals")
+        st.caption("A .jsonl, .csv or .columnar.jsonl file, e.g. from another tracker. Entries already here are skipped.")
+        uploaded_file = st.file_uploader("Choose a file", type=["jsonl", "ndjson", "json", "csv"], key="import_file")
+        if uploaded_file is not None and st.button("Import", key="run_import"):
+            try:
+                with st.spinner("Importing..."):
+                    import_report = transfer_service.import_file(uploaded_file, uploaded_file.name)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(import_report.summary())
+                if import_report.errors:
+                    with st.expander("Records that couldn't be imported"):
+                        for number, message in import_report.errors:
+                            st.write(f"- Record {number}: {message}")
@@ -1,60 +1,31 @@
 import streamlit as st
-import uuid # For generating unique IDs for goals
 import datetime
-from auth import load_users, save_users # Import functions from auth.py
-
-def add_goal_data(username, title, description, due_date, status):
-    """Adds a new goal for the specified user."""
-    users = load_users()
-    user_data = users.get(username, {})
-    user_goals = user_data.get("goals", [])
-
-    new_goal = {
-        "id": str(uuid.uuid4()), # Unique ID for the goal
-        "title": title,
-        "description": description,
-        "due_date": str(due_date) if due_date else None,
-        "status": status
-    }
-    user_goals.append(new_goal)
-    user_data["goals"] = user_goals
-    users[username] = user_data
-    save_users(users)
-    return True, "Goal added successfully!"
-
-def update_goal_data(username, goal_id, new_title, new_description, new_due_date, new_status):
-    """Updates an existing goal for the specified user."""
-    users = load_users()
-    user_data = users.get(username, {})
-    user_goals = user_data.get("goals", [])
-
-    for i, goal in enumerate(user_goals):
-        if goal["id"] == goal_id:
-            user_goals[i]["title"] = new_title
-            user_goals[i]["description"] = new_description
-            user_goals[i]["due_date"] = str(new_due_date) if new_due_date else None
-            user_goals[i]["status"] = new_status
-            user_data["goals"] = user_goals
-            users[username] = user_data
-            save_users(users)
-            return True, "Goal updated successfully!"
-    return False, "Goal not found."
-
-def delete_goal_data(username, goal_id):
-    """Deletes a goal for the specified user."""
-    users = load_users()
-    user_data = users.get(username, {})
-    user_goals = user_data.get("goals", [])
-
-    initial_len = len(user_goals)
-    user_goals = [goal for goal in user_goals if goal["id"] != goal_id]
-    
-    if len(user_goals) < initial_len:
-        user_data["goals"] = user_goals
-        users[username] = user_data
-        save_users(users)
-        return True, "Goal deleted successfully!"
-    return False, "Goal not found."
+import user_cache
+from goal_repository import STATUSES
+from services import GoalService
+from services.goals import SORT_OPTIONS
+
+
+def _goal_rows(filtered_goals):
+    """Prepares (goal, expander title, details markdown) for each goal shown, so reruns only emit widgets."""
+    rows = []
+    for goal in filtered_goals:
+        # Safely get title and status, providing defaults if missing
+        goal_title = goal.get('title', 'Unnamed Goal')
+        goal_status = goal.get('status', 'Unknown')
+        goal_due_date = goal.get('due_date')
+
+        expander_title = f"**{goal_title}** - Status: {goal_status}"
+        if goal_due_date:
+            expander_title += f" (Due: {goal_due_date})"
+        details = (
+            f"**Description:** {goal.get('description', 'No description provided.')}\n\n"
+            f"**Status:** {goal_status}\n\n"
+            f"**Due Date:** {goal_due_date if goal_due_date else 'Not set'}\n\n"
+            f"*(Goal ID: {goal.get('id', 'N/A')})*" # Display ID for potential future use with AI editing
+        )
+        rows.append((goal, expander_title, details))
+    return rows
 
 
 def goal_page(username):
@@ -63,6 +34,7 @@ def goal_page(username):
     Allows users to add, view, edit, and delete goals.
     """
     st.title(f"🎯 {username}'s Goals")
+    goals = GoalService(username)
 
     # --- Add New Goal ---
     st.header("Add a New Goal")
@@ -70,64 +42,38 @@ def goal_page(username):
         goal_title = st.text_input("Goal Title", max_chars=100, help="e.g., Finish Hackathon Project", key="add_goal_title")
         goal_description = st.text_area("Description (Optional)", help="Provide more details about your goal.", key="add_goal_description")
         goal_due_date = st.date_input("Due Date (Optional)", help="When do you plan to achieve this goal?", key="add_goal_due_date")
-        goal_status = st.selectbox("Status", ["To Do", "In Progress", "Completed", "Cancelled"], index=0, key="add_goal_status")
+        goal_status = st.selectbox("Status", list(STATUSES), index=0, key="add_goal_status")
 
         submitted = st.form_submit_button("Add Goal")
         if submitted:
-            if goal_title:
-                success, message = add_goal_data(username, goal_title, goal_description, goal_due_date, goal_status)
-                if success:
-                    st.success(message)
-                    st.rerun() # Rerun to update the displayed goals
-                else:
-                    st.error(message)
+            success, message = goals.add(goal_title, goal_description, goal_due_date, goal_status)
+            if success:
+                st.success(message)
+                st.rerun() # Rerun to update the displayed goals
             else:
-                st.error("Goal Title cannot be empty.")
+                st.error(message)
 
     st.markdown("---")
 
     # --- View and Manage Goals ---
     st.header("Your Current Goals")
 
-    users = load_users() # Reload users to get latest data
-    user_data = users.get(username, {})
-    user_goals = user_data.get("goals", [])
+    user_goals = goals.goals() # This user's latest data, indexed by id, status and due date when loaded
 
     if not user_goals:
         st.info("You haven't set any goals yet. Add one above!")
     else:
         # Filter and sort options
-        status_filter = st.sidebar.multiselect("Filter by Status", ["To Do", "In Progress", "Completed", "Cancelled"], default=["To Do", "In Progress"], key="goal_status_filter")
-        sort_by = st.sidebar.selectbox("Sort by", ["None", "Due Date (Asc)", "Due Date (Desc)", "Status"], key="goal_sort_by")
-
-        filtered_goals = [goal for goal in user_goals if goal.get("status") in status_filter] # Use .get for status
-
-        if sort_by == "Due Date (Asc)":
-            # Sort by due_date, treating None (no due date) as greater than any date
-            filtered_goals.sort(key=lambda x: (x.get("due_date") is None, x.get("due_date")))
-        elif sort_by == "Due Date (Desc)":
-            # Sort by due_date, treating None as smaller (so they appear last)
-            filtered_goals.sort(key=lambda x: (x.get("due_date") is None, x.get("due_date")), reverse=True)
-        elif sort_by == "Status":
-            # Define a custom order for status
-            status_order = {"To Do": 0, "In Progress": 1, "Completed": 2, "Cancelled": 3}
-            filtered_goals.sort(key=lambda x: status_order.get(x.get("status", "To Do"), 99)) # Default to "To Do" for sorting
-
-        for i, goal in enumerate(filtered_goals):
-            # Safely get title and status, providing defaults if missing
-            goal_title = goal.get('title', 'Unnamed Goal')
-            goal_status = goal.get('status', 'Unknown')
-            goal_due_date = goal.get('due_date')
-
-            expander_title = f"**{goal_title}** - Status: {goal_status}"
-            if goal_due_date:
-                expander_title += f" (Due: {goal_due_date})"
-
+        status_filter = st.sidebar.multiselect("Filter by Status", list(STATUSES), default=["To Do", "In Progress"], key="goal_status_filter")
+        sort_by = st.sidebar.selectbox("Sort by", list(SORT_OPTIONS), key="goal_sort_by")
+
+        # Memoized per filter/sort until this user's data changes
+        goal_rows = user_cache.derived(
+            username, f"render:goal_rows:{','.join(status_filter)}:{sort_by}", lambda: _goal_rows(goals.list(status_filter, sort_by))
+        )
+        for i, (goal, expander_title, details) in enumerate(goal_rows):
             with st.expander(expander_title):
-                st.write(f"**Description:** {goal.get('description', 'No description provided.')}")
-                st.write(f"**Status:** {goal_status}")
-                st.write(f"**Due Date:** {goal_due_date if goal_due_date else 'Not set'}")
-                st.write(f"*(Goal ID: {goal.get('id', 'N/A')})*") # Display ID for potential future use with AI editing
+                st.markdown(details)
 
                 col1, col2 = st.columns(2)
 
@@ -140,7 +86,7 @@ def goal_page(username):
                 # Delete Goal
                 with col2:
                     if st.button(f"Delete Goal", key=f"delete_{goal.get('id', i)}"): # Use a fallback for key
-                        success, message = delete_goal_data(username, goal.get("id"))
+                        success, message = goals.delete(goal.get("id"))
                         if success:
                             st.success(message)
                             st.rerun() # Rerun to update the displayed goals
@@ -149,7 +95,7 @@ def goal_page(username):
 
         # --- Edit Goal Form (appears when a goal is selected for editing) ---
         if "editing_goal_id" in st.session_state and st.session_state.editing_goal_id:
-            goal_to_edit = next((g for g in user_goals if g.get("id") == st.session_state.editing_goal_id), None)
+            goal_to_edit = user_goals.get(st.session_state.editing_goal_id)
 
             if goal_to_edit:
                 st.markdown("---")
@@ -169,7 +115,7 @@ def goal_page(username):
                     edited_due_date = st.date_input("Due Date", value=initial_date, key="edit_due_date")
                     
                     # Find the index of the current status for the selectbox
-                    status_options = ["To Do", "In Progress", "Completed", "Cancelled"]
+                    status_options = list(STATUSES)
                     initial_status_index = status_options.index(goal_to_edit.get('status', 'To Do')) if goal_to_edit.get('status', 'To Do') in status_options else 0
                     edited_status = st.selectbox("Status", status_options, index=initial_status_index, key="edit_status")
 
@@ -177,23 +123,19 @@ def goal_page(username):
                     cancel_edit = st.form_submit_button("Cancel Edit")
 
                     if update_submitted:
-                        if edited_title:
-                            success, message = update_goal_data(
-                                username,
-                                goal_to_edit["id"], # We know ID exists here as we filtered by it
-                                edited_title,
-                                edited_description,
-                                edited_due_date,
-                                edited_status
-                            )
-                            if success:
-                                st.success(message)
-                                st.session_state.editing_goal_id = None # Clear editing state
-                                st.rerun()
-                            else:
-                                st.error(message)
+                        success, message = goals.update(
+                            goal_to_edit["id"], # We know ID exists here as we filtered by it
+                            edited_title,
+                            edited_description,
+                            edited_due_date,
+                            edited_status
+                        )
+                        if success:
+                            st.success(message)
+                            st.session_state.editing_goal_id = None # Clear editing state
+                            st.rerun()
                         else:
-                            st.error("Goal Title cannot be empty.")
+                            st.error(message)
                     elif cancel_edit:
                         st.session_state.editing_goal_id = None # Clear editing state
                         st.rerun()
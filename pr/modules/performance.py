@@ -0,0 +1,42 @@
+import time
+import streamlit as st
+import pandas as pd
+import credentials
+import metrics
+
+WINDOWS = {"Last hour": 3600, "Last 24 hours": 24 * 3600, "Everything kept": None} # Seconds back
+
+def performance_page(username):
+    """
+    Displays p50/p95 timings for each instrumented span (pages, storage, aggregation, prompt building, LLM calls),
+    read from the metrics file. Only for the users listed in SOULSYNC_ADMINS.
+    """
+    st.title("⏱️ Performance")
+    if not credentials.is_admin(username):
+        st.error("This page is only available to administrators.")
+        return
+    if not metrics.ENABLED:
+        st.info("Timing is off, so nothing new is being recorded. Restart the app with SOULSYNC_METRICS=1 to turn it on.")
+
+    window = st.radio("Show", list(WINDOWS), horizontal=True, key="performance_window")
+    seconds = WINDOWS[window]
+    span_rows = metrics.summary(time.time() - seconds if seconds else None)
+    if not span_rows:
+        st.info(f"No timings recorded in {metrics.METRICS_FILE} for this period yet.")
+        return
+
+    summary_df = pd.DataFrame(span_rows).set_index("span")
+    is_page = summary_df.index.str.startswith("page.")
+
+    st.header("Pages")
+    st.caption("A full run of each page's script, from the first widget to the last.")
+    if is_page.any():
+        st.bar_chart(summary_df.loc[is_page, ["p50_ms", "p95_ms"]])
+    else:
+        st.info("No page renders recorded in this period.")
+
+    st.header("Spans")
+    st.caption("Storage loads and saves, record parsing, aggregation, prompt building and LLM calls. Sorted by total time spent.")
+    st.bar_chart(summary_df.loc[~is_page, ["p50_ms", "p95_ms"]])
+    st.dataframe(summary_df, use_container_width=True)
+    st.caption(f"From {metrics.METRICS_FILE} and its rotated copies (up to {metrics.BACKUP_COUNT + 1} x {metrics.MAX_BYTES // 1024} KiB).")
@@ -0,0 +1,218 @@
+import datetime
+import json
+import math
+import pandas as pd
+import metrics
+import records
+import storage
+import user_cache
+import aggregation
+
+# Mood statistics built on the daily rollups (one mean mood value per day with entries):
+# - summary(): compact numbers for the dashboard cards and the chatbot's prompt (moving averages, trend,
+#   streaks, volatility). The running state behind it is stored per user and advanced by record_mood() on
+#   each new mood, so the cost of an update doesn't grow with the length of the history.
+# - daily_trends(): the full daily series with 7/30-day moving averages and the trend line, computed with
+#   vectorized pandas window operations for the dashboard chart.
+
+NEUTRAL_VALUE = 3 # Days with a mean above this count as positive, below it as negative
+EWMA_SPAN = 7 # Span (in recorded days) of the exponentially weighted trend
+STATE_VERSION = 1
+
+
+def _empty_state():
+    return {
+        "version": STATE_VERSION,
+        "closed_total": 0, # Number of valued mood entries in closed days, to detect missed updates
+        "open_day": None, # The latest day with entries; its mean can still change
+        "open_mean": None,
+        "open_count": 0,
+        "closed": { # Running stats over every day before open_day
+            "last_day": None, "prev_mean": None, "ewma": None,
+            "pos_run": 0, "neg_run": 0, "longest_pos": 0, "longest_neg": 0,
+            "diff_n": 0, "diff_mean": 0.0, "diff_m2": 0.0, "days": 0
+        }
+    }
+
+
+def _fold_day(closed, day, mean):
+    """Advances the running stats by one finished day (Welford's method for the volatility)."""
+    alpha = 2 / (EWMA_SPAN + 1)
+    closed["ewma"] = mean if closed["ewma"] is None else alpha * mean + (1 - alpha) * closed["ewma"]
+
+    consecutive = (
+        closed["last_day"] is not None
+        and datetime.date.fromisoformat(day) - datetime.date.fromisoformat(closed["last_day"]) == datetime.timedelta(days=1)
+    )
+    if not consecutive:
+        closed["pos_run"] = closed["neg_run"] = 0 # A day without entries breaks a streak
+    if mean > NEUTRAL_VALUE:
+        closed["pos_run"], closed["neg_run"] = closed["pos_run"] + 1, 0
+    elif mean < NEUTRAL_VALUE:
+        closed["pos_run"], closed["neg_run"] = 0, closed["neg_run"] + 1
+    else:
+        closed["pos_run"] = closed["neg_run"] = 0
+    closed["longest_pos"] = max(closed["longest_pos"], closed["pos_run"])
+    closed["longest_neg"] = max(closed["longest_neg"], closed["neg_run"])
+
+    if closed["prev_mean"] is not None:
+        diff = mean - closed["prev_mean"]
+        closed["diff_n"] += 1
+        delta = diff - closed["diff_mean"]
+        closed["diff_mean"] += delta / closed["diff_n"]
+        closed["diff_m2"] += delta * (diff - closed["diff_mean"])
+    closed["prev_mean"] = mean
+    closed["last_day"] = day
+    closed["days"] += 1
+
+
+def _day_rollup(conn, username, day):
+    """Returns (mean, count of valued entries) for one day from the rollups."""
+    row = conn.execute(
+        "SELECT SUM(value_sum), SUM(value_count) FROM mood_rollups WHERE username = ? AND period = 'day' AND bucket = ?",
+        (username, day)
+    ).fetchone()
+    return (row[0] / row[1], row[1]) if row[1] else (None, 0)
+
+
+def _total_count(conn, username):
+    """Returns the user's number of mood entries with a value (summed over the few monthly rollup rows)."""
+    row = conn.execute(
+        "SELECT SUM(value_count) FROM mood_rollups WHERE username = ? AND period = 'month'", (username,)
+    ).fetchone()
+    return row[0] or 0
+
+
+def _rebuild_state(conn, username):
+    """Recomputes the running state from the daily rollups."""
+    rows = conn.execute(
+        "SELECT bucket, SUM(value_sum) / SUM(value_count), SUM(value_count) FROM mood_rollups "
+        "WHERE username = ? AND period = 'day' GROUP BY bucket HAVING SUM(value_count) > 0 ORDER BY bucket",
+        (username,)
+    ).fetchall()
+    state = _empty_state()
+    for day, mean, count in rows[:-1]:
+        _fold_day(state["closed"], day, mean)
+    if rows:
+        state["open_day"], state["open_mean"], state["open_count"] = rows[-1]
+    state["closed_total"] = sum(r[2] for r in rows[:-1])
+    return state
+
+
+def _load_state(conn, username, pending=0):
+    """
+    Returns the stored running state if it accounts for every mood entry except `pending` just-added ones.
+    Returns None if it is missing, outdated, or out of step with the rollups (e.g. after a bulk import).
+    """
+    row = conn.execute("SELECT state FROM mood_stats WHERE username = ?", (username,)).fetchone()
+    if row is None:
+        return None
+    state = json.loads(row["state"])
+    if state.get("version") != STATE_VERSION:
+        return None
+    if state["closed_total"] + state["open_count"] + pending != _total_count(conn, username):
+        return None
+    return state
+
+
+def _save_state(conn, username, state):
+    conn.execute("INSERT OR REPLACE INTO mood_stats (username, state) VALUES (?, ?)", (username, json.dumps(state)))
+
+
+def record_mood(username, entry):
+    """Advances the user's running mood statistics after a mood entry has been stored."""
+    entry = records.normalize_mood(entry)
+    if entry is None or entry["mood_value"] is None:
+        return # Not part of the numeric statistics
+    day = entry["date"]
+    with storage.transaction() as conn:
+        state = _load_state(conn, username, pending=1)
+        if state is None or (state["open_day"] is not None and day < state["open_day"]):
+            state = _rebuild_state(conn, username) # First use, a missed update, or a back-dated entry
+        else:
+            if state["open_day"] is not None and day > state["open_day"]:
+                _fold_day(state["closed"], state["open_day"], state["open_mean"]) # The previous day is now final
+                state["closed_total"] += state["open_count"]
+            state["open_day"] = day
+            state["open_mean"], state["open_count"] = _day_rollup(conn, username, day) # The rollup is authoritative
+        _save_state(conn, username, state)
+
+
+def _moving_average(conn, username, last_day, days):
+    """Mean of the daily means over the `days` calendar days ending on last_day."""
+    first_day = (datetime.date.fromisoformat(last_day) - datetime.timedelta(days=days - 1)).isoformat()
+    row = conn.execute(
+        "SELECT AVG(day_mean) FROM (SELECT SUM(value_sum) / SUM(value_count) AS day_mean FROM mood_rollups "
+        "WHERE username = ? AND period = 'day' AND bucket BETWEEN ? AND ? GROUP BY bucket HAVING SUM(value_count) > 0)",
+        (username, first_day, last_day)
+    ).fetchone()
+    return row[0]
+
+
+def summary(username):
+    """
+    Returns compact mood statistics for the user, or None if they have no moods:
+    moving averages, the weighted trend, streaks (in consecutive days) and day-to-day volatility.
+    """
+    return user_cache.derived(username, "mood_summary", lambda: _compute_summary(username))
+
+
+@metrics.timed("aggregation.mood_summary")
+def _compute_summary(username):
+    conn = storage.get_connection()
+    state = _load_state(conn, username)
+    if state is None: # Never built, or a write happened without record_mood() (e.g. a bulk import)
+        with storage.transaction() as conn:
+            state = _rebuild_state(conn, username)
+            _save_state(conn, username, state)
+    if state["open_day"] is None:
+        return None
+
+    # Fold the still-open latest day into a copy of the closed stats
+    stats = dict(state["closed"])
+    _fold_day(stats, state["open_day"], state["open_mean"])
+    volatility = math.sqrt(stats["diff_m2"] / stats["diff_n"]) if stats["diff_n"] else 0.0
+    ma_7 = _moving_average(conn, username, state["open_day"], 7)
+    ma_30 = _moving_average(conn, username, state["open_day"], 30)
+    if stats["ewma"] > ma_30 + 0.25:
+        direction = "improving"
+    elif stats["ewma"] < ma_30 - 0.25:
+        direction = "declining"
+    else:
+        direction = "steady"
+    return {
+        "days_tracked": stats["days"],
+        "last_logged_day": state["open_day"],
+        "latest_daily_mean": round(state["open_mean"], 2),
+        "moving_average_7d": round(ma_7, 2),
+        "moving_average_30d": round(ma_30, 2),
+        "trend": round(stats["ewma"], 2),
+        "trend_direction": direction,
+        "current_positive_streak": stats["pos_run"],
+        "current_negative_streak": stats["neg_run"],
+        "longest_positive_streak": stats["longest_pos"],
+        "longest_negative_streak": stats["longest_neg"],
+        "day_to_day_volatility": round(volatility, 2)
+    }
+
+
+def daily_trends(username):
+    """
+    Returns a DataFrame indexed by calendar day with the daily mean mood, its 7- and 30-day moving
+    averages and the exponentially weighted trend. Days without entries are left empty in 'Daily Mean'.
+    """
+    return user_cache.derived(username, "daily_trends", lambda: _compute_trends(aggregation.mean_mood(username, "day")))
+
+
+@metrics.timed("aggregation.daily_trends")
+def _compute_trends(daily_means):
+    if daily_means.empty:
+        return pd.DataFrame()
+    calendar = daily_means.asfreq("D") # One row per calendar day; gaps become NaN
+    return pd.DataFrame({
+        "Daily Mean": calendar,
+        "7-day Average": calendar.rolling(7, min_periods=1).mean(),
+        "30-day Average": calendar.rolling(30, min_periods=1).mean(),
+        # Same recursion as summary()'s trend: weighted over recorded days, carried across gaps
+        "Trend": daily_means.ewm(span=EWMA_SPAN, adjust=False).mean().reindex(calendar.index).ffill()
+    })
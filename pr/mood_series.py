@@ -0,0 +1,160 @@
+import bisect
+import datetime
+import logging
+from array import array
+from records import MoodRecord
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+MAX_LABELS = 32767 # Distinct (label, emoji, value) tuples an int16 code can address
+# Keys every canonical mood dict has; anything else an entry was saved with is kept per entry in 'extras'
+_CANONICAL_KEYS = frozenset(("timestamp", "date", "time", "mood_text", "mood_emoji", "mood_value", "description"))
+
+log = logging.getLogger("mood_series")
+
+
+def to_micros(timestamp_dt):
+    """Converts a datetime to integer microseconds since the epoch (an aware one is first made naive local time)."""
+    if timestamp_dt.tzinfo is not None:
+        timestamp_dt = timestamp_dt.astimezone().replace(tzinfo=None)
+    delta = timestamp_dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_micros(micros):
+    """Converts integer microseconds since the epoch back to a (naive) datetime."""
+    return _EPOCH + datetime.timedelta(microseconds=micros)
+
+
+class MoodSeries:
+    """
+    One user's mood history in columnar form, always sorted by time.
+
+    Instead of one dict per entry, each entry is an int64 timestamp (microseconds since the epoch) and an
+    int16 code into a small table of distinct (label, emoji, value) tuples. Descriptions are the only
+    per-entry strings (plus, for the few entries saved with them, any extra keys). Because the columns stay sorted, "latest N" and date-range queries are a binary
+    search plus a slice, never a sort.
+
+    Indexing and iteration yield MoodRecord tuples in time order, so code written against a list of
+    records keeps working.
+    """
+
+    def __init__(self):
+        self.timestamps = array("q") # Microseconds since the epoch, ascending
+        self.codes = array("h") # Index into self.labels
+        self.descriptions = []
+        self.extras = [] # None, or a dict of the non-canonical keys the entry was stored with
+        self.labels = [] # Interned (mood_text, mood_emoji, mood_value) tuples
+        self._label_codes = {}
+
+    @classmethod
+    def from_dicts(cls, entries):
+        """
+        Builds a series from canonical mood dicts (see records.normalize_mood). Entries that never normalized are
+        skipped, as they are by the rollups; one that can't be loaded anyway (an unusable timestamp or a missing
+        field) is skipped with a logged warning, so a single bad entry never hides the user's whole history.
+        """
+        series = cls()
+        for data in entries:
+            if "mood_text" not in data:
+                continue # Kept in storage but neither loaded nor counted
+            try:
+                timestamp_dt = datetime.datetime.fromisoformat(data["timestamp"])
+                extras = {k: v for k, v in data.items() if k not in _CANONICAL_KEYS}
+                series.add(timestamp_dt, data["mood_text"], data["mood_emoji"], data["mood_value"], data["description"],
+                           extras or None)
+            except (KeyError, ValueError, TypeError) as e:
+                log.warning("Skipping stored mood entry that can't be loaded (%s): %r", e, data)
+        return series
+
+    def _code_for(self, mood_text, mood_emoji, mood_value):
+        """Returns the code for a label, adding it to the table the first time it's seen."""
+        key = (mood_text, mood_emoji, mood_value)
+        code = self._label_codes.get(key)
+        if code is None:
+            code = len(self.labels)
+            if code > MAX_LABELS:
+                raise ValueError(f"Too many distinct moods for an int16 code (at most {MAX_LABELS + 1}).")
+            self.labels.append(key)
+            self._label_codes[key] = code
+        return code
+
+    def add(self, timestamp_dt, mood_text, mood_emoji, mood_value, description="", extras=None):
+        """
+        Inserts one entry at its place in time order (an append for anything newer than the last entry).
+        `extras` holds any other keys to hand back in the entry's stored dict.
+        """
+        micros = to_micros(timestamp_dt)
+        code = self._code_for(mood_text, mood_emoji, mood_value)
+        if not self.timestamps or micros >= self.timestamps[-1]:
+            position = len(self.timestamps)
+        else:
+            position = bisect.bisect_right(self.timestamps, micros)
+        self.timestamps.insert(position, micros)
+        self.codes.insert(position, code)
+        self.descriptions.insert(position, description or "")
+        self.extras.insert(position, extras)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __bool__(self):
+        return len(self.timestamps) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._record(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("MoodSeries index out of range")
+        return self._record(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._record(i)
+
+    def _record(self, i):
+        """Materializes entry i as a MoodRecord."""
+        mood_text, mood_emoji, mood_value = self.labels[self.codes[i]]
+        timestamp_dt = from_micros(self.timestamps[i])
+        data = {
+            "timestamp": timestamp_dt.isoformat(),
+            "date": timestamp_dt.date().isoformat(),
+            "time": timestamp_dt.strftime("%H:%M:%S"),
+            "mood_text": mood_text,
+            "mood_emoji": mood_emoji,
+            "mood_value": mood_value,
+            "description": self.descriptions[i]
+        }
+        if self.extras[i]:
+            data.update(self.extras[i]) # Saving the record back must not drop keys it was stored with
+        return MoodRecord(timestamp_dt, mood_text, mood_value, mood_emoji, self.descriptions[i], data)
+
+    def latest(self, n):
+        """Returns the newest n entries, most recent first."""
+        start = max(len(self) - n, 0)
+        return [self._record(i) for i in range(len(self) - 1, start - 1, -1)]
+
+    def index_range(self, start_dt=None, end_dt=None):
+        """Returns (lo, hi) so that positions lo..hi-1 fall within [start_dt, end_dt]. Either bound may be None."""
+        lo = 0 if start_dt is None else bisect.bisect_left(self.timestamps, to_micros(start_dt))
+        hi = len(self) if end_dt is None else bisect.bisect_right(self.timestamps, to_micros(end_dt))
+        return lo, max(lo, hi)
+
+    def between(self, start_dt=None, end_dt=None):
+        """Returns the entries between two datetimes (inclusive), oldest first."""
+        lo, hi = self.index_range(start_dt, end_dt)
+        return [self._record(i) for i in range(lo, hi)]
+
+    def values(self):
+        """Returns the numeric mood value of every entry (None for labels without one), in time order."""
+        label_values = [value for _, _, value in self.labels]
+        return [label_values[code] for code in self.codes]
+
+    def first_timestamp(self):
+        """Returns the oldest entry's datetime, or None if the series is empty."""
+        return from_micros(self.timestamps[0]) if self.timestamps else None
+
+    def last_timestamp(self):
+        """Returns the newest entry's datetime, or None if the series is empty."""
+        return from_micros(self.timestamps[-1]) if self.timestamps else None
@@ -0,0 +1,91 @@
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+# Password hashing with scrypt, a memory-hard KDF from the standard library. Hashes are stored as
+#   scrypt$<log2 N>$<r>$<p>$<salt>$<hash>   (salt and hash base64-encoded)
+# so each one carries the cost it was made with: raising SOULSYNC_SCRYPT_LOG_N only affects new hashes,
+# and older ones are upgraded the next time their owner logs in (see needs_rehash()).
+# Check what a login costs on this machine with:  python passwords.py bench
+
+LOG_N = int(os.environ.get("SOULSYNC_SCRYPT_LOG_N", "15")) # N = 2**15 with r=8: 32 MiB and ~150ms per hash
+R = 8
+P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+PREFIX = "scrypt"
+
+
+def _scrypt(password, salt, log_n, r, p):
+    n = 2 ** log_n
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * n * r + 2 ** 20, # scrypt needs 128*N*r bytes; OpenSSL's default cap is only 32 MiB
+        dklen=HASH_BYTES
+    )
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def hash_password(password, log_n=None):
+    """Returns a salted scrypt hash of the password in the stored format, at the current (or given) cost."""
+    log_n = log_n or LOG_N
+    salt = os.urandom(SALT_BYTES)
+    return "$".join((PREFIX, str(log_n), str(R), str(P), _b64(salt), _b64(_scrypt(password, salt, log_n, R, P))))
+
+
+def _parse(encoded):
+    """Splits a stored hash into (log_n, r, p, salt, hash), or returns None if it isn't one."""
+    parts = (encoded or "").split("$")
+    if len(parts) != 6 or parts[0] != PREFIX:
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3]), base64.b64decode(parts[4]), base64.b64decode(parts[5])
+    except ValueError:
+        return None
+
+
+def is_hash(value):
+    """True if the value is a hash in the stored format (as opposed to, say, a legacy plaintext password)."""
+    return _parse(value) is not None
+
+
+def verify_password(password, encoded):
+    """Checks a password against a stored hash. The comparison takes the same time wherever they differ."""
+    parsed = _parse(encoded)
+    if parsed is None:
+        return False
+    log_n, r, p, salt, expected = parsed
+    return hmac.compare_digest(_scrypt(password, salt, log_n, r, p), expected)
+
+
+def needs_rehash(encoded):
+    """True if the hash was made with different cost parameters than the current ones."""
+    parsed = _parse(encoded)
+    return parsed is None or parsed[:3] != (LOG_N, R, P)
+
+
+def benchmark(log_ns=range(12, 18), rounds=5):
+    """Times hash_password at each cost. Returns [(log_n, memory MiB, mean ms)]."""
+    results = []
+    for log_n in log_ns:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            hash_password("correct horse battery staple", log_n)
+        results.append((log_n, 128 * 2 ** log_n * R / 2 ** 20, (time.perf_counter() - started) / rounds * 1000))
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 2 and sys.argv[1] == "bench":
+        print(f"scrypt r={R} p={P}; a login costs one hash (SOULSYNC_SCRYPT_LOG_N={LOG_N})")
+        for log_n, memory, ms in benchmark():
+            print(f"  log2 N = {log_n:2d}  {memory:5.0f} MiB  {ms:7.1f} ms{'  <- current' if log_n == LOG_N else ''}")
+    else:
+        print("Usage: python passwords.py bench")
+        sys.exit(1)
@@ -0,0 +1,129 @@
+import os
+from typing import NamedTuple
+import aggregation
+import metrics
+import mood_analytics
+import search_index
+from goal_repository import OPEN_STATUSES
+
+# Builds the user-data part of the chatbot's system prompt within a token budget.
+# Only whitelisted, summarized fields are used (never the password, email or chat history), and sections
+# are added in priority order until the budget runs out, so the prompt stays the same size however much
+# data the user has.
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("SOULSYNC_CONTEXT_TOKENS", "1200"))
+JOURNAL_SNIPPETS = 3 # Top-k journal entries / mood notes to include
+SNIPPET_CHARS = 400 # Longest excerpt included per entry
+RECENT_MOODS = 5
+ACTIVE_GOALS = 8
+
+class PromptContext(NamedTuple):
+    """The assembled context text, its estimated token count and the sections that fit."""
+    text: str
+    tokens: int
+    sections: list
+
+
+def estimate_tokens(text):
+    """Estimates the token count of text (about 4 characters per token for English with Llama tokenizers)."""
+    return (len(text) + 3) // 4
+
+
+def _goals_section(username, user_goals):
+    counts = aggregation.goal_status_counts(username)
+    lines = [f"Goals: {len(user_goals)} total (" + ", ".join(f"{status}: {count}" for status, count in counts.items()) + ")"]
+    active = user_goals.by_due_date(OPEN_STATUSES)[:ACTIVE_GOALS] # Soonest due first
+    for goal in active:
+        title = goal.get("title") or goal.get("name") or "Unnamed Goal" # Older goals use 'name'
+        due = f", due {goal['due_date']}" if goal.get("due_date") else ""
+        lines.append(f"- {title} ({goal.get('status')}{due})")
+    return "\n".join(lines)
+
+
+def _moods_section(username, user_moods):
+    stats = mood_analytics.summary(username)
+    if not stats:
+        return None
+    lines = [
+        f"Mood statistics (scale 1-5): 7-day average {stats['moving_average_7d']}, 30-day average "
+        f"{stats['moving_average_30d']}, trend {stats['trend']} ({stats['trend_direction']}), "
+        f"volatility {stats['day_to_day_volatility']}, {stats['days_tracked']} days tracked.",
+        f"Streaks: positive {stats['current_positive_streak']} now / {stats['longest_positive_streak']} longest, "
+        f"negative {stats['current_negative_streak']} now / {stats['longest_negative_streak']} longest.",
+        "Recent moods:"
+    ]
+    for entry in user_moods.latest(RECENT_MOODS):
+        note = f" - {entry.description}" if entry.description else ""
+        lines.append(f"- {entry.timestamp.strftime('%Y-%m-%d %H:%M')}: {entry.mood_text}{note}")
+    return "\n".join(lines)
+
+
+def _relevant_snippets(username, user_journals, query, k):
+    """
+    Returns up to k snippets of the journal entries and mood notes that best match the query (from the
+    search index), or of the k most recent journal entries if nothing matches.
+    """
+    hits = search_index.search(username, query, k)
+    if hits:
+        return [_snippet(hit.timestamp, hit.text, hit.mood_text) for hit in hits]
+    recent = sorted(user_journals, key=lambda e: e.timestamp, reverse=True)[:k]
+    return [_snippet(entry.timestamp, entry.content) for entry in recent]
+
+
+def _snippet(timestamp, text, mood_text=None):
+    text = text if len(text) <= SNIPPET_CHARS else text[:SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+    if mood_text:
+        return f"Date: {timestamp.date().isoformat()}\nMood note ({mood_text}): {text}"
+    return f"Date: {timestamp.date().isoformat()}\nContent: {text}"
+
+
+def build_context(username, user_data, query, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Returns a PromptContext summarizing the user's goals, moods and the journal entries and mood notes most
+    relevant to the query, truncated by priority (goals, then moods, then snippets) to fit token_budget.
+    """
+    with metrics.span("prompt.build") as span:
+        context = _build_context(username, user_data, query, token_budget)
+        span.set(tokens=context.tokens, chars=len(context.text), sections=len(context.sections))
+        return context
+
+
+def _build_context(username, user_data, query, token_budget):
+    sections = []
+    user_goals = user_data.get("goals", [])
+    user_moods = user_data.get("moods", [])
+    user_journals = user_data.get("journals", [])
+
+    if user_goals:
+        sections.append(("goals", _goals_section(username, user_goals)))
+    if user_moods:
+        moods_text = _moods_section(username, user_moods)
+        if moods_text:
+            sections.append(("moods", moods_text))
+    if user_journals:
+        sections.append(("journals_count", f"Journal entries written: {len(user_journals)}"))
+    if user_journals or user_moods:
+        snippets = _relevant_snippets(username, user_journals, query, JOURNAL_SNIPPETS)
+        for i, snippet in enumerate(snippets):
+            heading = "Journal entries and mood notes relevant to the question:\n" if i == 0 else ""
+            sections.append((f"journal_{i + 1}", heading + snippet))
+
+    parts, included, used = [], [], 0
+    for name, text in sections:
+        cost = estimate_tokens(text) + 1 # +1 for the separating newline
+        if used + cost > token_budget:
+            remaining_chars = (token_budget - used - 1) * 4
+            if remaining_chars < 200:
+                break # Not enough room left for anything useful
+            text = text[:remaining_chars].rsplit("\n", 1)[0] # Keep whole lines of the last section that fits
+            cost = estimate_tokens(text) + 1
+            parts.append(text)
+            included.append(name + " (truncated)")
+            used += cost
+            break
+        parts.append(text)
+        included.append(name)
+        used += cost
+
+    text = "\n\n".join(parts) if parts else "The user hasn't recorded any goals, moods or journal entries yet."
+    return PromptContext(text, estimate_tokens(text), included)
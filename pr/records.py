@@ -0,0 +1,115 @@
+import datetime
+from typing import NamedTuple
+
+# Mood and journal entries have been saved in a few shapes over time: older ones only have 'date' (and
+# sometimes 'time') and use 'mood'/'notes', newer ones have 'timestamp', 'mood_text' and 'description'.
+# Every entry is normalized to one canonical shape when it is written (or, for existing data, once by the
+# storage migration), and parsed into a typed record when it is loaded, so pages never re-parse entries.
+
+SCHEMA_VERSION = 4 # Bump when the canonical shape changes; storage re-runs the migration once
+
+# Mood label -> emoji, in the order the Mood Tracker offers them
+MOOD_EMOJIS = {
+    "Happy": "😀",
+    "Sad": "😢",
+    "Angry": "😡",
+    "Stressed": "😣",
+    "Anxious": "😰",
+    "Excited": "🤩",
+    "Neutral": "😐",
+    "Calm": "😌",
+    "Energized": "⚡"
+}
+
+# Mood label (lowercase) -> numerical value used for charts and statistics. Other labels (e.g. from an
+# import) are kept with mood_value None and left out of the numeric statistics rather than counted as 0.
+MOOD_VALUES = {
+    "happy": 5, "excited": 4, "neutral": 3,
+    "anxious": 2, "stressed": 2, "sad": 1, "angry": 1,
+    "calm": 3.5, "energized": 4.5
+}
+
+
+class MoodRecord(NamedTuple):
+    """A mood entry as handed out by MoodSeries. 'data' is the canonical stored dict."""
+    timestamp: datetime.datetime
+    mood_text: str
+    mood_value: float # None for labels without a value
+    mood_emoji: str
+    description: str
+    data: dict
+
+
+class JournalRecord(NamedTuple):
+    """A loaded journal entry. 'data' is the canonical stored dict."""
+    timestamp: datetime.datetime
+    content: str
+    data: dict
+
+
+def _parse_timestamp(entry):
+    """
+    Returns the entry's datetime from 'timestamp', or from the older 'date'/'time' keys. None if unusable.
+    Timestamps with a UTC offset (e.g. from an import) become naive local time, like every other stored entry.
+    """
+    try:
+        if entry.get("timestamp"):
+            timestamp_dt = datetime.datetime.fromisoformat(entry["timestamp"])
+        elif entry.get("date"):
+            timestamp_dt = datetime.datetime.fromisoformat(f"{entry['date']} {entry.get('time', '00:00:00')}")
+        else:
+            return None
+    except (ValueError, TypeError):
+        return None
+    if timestamp_dt.tzinfo is not None:
+        timestamp_dt = timestamp_dt.astimezone().replace(tzinfo=None)
+    return timestamp_dt
+
+
+def normalize_mood(entry):
+    """Returns the canonical dict for a mood entry in any historical shape, or None if it can't be used."""
+    timestamp_dt = _parse_timestamp(entry)
+    mood_label = entry.get("mood_text") or entry.get("mood") # Older entries use 'mood'
+    if timestamp_dt is None or not isinstance(mood_label, str) or not mood_label:
+        return None
+    if mood_label.capitalize() in MOOD_EMOJIS:
+        mood_label = mood_label.capitalize() # 'happy' and 'Happy' are the same mood
+    normalized = dict(entry)
+    normalized.update({
+        "timestamp": timestamp_dt.isoformat(),
+        "date": timestamp_dt.date().isoformat(),
+        "time": timestamp_dt.strftime("%H:%M:%S"),
+        "mood_text": mood_label,
+        "mood_value": MOOD_VALUES.get(mood_label.lower()),
+        "mood_emoji": entry.get("mood_emoji") or MOOD_EMOJIS.get(mood_label, "❓"),
+        "description": entry.get("description") or entry.get("notes") or "" # Older entries use 'notes'
+    })
+    return normalized
+
+
+def normalize_journal(entry):
+    """Returns the canonical dict for a journal entry in any historical shape, or None if it can't be used."""
+    timestamp_dt = _parse_timestamp(entry)
+    if timestamp_dt is None:
+        return None
+    normalized = dict(entry)
+    normalized.update({
+        "timestamp": timestamp_dt.isoformat(),
+        "date": timestamp_dt.date().isoformat(),
+        "content": entry.get("content", "")
+    })
+    return normalized
+
+
+def journal_from_dict(data):
+    """Builds a JournalRecord from a canonical stored dict. Returns None for entries that never normalized."""
+    try:
+        return JournalRecord(datetime.datetime.fromisoformat(data["timestamp"]), data["content"], data)
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def as_dict(entry):
+    """Returns the stored dict for a record, or the entry itself if it's already a dict."""
+    return entry.data if isinstance(entry, (MoodRecord, JournalRecord)) else entry
+
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import time
+import storage
+
+# Cache of complete LLM responses for prompts that repeat: the chatbot's quick actions and journal
+# reflections. Entries are content-addressed: the key hashes the model, the prompt template's version,
+# a fingerprint of the username and the user data in the prompt, and the normalized question. Users never
+# share an entry (a fast cached reply would reveal that someone else wrote the same text), and a change to
+# the user's goals, moods or journals (or to the prompt) simply produces a new key, so stale answers are never
+# served. Entries live in the database, expire after CACHE_TTL seconds and the least recently used ones
+# are evicted beyond CACHE_MAX_ENTRIES.
+
+CACHE_TTL = float(os.environ.get("SOULSYNC_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.environ.get("SOULSYNC_LLM_CACHE_ENTRIES", "2000"))
+
+
+def fingerprint(*parts):
+    """Returns a short stable hash of the given strings (e.g. the user data placed in a prompt)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def make_key(model, template_version, data_fingerprint, query):
+    """Returns the cache key for a prompt. The query is compared case- and whitespace-insensitively."""
+    normalized_query = " ".join(query.lower().split())
+    return hashlib.sha256(
+        json.dumps([model, template_version, data_fingerprint, normalized_query]).encode("utf-8")
+    ).hexdigest()
+
+
+def get(key):
+    """Returns the cached response for key, or None if there isn't a live one."""
+    conn = storage.get_connection()
+    row = conn.execute("SELECT response, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    now = time.time()
+    if now - row["created"] > CACHE_TTL:
+        with storage.transaction() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        return None
+    with storage.transaction() as conn:
+        conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+    return row["response"]
+
+
+def put(key, response):
+    """Stores a complete response, then drops expired entries and the least recently used overflow."""
+    now = time.time()
+    with storage.transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+            (key, response, now, now)
+        )
+        conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - CACHE_TTL,))
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (CACHE_MAX_ENTRIES,)
+        )
+
+
+def cached_stream(key, open_stream):
+    """
+    Yields the cached response for key in one piece if there is one. Otherwise yields the chunks of
+    open_stream() as they arrive and caches the full text once the stream completes without errors
+    (a stream that raises or is closed early is not cached).
+    """
+    cached = get(key)
+    if cached is not None:
+        yield cached
+        return
+    chunks = []
+    for text in open_stream():
+        chunks.append(text)
+        yield text
+    if chunks:
+        put(key, "".join(chunks))
@@ -0,0 +1,144 @@
+import datetime
+import heapq
+import json
+import math
+from collections import Counter
+from typing import NamedTuple
+import records
+import storage
+import textproc
+
+# A per-user BM25 index over journal entries and mood descriptions, kept in the database next to the
+# entries themselves. Each new entry adds its postings in one small transaction (index_entry), and a
+# query only reads the postings of its own terms, so lookups stay in the milliseconds with thousands of
+# entries. A user's index is (re)built from their stored entries the first time it's needed, which also
+# covers bulk imports (storage drops the index whenever a user's record is replaced wholesale).
+
+BM25_K1 = 1.5 # Term-frequency saturation
+BM25_B = 0.75 # Document-length normalization
+KINDS = ("journal", "mood")
+
+
+class SearchHit(NamedTuple):
+    """One matching entry: its kind ('journal' or 'mood'), timestamp, indexed text and BM25 score."""
+    kind: str
+    timestamp: datetime.datetime
+    text: str
+    score: float
+    mood_text: str = None # Only set for mood hits
+
+
+def _entry_text(kind, entry):
+    """Returns the searchable text of a stored journal or mood entry."""
+    return (entry.get("content") if kind == "journal" else entry.get("description")) or ""
+
+
+def _add_document(conn, username, kind, seq, text):
+    """Adds one document's postings and length and updates the user's collection stats."""
+    terms = Counter(textproc.tokenize(text))
+    length = sum(terms.values())
+    if not length:
+        return
+    conn.execute(
+        "INSERT INTO search_docs (username, kind, seq, length) VALUES (?, ?, ?, ?)", (username, kind, seq, length)
+    )
+    conn.executemany(
+        "INSERT INTO search_postings (username, term, kind, seq, tf) VALUES (?, ?, ?, ?, ?)",
+        [(username, term, kind, seq, tf) for term, tf in terms.items()]
+    )
+    conn.execute(
+        "UPDATE search_stats SET doc_count = doc_count + 1, total_length = total_length + ? WHERE username = ?",
+        (length, username)
+    )
+
+
+def _build(conn, username):
+    """Indexes all of the user's stored journal entries and mood descriptions from scratch."""
+    for table in ("search_docs", "search_postings", "search_stats"):
+        conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+    conn.execute("INSERT INTO search_stats (username, doc_count, total_length) VALUES (?, 0, 0)", (username,))
+    for kind, table in (("journal", "journals"), ("mood", "moods")):
+        for row in conn.execute(f"SELECT seq, data FROM {table} WHERE username = ?", (username,)).fetchall():
+            _add_document(conn, username, kind, row["seq"], _entry_text(kind, json.loads(row["data"])))
+
+
+def _has_index(conn, username):
+    return conn.execute("SELECT 1 FROM search_stats WHERE username = ?", (username,)).fetchone() is not None
+
+
+def index_entry(username, kind, seq, entry):
+    """Adds a just-stored journal entry or mood (by its storage sequence number) to the user's index."""
+    with storage.transaction() as conn:
+        index_entries(conn, username, kind, [(seq, entry)])
+
+
+def index_entries(conn, username, kind, rows):
+    """
+    Adds just-stored entries, as (seq, entry) pairs, to the user's index. Runs inside the caller's
+    transaction, so a batch written with storage.insert_moods/insert_journals is indexed in the same commit.
+    """
+    if not _has_index(conn, username):
+        _build(conn, username) # Picks up these entries along with everything before them
+        return
+    for seq, entry in rows:
+        if conn.execute(
+            "SELECT 1 FROM search_docs WHERE username = ? AND kind = ? AND seq = ?", (username, kind, seq)
+        ).fetchone() is None:
+            _add_document(conn, username, kind, seq, _entry_text(kind, entry))
+
+
+def search(username, query, k=3, kinds=KINDS):
+    """Returns up to k SearchHits for the user's entries that best match the query (best first)."""
+    terms = set(textproc.tokenize(query))
+    if not terms or k <= 0:
+        return []
+    conn = storage.get_connection()
+    if not _has_index(conn, username):
+        with storage.transaction() as conn:
+            if not _has_index(conn, username):
+                _build(conn, username)
+
+    stats = conn.execute("SELECT doc_count, total_length FROM search_stats WHERE username = ?", (username,)).fetchone()
+    if not stats or not stats["doc_count"]:
+        return []
+    doc_count, avg_length = stats["doc_count"], stats["total_length"] / stats["doc_count"]
+
+    term_marks = ", ".join("?" * len(terms))
+    kind_marks = ", ".join("?" * len(kinds))
+    rows = conn.execute(
+        "SELECT p.term, p.kind, p.seq, p.tf, d.length FROM search_postings p "
+        "JOIN search_docs d ON d.username = p.username AND d.kind = p.kind AND d.seq = p.seq "
+        f"WHERE p.username = ? AND p.term IN ({term_marks}) AND p.kind IN ({kind_marks})",
+        (username, *terms, *kinds)
+    ).fetchall()
+
+    # Document frequencies are counted over all kinds so scores don't depend on the kinds filter
+    document_frequency = dict(conn.execute(
+        f"SELECT term, COUNT(*) FROM search_postings WHERE username = ? AND term IN ({term_marks}) GROUP BY term",
+        (username, *terms)
+    ).fetchall())
+    idf = {
+        term: math.log((doc_count - df + 0.5) / (df + 0.5) + 1) for term, df in document_frequency.items()
+    }
+
+    scores = Counter()
+    for row in rows:
+        tf = row["tf"]
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * row["length"] / avg_length)
+        scores[(row["kind"], row["seq"])] += idf[row["term"]] * tf * (BM25_K1 + 1) / (tf + norm)
+
+    hits = []
+    for (kind, seq), score in heapq.nlargest(k, scores.items(), key=lambda item: item[1]):
+        table = "journals" if kind == "journal" else "moods"
+        row = conn.execute(f"SELECT data FROM {table} WHERE seq = ?", (seq,)).fetchone()
+        if row is None:
+            continue
+        normalize = records.normalize_journal if kind == "journal" else records.normalize_mood
+        entry = normalize(json.loads(row["data"]))
+        if entry is None:
+            continue # Unusable stored entries are skipped, as they are on load
+        hits.append(SearchHit(
+            kind, datetime.datetime.fromisoformat(entry["timestamp"]), _entry_text(kind, entry), score,
+            entry.get("mood_text") if kind == "mood" else None
+        ))
+    return hits
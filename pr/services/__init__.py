@@ -0,0 +1,12 @@
+# The app's data logic without any Streamlit: each service works for one user and returns plain data
+# (dicts, lists, NamedTuples, DataFrames for charts). The pages in modules/ only render what these return,
+# so the same calls can be benchmarked (bench.py), run in worker processes or served to other frontends.
+
+from services.mood import MoodService
+from services.journal import JournalService
+from services.goals import GoalService
+from services.chat import ChatService
+from services.dashboard import DashboardService
+from services.transfer import TransferService
+
+__all__ = ["MoodService", "JournalService", "GoalService", "ChatService", "DashboardService", "TransferService"]
@@ -0,0 +1,74 @@
+import datetime
+import os
+from typing import NamedTuple
+import storage
+
+# Shared by the services' batch writes and paged reads (used by the HTTP API in api.py). A batch is
+# validated as a whole before anything is written, then applied in a single storage transaction, so it
+# is saved either completely or not at all.
+
+MAX_BATCH = int(os.environ.get("SOULSYNC_MAX_BATCH", "1000")) # Most entries accepted in one batch
+MAX_PAGE = 200 # Most entries returned in one page
+
+
+class ValidationError(ValueError):
+    """Some entries in a batch were invalid, so none were saved. `errors` lists {"index", "error"} per entry."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid entr{'y' if len(errors) == 1 else 'ies'}; nothing was saved.")
+        self.errors = errors
+
+
+class HistoryPage(NamedTuple):
+    items: list # Stored entry dicts, each with its "seq", newest first
+    next_cursor: str # Pass back to get the following page; None on the last page
+
+
+def validate_batch(items, clean):
+    """
+    Returns [clean(item) for item in items], where clean raises ValueError for a bad item.
+    Raises ValidationError listing every bad item (and for empty or oversized batches).
+    """
+    if not isinstance(items, list) or not items:
+        raise ValidationError([{"index": None, "error": "Expected a non-empty list of entries."}])
+    if len(items) > MAX_BATCH:
+        raise ValidationError([{"index": None, "error": f"At most {MAX_BATCH} entries per batch."}])
+    cleaned, errors = [], []
+    for i, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Expected an object.")
+            cleaned.append(clean(item))
+        except ValueError as e:
+            errors.append({"index": i, "error": str(e)})
+    if errors:
+        raise ValidationError(errors)
+    return cleaned
+
+
+def parse_timestamp(value):
+    """Returns the datetime for an optional ISO 8601 timestamp (now if missing). Raises ValueError if malformed."""
+    if value in (None, ""):
+        return datetime.datetime.now()
+    try:
+        moment = datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp '{value}' (expected ISO 8601).") from None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None) # Stored as local time, like entries logged in the app
+    return moment
+
+
+def page_history(username, table, limit, cursor=None):
+    """Returns a HistoryPage of the user's moods or journals, newest first, after the given cursor."""
+    limit = max(1, min(int(limit), MAX_PAGE))
+    before = None
+    if cursor:
+        timestamp, _, seq = cursor.rpartition("|")
+        if not timestamp or not seq.isdigit():
+            raise ValueError("Invalid cursor.")
+        before = (timestamp, int(seq))
+    rows = storage.page_entries(username, table, limit, before)
+    items = [dict(entry, seq=seq) for seq, entry in rows]
+    next_cursor = f"{items[-1]['timestamp']}|{items[-1]['seq']}" if len(items) == limit else None
+    return HistoryPage(items, next_cursor)
@@ -0,0 +1,155 @@
+import json
+from typing import NamedTuple
+import llm
+import jobs
+import response_cache
+import user_cache
+import chat_history
+import prompt_context
+
+CHAT_MODEL = "llama3-8b-8192"
+PROMPT_VERSION = 1 # Bump when the system prompt changes, so cached quick-action replies aren't reused
+
+
+class ChatPage(NamedTuple):
+    """The part of the conversation to show: the newest messages, and the summaries once all are shown."""
+    messages: list # {"seq", "role", "content"} dicts, oldest first
+    total: int # Messages kept verbatim
+    has_earlier: bool # More verbatim messages exist before these
+    summaries: list # Summaries of older conversation ({"content", "message_count", "created"}), or [] while has_earlier
+
+
+class PendingReply(NamedTuple):
+    """A reply being generated on a job worker."""
+    job_id: str
+    context_tokens: int # Size of the data summary the AI was given
+
+
+def get_ai_response(username, messages, context, cacheable=False, conversation_summary=None):
+    """
+    Streams an AI response based on user messages and a PromptContext built from their data.
+    Yields the reply in chunks as they arrive; close() the generator to abandon the request early.
+    With cacheable=True (quick actions), the reply to the last message is cached for as long as the
+    user's data in the context stays the same. conversation_summary, if given, recaps older chat turns.
+    Runs on a background job worker, so it doesn't touch Streamlit; raises llm.LLMError on failure.
+    """
+    system_prompt = f"""
+You are SoulSync, a helpful, emotionally intelligent, and insightful assistant.
+
+You support the user {username} with their emotional wellness and personal growth journey by:
+- Analyzing their data (goals, mood tracker, journals)
+- Providing empathetic, wise, and personalized reflections and insights
+- Never modifying or deleting data (strictly read-only)
+- Offering suggestions based on patterns and emotional context
+- Giving coaching-style advice to help the user reflect, grow, or make informed decisions
+
+User data (a summary; do not directly quote large sections unless asked):
+{context.text}
+
+Guidelines:
+- Always use warm, thoughtful, human-like responses.
+- Explain insights or summaries clearly and meaningfully.
+- Ask questions that encourage self-reflection when relevant.
+- If you don't understand the question, gently ask the user to clarify.
+- Be sensitive, kind, and emotionally aware at all times.
+- After providing an answer, sometimes gently prompt the user for further reflection or to explore related topics.
+- Keep responses concise but insightful.
+"""
+    if conversation_summary:
+        system_prompt += f"\nSummary of your earlier conversation with the user:\n{conversation_summary}\n"
+
+    try:
+        # Send a reasonable window of messages for context (e.g., last 5-6 turns)
+        # The system prompt is included first to ensure it's always considered.
+        contextual_messages = messages[-5:] if len(messages) >= 5 else messages
+
+        formatted_messages = [{"role": "system", "content": system_prompt}]
+        for msg in contextual_messages:
+            content = msg["content"]
+            if isinstance(content, dict):
+                content = json.dumps(content)
+            formatted_messages.append({"role": msg["role"], "content": content})
+
+        # Streamed through the shared gateway (pooled client, retries, timeouts, concurrency limit);
+        # closing this generator closes the gateway's stream too, e.g. when the user navigates away
+        def open_stream():
+            return llm.stream_chat(formatted_messages, model=CHAT_MODEL, temperature=0.7, max_tokens=540)
+        if cacheable:
+            cache_key = response_cache.make_key(
+                CHAT_MODEL, PROMPT_VERSION, response_cache.fingerprint(username, context.text), messages[-1]["content"]
+            )
+            reply_chunks = response_cache.cached_stream(cache_key, open_stream)
+        else:
+            reply_chunks = open_stream()
+        yield from reply_chunks
+
+    except llm.LLMNotConfigured as e:
+        yield str(e)
+
+
+class ChatService:
+    """The chatbot for one user: its history, suggested prompts, and replies generated in the background."""
+
+    def __init__(self, username):
+        self.username = username
+
+    def page(self, pages):
+        """Returns the latest `pages` pages (chat_history.PAGE_SIZE messages each) of the conversation."""
+        shown_limit = chat_history.PAGE_SIZE * pages
+        total = chat_history.message_count(self.username)
+        has_earlier = total > shown_limit
+        return ChatPage(
+            chat_history.recent_messages(self.username, shown_limit), total, has_earlier,
+            [] if has_earlier else chat_history.summaries(self.username)
+        )
+
+    def suggested_prompts(self):
+        """Returns the quick-action prompts that make sense for the user's data."""
+        user_data = user_cache.get_user(self.username) or {}
+        suggested_prompts = []
+        if user_data.get("goals"):
+            suggested_prompts.append("Summarize my goals.")
+        if user_data.get("moods"):
+            suggested_prompts.append("What's my recent mood trend?")
+        if user_data.get("journals"):
+            suggested_prompts.append("Tell me about my recent journal entries.")
+        suggested_prompts.append("Give me a general motivational message.")
+        suggested_prompts.append("How can I improve my well-being?")
+        return suggested_prompts
+
+    def ask(self, query, quick_action=False):
+        """
+        Queues the AI response to the user's query as a background job (cached for quick actions) and returns
+        a PendingReply. Poll it with reply_status(); the turn is saved when the reply completes.
+        """
+        username = self.username
+        user_message = {"role": "user", "content": query}
+
+        # Summarize the user's data for the AI within a fixed token budget (no password, email or chat history)
+        context = prompt_context.build_context(username, user_cache.get_user(username) or {}, query)
+
+        # Quick actions are self-contained (and cached), so only free-form questions get the older conversation's recap
+        recent = chat_history.recent_messages(username, 4)
+        summary = None if quick_action else chat_history.latest_summary(username)
+
+        def save_turn(ai_response):
+            # Only a completed turn is kept: the user's question and the full reply. This runs on the worker,
+            # so the turn is saved even if the user has left the page by then.
+            chat_history.append_turn(username, [user_message, {"role": "assistant", "content": ai_response}])
+
+        job_id = jobs.submit(
+            "chat",
+            lambda: get_ai_response(username, recent + [user_message], context, cacheable=quick_action, conversation_summary=summary),
+            on_complete=save_turn
+        )
+        return PendingReply(job_id, context.tokens)
+
+    @staticmethod
+    def reply_status(job_id):
+        """Returns the reply's JobStatus (text so far, and whether it finished), or None if it was lost."""
+        return jobs.status(job_id)
+
+    @staticmethod
+    def cancel(job_id):
+        """Stops generating a reply."""
+        jobs.cancel(job_id)
@@ -0,0 +1,126 @@
+import datetime
+from typing import NamedTuple
+import pandas as pd
+import aggregation
+import mood_analytics
+import insights
+import journal_features
+import metrics
+import user_cache
+
+THEME_TERMS = 8 # Terms listed under "Recurring Themes" and "On Harder Days"
+
+
+class MoodOverview(NamedTuple):
+    frame: pd.DataFrame # Entries in the selected range (Datetime, Mood Value, ...), or None if there are none
+    average: pd.Series # Mean mood per period, or None
+    distribution: pd.DataFrame # Entries per mood per period, or None
+
+
+class GoalSummary(NamedTuple):
+    total: int
+    counts: dict # status -> count, for every status in aggregation.GOAL_STATUSES
+    chart: pd.DataFrame # Status -> Count, statuses with no goals left out
+
+
+class JournalOverview(NamedTuple):
+    entries: int
+    sentiment: pd.DataFrame # Sentiment and its 7-day average per day
+    themes: list # [(term, entries)]
+    hard_day_themes: list # The same, over negative entries only
+    insights: dict # The precomputed insight document (see insights.py), or None if not generated yet
+
+
+class DashboardView(NamedTuple):
+    moods: MoodOverview # None without moods
+    mood_stats: dict # mood_analytics.summary(), or None
+    mood_trends: pd.DataFrame # Moving averages and trend per day, or None
+    goals: GoalSummary # None without goals
+    journals: JournalOverview # None without journal entries
+
+
+class DashboardService:
+    """Everything the Visual Dashboard shows for one user, as data."""
+
+    def __init__(self, username):
+        self.username = username
+
+    def _user_data(self):
+        return user_cache.get_user(self.username) or {}
+
+    def mood_span(self):
+        """Returns (first day, last day) of the user's mood history, or None without moods."""
+        user_moods = self._user_data().get("moods")
+        if not user_moods:
+            return None
+        return user_moods.first_timestamp().date(), user_moods.last_timestamp().date()
+
+    @metrics.timed("dashboard.mood_overview")
+    def mood_overview(self, start_day=None, end_day=None, period="day"):
+        """Returns a MoodOverview for entries between start_day and end_day (default: all of them), or None without moods."""
+        user_moods = self._user_data().get("moods")
+        if not user_moods:
+            return None
+        # user_moods is a MoodSeries: columnar and already sorted, so a date range is just a binary search
+        start_dt = datetime.datetime.combine(start_day, datetime.time.min) if start_day else None
+        end_dt = datetime.datetime.combine(end_day, datetime.time.max) if end_day else None
+        lo, hi = user_moods.index_range(start_dt, end_dt)
+        if hi <= lo:
+            return MoodOverview(None, None, None)
+
+        # Build the frame straight from the columns; they're in time order, so no sort is needed
+        df_moods = aggregation.series_frame(user_moods, lo, hi)
+        if (lo, hi) == (0, len(user_moods)):
+            # Whole history: read the precomputed rollups instead of regrouping every entry
+            mood_counts = aggregation.mood_distribution(self.username, period)
+            average_mood = aggregation.mean_mood(self.username, period)
+        else:
+            mood_counts = aggregation.range_distribution(df_moods, period)
+            average_mood = aggregation.range_mean(df_moods, period)
+        return MoodOverview(df_moods, average_mood, mood_counts)
+
+    @metrics.timed("dashboard.mood_stats")
+    def mood_stats(self):
+        """Returns (rolling statistics, daily trend frame), or (None, None) without moods."""
+        mood_stats = mood_analytics.summary(self.username)
+        if not mood_stats:
+            return None, None
+        return mood_stats, mood_analytics.daily_trends(self.username)[["7-day Average", "30-day Average", "Trend"]]
+
+    @metrics.timed("dashboard.goal_summary")
+    def goal_summary(self):
+        """Returns a GoalSummary, or None without goals."""
+        user_goals = self._user_data().get("goals")
+        if not user_goals:
+            return None
+        # Counters are maintained as goals are added, edited and deleted, so there's nothing to recount here
+        status_counts = aggregation.goal_status_counts(self.username)
+        counts = {status: status_counts.get(status, 0) for status in aggregation.GOAL_STATUSES}
+        chart = pd.DataFrame({"Status": list(counts), "Count": list(counts.values())})
+        # Filter out statuses with 0 count for better visualization
+        chart = chart[chart["Count"] > 0].set_index("Status")
+        return GoalSummary(len(user_goals), counts, chart)
+
+    @metrics.timed("dashboard.journal_overview")
+    def journal_overview(self):
+        """Returns a JournalOverview, or None without journal entries."""
+        user_journals = self._user_data().get("journals")
+        if not user_journals:
+            return None
+        # Sentiment and themes are computed locally per entry as it's saved, so they're always current;
+        # the insight document is precomputed by `python insights.py`
+        return JournalOverview(
+            len(user_journals),
+            journal_features.sentiment_by_day(self.username),
+            journal_features.top_terms(self.username, THEME_TERMS),
+            journal_features.top_terms(self.username, THEME_TERMS, negative_only=True),
+            insights.load_insights(self.username)
+        )
+
+    def view(self, start_day=None, end_day=None, period="day"):
+        """Returns every dashboard section at once as a DashboardView."""
+        mood_stats, mood_trends = self.mood_stats()
+        return DashboardView(
+            self.mood_overview(start_day, end_day, period), mood_stats, mood_trends,
+            self.goal_summary(), self.journal_overview()
+        )
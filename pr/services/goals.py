@@ -0,0 +1,107 @@
+import datetime
+import uuid # For generating unique IDs for goals
+import storage
+import user_cache
+from goal_repository import GoalRepository, STATUSES
+from services.batch import validate_batch
+
+SORT_OPTIONS = ("None", "Due Date (Asc)", "Due Date (Desc)", "Status")
+REMINDER_DAYS = 7 # Goals due within this many days are listed as "due soon"
+
+
+class GoalService:
+    """Adding, editing and listing one user's goals."""
+
+    def __init__(self, username):
+        self.username = username
+
+    def goals(self):
+        """Returns the user's GoalRepository (indexed by id, status and due date; shared with the cache: read only)."""
+        return (user_cache.get_user(self.username) or {}).get("goals") or GoalRepository()
+
+    def get(self, goal_id):
+        """Returns one goal dict, or None."""
+        return self.goals().get(goal_id)
+
+    def list(self, statuses=STATUSES, sort_by="None"):
+        """Returns the goals with the given statuses, in one of the SORT_OPTIONS orders."""
+        user_goals = self.goals()
+        # The repository keeps goals ordered by due date and grouped by status, so none of these sort
+        if sort_by == "Due Date (Asc)":
+            return user_goals.by_due_date(statuses) # Goals without a due date come last
+        if sort_by == "Due Date (Desc)":
+            return user_goals.by_due_date(statuses, descending=True) # Still last
+        if sort_by == "Status":
+            return user_goals.by_status(statuses) # To Do, In Progress, Completed, Cancelled
+        return user_goals.with_status(statuses)
+
+    def reminders(self, days=REMINDER_DAYS):
+        """Returns (overdue goals, goals due within `days` days), both soonest first."""
+        user_goals = self.goals()
+        return user_goals.overdue(), user_goals.due_within(days)
+
+    def add(self, title, description="", due_date=None, status="To Do"):
+        """Adds a new goal. Returns (success, message)."""
+        if not title:
+            return False, "Goal Title cannot be empty."
+        new_goal = {
+            "id": str(uuid.uuid4()), # Unique ID for the goal
+            "title": title,
+            "description": description,
+            "due_date": str(due_date) if due_date else None,
+            "status": status
+        }
+        storage.insert_goal(self.username, new_goal)
+        return True, "Goal added successfully!"
+
+    def update(self, goal_id, title, description, due_date, status):
+        """Updates an existing goal. Returns (success, message)."""
+        if not title:
+            return False, "Goal Title cannot be empty."
+        updated = storage.update_goal(self.username, goal_id, {
+            "title": title,
+            "description": description,
+            "due_date": str(due_date) if due_date else None,
+            "status": status
+        })
+        if updated:
+            return True, "Goal updated successfully!"
+        return False, "Goal not found."
+
+    def delete(self, goal_id):
+        """Deletes a goal. Returns (success, message)."""
+        if storage.delete_goal(self.username, goal_id):
+            return True, "Goal deleted successfully!"
+        return False, "Goal not found."
+
+    @staticmethod
+    def new_goal(item):
+        """Builds a goal to store from an API or import dict. Raises ValueError if it is invalid."""
+        title = item.get("title")
+        if not isinstance(title, str) or not title.strip():
+            raise ValueError("Goal Title cannot be empty.")
+        status = item.get("status") or "To Do"
+        if status not in STATUSES:
+            raise ValueError(f"Unknown status '{status}' (expected one of: {', '.join(STATUSES)}).")
+        due_date = item.get("due_date")
+        if due_date:
+            try:
+                due_date = datetime.date.fromisoformat(str(due_date)).isoformat()
+            except ValueError:
+                raise ValueError(f"Invalid due_date '{due_date}' (expected YYYY-MM-DD).") from None
+        return {
+            "id": str(uuid.uuid4()),
+            "title": title.strip(),
+            "description": item.get("description") or "",
+            "due_date": due_date or None,
+            "status": status
+        }
+
+    def add_many(self, items):
+        """
+        Adds a batch of goals ({"title", "description"?, "due_date"?, "status"?} dicts) in one commit.
+        Returns the new goals. Raises ValidationError (and saves nothing) if any is invalid.
+        """
+        new_goals = validate_batch(items, self.new_goal)
+        storage.insert_goals(self.username, new_goals)
+        return new_goals
@@ -0,0 +1,113 @@
+import contextlib
+import datetime
+import heapq
+import storage
+import search_index
+import journal_features
+import llm
+import jobs
+import user_cache
+import response_cache
+from services.batch import validate_batch, parse_timestamp, page_history
+
+REFLECTION_MODEL = "llama-3.3-70b-versatile" # Using the model specified by the user
+REFLECTION_PROMPT_VERSION = 1 # Bump when the reflection prompt changes, so cached reflections aren't reused
+REFLECTION_PROMPT = "You are a compassionate and empathetic AI. Provide a gentle, supportive, and reflective response to the user's journal entry. Keep it concise and encouraging, focusing on emotional well-being. Do not offer advice unless explicitly asked, instead, reflect on their feelings. If the entry is short, you can ask a gentle follow-up question."
+
+
+def get_ai_reflection(journal_entry, username):
+    """
+    Streams an AI reflection on a journal entry in chunks as it's generated. Reflections on the same entry
+    text by the same user are served from the response cache. Errors are yielded as a message rather than raised
+    (after whatever part of the reflection had arrived, if it broke off mid-reply).
+    """
+    # The shared gateway reads the API key from env and handles retries, timeouts and concurrency
+    def open_stream():
+        return llm.stream_chat(
+            messages=[
+                {"role": "system", "content": REFLECTION_PROMPT},
+                {"role": "user", "content": f"My journal entry: {journal_entry}"}
+            ],
+            model=REFLECTION_MODEL,
+            temperature=0.7, # Adjust for creativity
+            max_tokens=150 # Limit response length
+        )
+    # Scoped to the user, so one user's entry text never gets (or, by a fast reply, reveals) another's reflection
+    cache_key = response_cache.make_key(
+        REFLECTION_MODEL, REFLECTION_PROMPT_VERSION, response_cache.fingerprint(username), journal_entry
+    )
+    received = False
+    try:
+        # Closing this generator closes the stream too
+        with contextlib.closing(response_cache.cached_stream(cache_key, open_stream)) as chunks:
+            for text in chunks:
+                received = True
+                yield text
+    except llm.LLMNotConfigured:
+        yield "Groq API key not found in environment variables. Please set the 'GROQ_API_KEY' environment variable."
+    except llm.LLMError as e:
+        yield ("\n\n" if received else "") + f"I'm sorry, I'm having trouble connecting to the AI. Error: {e} Please ensure your 'GROQ_API_KEY' is correct and you have an internet connection."
+
+
+class JournalService:
+    """Writing journal entries, reading them back and requesting AI reflections for one user."""
+
+    def __init__(self, username):
+        self.username = username
+
+    def entries(self):
+        """Returns the user's JournalRecords in the order they were written (shared with the cache: read only)."""
+        return (user_cache.get_user(self.username) or {}).get("journals", [])
+
+    def recent(self, limit):
+        """Returns the newest `limit` JournalRecords, most recent first (a bounded heap, not a sort of the whole history)."""
+        return heapq.nlargest(limit, self.entries(), key=lambda x: x.timestamp)
+
+    def history_page(self, limit, cursor=None):
+        """Returns a HistoryPage of stored journal entries, newest first."""
+        return page_history(self.username, "journals", limit, cursor)
+
+    @staticmethod
+    def new_entry(content, when):
+        """Builds a journal entry to store. Raises ValueError if it is empty."""
+        if content is not None and not isinstance(content, str):
+            raise ValueError("The entry's content must be text.")
+        content = (content or "").strip()
+        if not content:
+            raise ValueError("Please write something before saving your entry.")
+        return {
+            "timestamp": when.isoformat(),
+            "content": content,
+            "date": when.date().isoformat() # Add date for compatibility/display
+        }
+
+    def add(self, content):
+        """Saves a new entry. Returns (success, message)."""
+        try:
+            new_entry = self.new_entry(content, datetime.datetime.now())
+        except ValueError as e:
+            return False, str(e)
+        seq = storage.insert_journal(self.username, new_entry) # Only inserts this one row
+        search_index.index_entry(self.username, "journal", seq, new_entry) # Adds just this entry's terms
+        journal_features.record_entry(self.username, seq, new_entry) # Local sentiment and keywords for the dashboard
+        return True, "Your entry has been saved!"
+
+    def add_many(self, entries):
+        """
+        Saves a batch of entries ({"content", "timestamp"?} dicts) in one commit, with their search index and
+        features. Returns the new sequence numbers. Raises ValidationError (and saves nothing) if any is invalid.
+        """
+        new_entries = validate_batch(entries, lambda e: self.new_entry(e.get("content"), parse_timestamp(e.get("timestamp"))))
+        return [seq for seq, _ in self.store_many(new_entries)]
+
+    def store_many(self, new_entries):
+        """Stores already validated entries (see new_entry) in one commit with their index and features. Returns [(seq, entry)]."""
+        def index(conn, rows):
+            search_index.index_entries(conn, self.username, "journal", rows)
+            journal_features.record_entries(conn, self.username, rows)
+        return storage.insert_journals(self.username, new_entries, after_insert=index)
+
+    def request_reflection(self, content):
+        """Starts generating a reflection on a background worker. Returns the job id (poll it with jobs.status)."""
+        entry_text = content.strip()
+        return jobs.submit("reflection", lambda: get_ai_reflection(entry_text, self.username))
@@ -0,0 +1,76 @@
+import datetime
+import storage
+import mood_analytics
+import search_index
+import user_cache
+from mood_series import MoodSeries
+from records import MOOD_EMOJIS
+from services.batch import validate_batch, parse_timestamp, page_history
+
+
+class MoodService:
+    """Logging moods and reading one user's mood history."""
+
+    def __init__(self, username):
+        self.username = username
+
+    def moods(self):
+        """Returns the user's MoodSeries (time-ordered, shared with the cache: read only)."""
+        return (user_cache.get_user(self.username) or {}).get("moods") or MoodSeries()
+
+    def recent(self, limit):
+        """Returns the newest `limit` MoodRecords, most recent first."""
+        return self.moods().latest(limit)
+
+    def history_page(self, limit, cursor=None):
+        """Returns a HistoryPage of stored mood entries, newest first."""
+        return page_history(self.username, "moods", limit, cursor)
+
+    @staticmethod
+    def new_entry(mood_text, mood_emoji, description, when):
+        """Builds a mood entry to store. Raises ValueError for an unknown mood."""
+        if mood_text not in MOOD_EMOJIS:
+            raise ValueError(f"Unknown mood '{mood_text}'.")
+        if description is not None and not isinstance(description, str):
+            raise ValueError("The mood's description must be text.")
+        return {
+            "timestamp": when.isoformat(), # ISO format for easy storage and retrieval
+            "mood_text": mood_text,
+            "mood_emoji": mood_emoji or MOOD_EMOJIS[mood_text],
+            "description": description or "",
+            "date": when.date().isoformat(), # Add date for consistency with older formats if needed
+            "time": when.strftime("%H:%M:%S") # Add time for consistency
+        }
+
+    def add(self, mood_text, mood_emoji=None, description=""):
+        """Logs a mood now. Returns (success, message)."""
+        try:
+            new_mood_entry = self.new_entry(mood_text, mood_emoji, description, datetime.datetime.now())
+        except ValueError as e:
+            return False, str(e)
+        mood_emoji = new_mood_entry["mood_emoji"]
+        seq = storage.insert_mood(self.username, new_mood_entry) # Only inserts this one row
+        mood_analytics.record_mood(self.username, new_mood_entry) # Advance the running streaks/averages by one entry
+        if description:
+            search_index.index_entry(self.username, "mood", seq, new_mood_entry) # Make the note searchable for the chatbot
+        return True, f"Your mood '{mood_text} {mood_emoji}' has been logged!"
+
+    def add_many(self, entries):
+        """
+        Logs a batch of moods ({"mood_text", "description"?, "mood_emoji"?, "timestamp"?} dicts) in one commit,
+        indexing their notes in the same transaction. Returns the new sequence numbers.
+        Raises ValidationError (and saves nothing) if any entry is invalid.
+        """
+        new_entries = validate_batch(entries, lambda e: self.new_entry(
+            e.get("mood_text"), e.get("mood_emoji"), e.get("description"), parse_timestamp(e.get("timestamp"))
+        ))
+        return [seq for seq, _ in self.store_many(new_entries)]
+
+    def store_many(self, new_entries):
+        """Stores already validated entries (see new_entry) in one commit with their notes indexed. Returns [(seq, entry)]."""
+        rows = storage.insert_moods(
+            self.username, new_entries,
+            after_insert=lambda conn, rows: search_index.index_entries(conn, self.username, "mood", [r for r in rows if r[1].get("description")])
+        )
+        # The running statistics notice the new entries and rebuild from the rollups on their next read
+        return rows
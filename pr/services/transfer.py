@@ -0,0 +1,38 @@
+import io
+import tempfile
+import transfer
+
+
+class TransferService:
+    """Downloading and uploading one user's moods, journal entries and goals as files (see transfer.py)."""
+
+    def __init__(self, username):
+        self.username = username
+
+    def export(self, fmt):
+        """
+        Writes the user's entries as UTF-8 in the given format ("jsonl", "csv" or "columnar") to a temporary
+        file, chunk by chunk, and returns it open at the start (it is deleted when closed). Building it never
+        holds more than a chunk in memory; st.download_button still reads the finished file into memory to serve it.
+        """
+        file = tempfile.TemporaryFile(buffering=0) # Unbuffered (a raw file), which st.download_button accepts
+        text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        transfer.write_records(transfer.export_records([self.username], transfer.PERSONAL_KINDS), text, fmt)
+        text.flush()
+        text.detach() # Leaves the file open
+        file.seek(0)
+        return file
+
+    @staticmethod
+    def file_name(fmt):
+        return {"jsonl": "soulsync.jsonl", "csv": "soulsync.csv", "columnar": "soulsync.columnar.jsonl"}[fmt]
+
+    def import_file(self, binary_file, file_name):
+        """
+        Adds the entries in an uploaded file (format by file name), skipping ones already stored. Every record
+        goes to this user, whatever its "user" field says. Returns a transfer.ImportReport.
+        Raises ValueError if the format can't be told from the name.
+        """
+        fmt = transfer.guess_format(file_name)
+        stream = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="") # Read line by line, not decoded whole
+        return transfer.import_records(transfer.read_records(stream, fmt), self.username, transfer.PERSONAL_KINDS)
@@ -0,0 +1,902 @@
+import sqlite3
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import metrics
+import passwords
+import records
+from mood_series import MoodSeries
+from goal_repository import GoalRepository
+
+DB_FILE = os.environ.get("SOULSYNC_DB", "soulsync.db")
+LEGACY_USERS_FILE = "users.json" # The old single-file store, imported once on first start
+
+# Writes are appended to SQLite's write-ahead log (WAL) and only fsync'd when the log is folded back into
+# the main file (a checkpoint), so a new mood/journal/chat entry costs one small append, not a rewrite.
+# Checkpoints are taken off the request path by a background compactor every COMPACT_INTERVAL seconds.
+COMPACT_INTERVAL = float(os.environ.get("SOULSYNC_COMPACT_INTERVAL", "60"))
+WAL_AUTOCHECKPOINT_PAGES = 10000 # Safety net if the compactor isn't running (e.g. CLI tools)
+
+# Each collection lives in its own table, keyed by username so a write only touches the rows it changes.
+# The full record is kept as JSON in 'data' so older entries keep any extra keys they were saved with.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL DEFAULT '', -- Legacy plaintext, moved into credentials and blanked on startup
+    email TEXT NOT NULL DEFAULT '',
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS credentials (
+    username TEXT PRIMARY KEY REFERENCES users(username) ON DELETE CASCADE,
+    password_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS goals (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    status TEXT,
+    due_date TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (username, id)
+);
+CREATE INDEX IF NOT EXISTS idx_goals_user_due ON goals(username, due_date);
+CREATE TABLE IF NOT EXISTS moods (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_moods_user_ts ON moods(username, timestamp);
+CREATE TABLE IF NOT EXISTS journals (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_journals_user_ts ON journals(username, timestamp);
+CREATE TABLE IF NOT EXISTS chat_history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_user_seq ON chat_history(username, seq);
+CREATE TABLE IF NOT EXISTS chat_summaries (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    content TEXT NOT NULL,
+    message_count INTEGER NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_summaries_user_seq ON chat_summaries(username, seq);
+CREATE TABLE IF NOT EXISTS user_versions (
+    username TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS mood_rollups (
+    username TEXT NOT NULL,
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    mood_text TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_count INTEGER NOT NULL DEFAULT 0, -- Entries with a mood_value; means are value_sum / value_count
+    PRIMARY KEY (username, period, bucket, mood_text)
+);
+CREATE TABLE IF NOT EXISTS goal_status_counts (
+    username TEXT NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (username, status)
+);
+CREATE TABLE IF NOT EXISTS mood_stats (
+    username TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS search_docs (
+    username TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (username, kind, seq)
+);
+CREATE TABLE IF NOT EXISTS search_postings (
+    username TEXT NOT NULL,
+    term TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (username, term, kind, seq)
+);
+CREATE TABLE IF NOT EXISTS search_stats (
+    username TEXT PRIMARY KEY,
+    doc_count INTEGER NOT NULL,
+    total_length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS journal_features (
+    username TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    date TEXT,
+    sentiment REAL NOT NULL,
+    word_count INTEGER NOT NULL,
+    terms TEXT NOT NULL,
+    PRIMARY KEY (username, seq)
+);
+CREATE TABLE IF NOT EXISTS insights (
+    username TEXT PRIMARY KEY,
+    user_version INTEGER NOT NULL,
+    insights_version INTEGER NOT NULL,
+    generated TEXT NOT NULL,
+    document TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used);
+"""
+
+# Rollup bucket for each period, as an SQL expression over an ISO timestamp. Weeks start on Monday.
+# The same expressions are used for incremental updates and full rebuilds so the buckets always agree.
+ROLLUP_PERIODS = {
+    "day": "date({ts})",
+    "week": "date({ts}, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m-01', {ts})"
+}
+ROLLUPS_VERSION = 2
+
+COLLECTIONS = ("goals", "moods", "journals")
+# Chat is stored apart from the record the pages load (see chat_history.py); whole-store exports include it
+CHAT_COLLECTIONS = ("chat_history", "chat_summaries")
+
+_local = threading.local() # One connection per thread; Streamlit serves each session on its own thread
+_compactor_lock = threading.Lock()
+_compactor_thread = None
+_probe_lock = threading.Lock()
+_probe_conn = None
+
+
+def _connect():
+    """Opens a new connection configured for WAL appends."""
+    # isolation_level=None lets us issue BEGIN/COMMIT ourselves (see transaction())
+    conn = sqlite3.connect(DB_FILE, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL") # fsync at checkpoints only, not on every commit
+    conn.execute(f"PRAGMA wal_autocheckpoint = {WAL_AUTOCHECKPOINT_PAGES}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def get_connection():
+    """Returns this thread's connection to the database, creating the schema on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _connect()
+        conn.executescript(SCHEMA)
+        _add_missing_columns(conn)
+        _local.conn = conn
+        _import_legacy_file_once(conn)
+        _migrate_records_once(conn)
+        _hash_plaintext_passwords_once(conn)
+        _fill_legacy_goal_ids_once(conn)
+        _build_rollups_once(conn)
+        start_compactor()
+    return conn
+
+
+def _add_missing_columns(conn):
+    """Adds columns introduced after a table was first created (CREATE TABLE IF NOT EXISTS leaves it as it was)."""
+    columns = {r["name"] for r in conn.execute("PRAGMA table_info(mood_rollups)")}
+    if "value_count" not in columns:
+        try:
+            conn.execute("ALTER TABLE mood_rollups ADD COLUMN value_count INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass # Another session added it first; the rollups are rebuilt for the new ROLLUPS_VERSION anyway
+
+
+@contextmanager
+def transaction():
+    """
+    Runs the enclosed statements as one atomic write.
+    BEGIN IMMEDIATE takes the write lock up front, so two sessions writing at once are serialized
+    instead of overwriting each other.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _prepare(entry, normalize):
+    """
+    Returns (timestamp column, entry to store) for a mood/journal entry in any shape. Only entries that
+    normalized get a timestamp; the others are kept as they were with a NULL one, so loading, paging and
+    the rollups (which all require it) skip them.
+    """
+    normalized = normalize(entry)
+    if normalized is None:
+        return None, entry
+    return normalized["timestamp"], normalized
+
+
+def _ensure_user(conn, username):
+    """Creates an empty user row if needed so collection rows always have an owner."""
+    conn.execute("INSERT OR IGNORE INTO users (username) VALUES (?)", (username,))
+
+
+def _bump_version(conn, username):
+    """Marks the user's data as changed; read caches compare this counter to decide whether to reload."""
+    conn.execute(
+        "INSERT INTO user_versions (username, version) VALUES (?, 1) "
+        "ON CONFLICT(username) DO UPDATE SET version = version + 1",
+        (username,)
+    )
+
+
+# --- Change detection (used by user_cache) ---
+def data_version():
+    """
+    Returns a number that changes whenever any connection commits a write to the database.
+    Reading it only checks SQLite's shared-memory index, so it is cheap enough to call on every rerun.
+    """
+    global _probe_conn
+    with _probe_lock:
+        if _probe_conn is None:
+            get_connection() # Make sure the database and its schema exist
+            _probe_conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        return _probe_conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def get_user_version(username):
+    """Returns the user's change counter (0 if they've never been written)."""
+    row = get_connection().execute(
+        "SELECT version FROM user_versions WHERE username = ?", (username,)
+    ).fetchone()
+    return row["version"] if row else 0
+
+
+# --- Users ---
+def get_account(username):
+    """Returns the user's account fields (email) without loading any collections, or None."""
+    row = get_connection().execute(
+        "SELECT username, email FROM users WHERE username = ?", (username,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def get_password_hash(username):
+    """Returns the user's stored password hash (see passwords.py), or None."""
+    row = get_connection().execute(
+        "SELECT password_hash FROM credentials WHERE username = ?", (username,)
+    ).fetchone()
+    return row["password_hash"] if row else None
+
+
+def set_password_hash(username, password_hash):
+    """Stores a new password hash for an existing user."""
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO credentials (username, password_hash) VALUES (?, ?) "
+            "ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash",
+            (username, password_hash)
+        )
+
+
+def create_user(username, password_hash, email):
+    """Creates a new user with an already hashed password. Returns False if the username is already taken."""
+    try:
+        with transaction() as conn:
+            conn.execute("INSERT INTO users (username, email) VALUES (?, ?)", (username, email))
+            conn.execute("INSERT INTO credentials (username, password_hash) VALUES (?, ?)", (username, password_hash))
+            _bump_version(conn, username)
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+def get_user(username, include_chat=False):
+    """
+    Assembles the record for one user in the same shape users.json used, or None. The password is never
+    included, except as its hash in whole-store exports (include_chat=True), along with the chat history
+    and its summaries.
+    """
+    with metrics.span("storage.get_user", chat=include_chat) as span:
+        user_data = _read_user(username, include_chat)
+        if user_data is not None:
+            span.set(moods=len(user_data["moods"]), journals=len(user_data["journals"]), goals=len(user_data["goals"]))
+        return user_data
+
+
+def _read_user(username, include_chat):
+    """get_user without the span."""
+    conn = get_connection()
+    row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+    if row is None:
+        return None
+    user_data = json.loads(row["extra"])
+    user_data["email"] = row["email"]
+    # Goals come with their id, status and due-date indexes built once here, not on every rerun
+    user_data["goals"] = GoalRepository(json.loads(r["data"]) for r in conn.execute(
+        "SELECT data FROM goals WHERE username = ? ORDER BY rowid", (username,)))
+    # Moods and journals are parsed here, once per load, instead of on every render.
+    # Moods come back from the (username, timestamp) index already in time order, ready for the columnar series
+    # (entries that never normalized have no timestamp, so they're left out here as in the rollups).
+    with metrics.span("records.parse_moods"):
+        user_data["moods"] = MoodSeries.from_dicts(json.loads(r["data"]) for r in conn.execute(
+            "SELECT data FROM moods WHERE username = ? AND timestamp IS NOT NULL ORDER BY timestamp, seq", (username,)))
+    with metrics.span("records.parse_journals"):
+        user_data["journals"] = _load_records(conn, "journals", username, records.journal_from_dict)
+    if include_chat:
+        user_data["password"] = get_password_hash(username) or ""
+        user_data["chat_history"] = [
+            {"role": r["role"], "content": json.loads(r["content"])}
+            for r in conn.execute("SELECT role, content FROM chat_history WHERE username = ? ORDER BY seq", (username,))
+        ]
+        user_data["chat_summaries"] = [
+            {"content": r["content"], "message_count": r["message_count"], "created": r["created"]}
+            for r in conn.execute(
+                "SELECT content, message_count, created FROM chat_summaries WHERE username = ? ORDER BY seq", (username,))
+        ]
+    return user_data
+
+
+def _load_records(conn, table, username, from_dict):
+    """Loads a user's rows as typed records, skipping entries that never normalized."""
+    loaded = []
+    for r in conn.execute(f"SELECT data FROM {table} WHERE username = ? ORDER BY seq", (username,)):
+        record = from_dict(json.loads(r["data"]))
+        if record is not None:
+            loaded.append(record)
+    return loaded
+
+
+def list_usernames():
+    """Returns every registered username."""
+    return [r["username"] for r in get_connection().execute("SELECT username FROM users ORDER BY username")]
+
+
+# --- Rollups (kept up to date in the same transaction as the write that changes them) ---
+def _add_mood_to_rollups(conn, username, entry):
+    """Counts one normalized mood entry into the user's daily, weekly and monthly rollups."""
+    valued = entry.get("mood_value") is not None
+    for period, bucket_sql in ROLLUP_PERIODS.items():
+        conn.execute(
+            "INSERT INTO mood_rollups (username, period, bucket, mood_text, count, value_sum, value_count) "
+            f"VALUES (?, ?, {bucket_sql.format(ts='?')}, ?, 1, ?, ?) "
+            "ON CONFLICT(username, period, bucket, mood_text) DO UPDATE SET count = count + 1, "
+            "value_sum = value_sum + excluded.value_sum, value_count = value_count + excluded.value_count",
+            (username, period, entry["timestamp"], entry["mood_text"], entry["mood_value"] if valued else 0, int(valued))
+        )
+
+
+def _adjust_goal_status(conn, username, status, delta):
+    """Adds delta to the user's counter for one goal status."""
+    conn.execute(
+        "INSERT INTO goal_status_counts (username, status, count) VALUES (?, ?, ?) "
+        "ON CONFLICT(username, status) DO UPDATE SET count = count + excluded.count",
+        (username, status or "", delta)
+    )
+
+
+def _rebuild_derived(conn, username=None):
+    """Recomputes mood rollups and goal status counts from scratch, and drops other derived state, for one user or everyone."""
+    where, params = ("WHERE username = ?", (username,)) if username else ("", ())
+    conn.execute(f"DELETE FROM mood_rollups {where}", params)
+    conn.execute(f"DELETE FROM goal_status_counts {where}", params)
+    # Derived per-user state that its owner rebuilds on demand: mood_analytics, search_index, journal_features
+    for table in ("mood_stats", "search_docs", "search_postings", "search_stats", "journal_features"):
+        conn.execute(f"DELETE FROM {table} {where}", params)
+    # Only entries that normalized, as on load (older databases may still hold unusable rows with a timestamp)
+    mood_filter = (f"{where} {'AND' if where else 'WHERE'} date(timestamp) IS NOT NULL "
+                   "AND json_extract(data, '$.mood_text') IS NOT NULL")
+    for period, bucket_sql in ROLLUP_PERIODS.items():
+        conn.execute(
+            "INSERT INTO mood_rollups (username, period, bucket, mood_text, count, value_sum, value_count) "
+            f"SELECT username, ?, {bucket_sql.format(ts='timestamp')}, json_extract(data, '$.mood_text'), "
+            "COUNT(*), COALESCE(SUM(json_extract(data, '$.mood_value')), 0), COUNT(json_extract(data, '$.mood_value')) "
+            f"FROM moods {mood_filter} GROUP BY 1, 2, 3, 4",
+            (period,) + params
+        )
+    conn.execute(
+        "INSERT INTO goal_status_counts (username, status, count) "
+        f"SELECT username, COALESCE(status, ''), COUNT(*) FROM goals {where} GROUP BY 1, 2",
+        params
+    )
+
+
+# --- Row-level collection APIs ---
+def insert_mood(username, entry):
+    """Appends one mood entry for the user. Returns the new row's sequence number."""
+    timestamp, entry = _prepare(entry, records.normalize_mood)
+    with transaction() as conn:
+        _ensure_user(conn, username)
+        cursor = conn.execute(
+            "INSERT INTO moods (username, timestamp, data) VALUES (?, ?, ?)",
+            (username, timestamp, json.dumps(entry))
+        )
+        if timestamp is not None:
+            _add_mood_to_rollups(conn, username, entry)
+        _bump_version(conn, username)
+    return cursor.lastrowid
+
+
+def insert_journal(username, entry):
+    """Appends one journal entry for the user. Returns the new row's sequence number."""
+    timestamp, entry = _prepare(entry, records.normalize_journal)
+    with transaction() as conn:
+        _ensure_user(conn, username)
+        cursor = conn.execute(
+            "INSERT INTO journals (username, timestamp, data) VALUES (?, ?, ?)",
+            (username, timestamp, json.dumps(entry))
+        )
+        _bump_version(conn, username)
+    return cursor.lastrowid
+
+
+def _insert_entries(conn, table, username, prepared):
+    """Inserts mood/journal entries as (timestamp, entry) pairs from _prepare(). Returns [(seq, stored entry)]."""
+    rows = []
+    for timestamp, entry in prepared:
+        cursor = conn.execute(
+            f"INSERT INTO {table} (username, timestamp, data) VALUES (?, ?, ?)",
+            (username, timestamp, json.dumps(entry))
+        )
+        rows.append((cursor.lastrowid, entry))
+    return rows
+
+
+def insert_moods(username, entries, after_insert=None):
+    """
+    Appends many mood entries for the user in a single transaction. Returns [(seq, stored entry)].
+    after_insert(conn, rows), if given, runs inside the same transaction (e.g. to index the new rows).
+    """
+    prepared = [_prepare(entry, records.normalize_mood) for entry in entries]
+    with metrics.span("storage.insert_moods", rows=len(entries)), transaction() as conn:
+        _ensure_user(conn, username)
+        rows = _insert_entries(conn, "moods", username, prepared)
+        for timestamp, entry in prepared:
+            if timestamp is not None:
+                _add_mood_to_rollups(conn, username, entry)
+        if after_insert is not None:
+            after_insert(conn, rows)
+        _bump_version(conn, username)
+    return rows
+
+
+def insert_journals(username, entries, after_insert=None):
+    """Appends many journal entries for the user in a single transaction. Returns [(seq, stored entry)]."""
+    prepared = [_prepare(entry, records.normalize_journal) for entry in entries]
+    with metrics.span("storage.insert_journals", rows=len(entries)), transaction() as conn:
+        _ensure_user(conn, username)
+        rows = _insert_entries(conn, "journals", username, prepared)
+        if after_insert is not None:
+            after_insert(conn, rows)
+        _bump_version(conn, username)
+    return rows
+
+
+def insert_goals(username, goals):
+    """Adds many goals for the user in a single transaction. Each goal dict must carry its own 'id'."""
+    with transaction() as conn:
+        _ensure_user(conn, username)
+        conn.executemany(
+            "INSERT INTO goals (username, id, status, due_date, data) VALUES (?, ?, ?, ?, ?)",
+            [(username, g["id"], g.get("status"), g.get("due_date"), json.dumps(g)) for g in goals]
+        )
+        for goal in goals:
+            _adjust_goal_status(conn, username, goal.get("status"), 1)
+        _bump_version(conn, username)
+
+
+def page_entries(username, table, limit, before=None):
+    """
+    Returns up to `limit` of the user's moods or journals as [(seq, entry dict)], newest first.
+    Pass the (timestamp, seq) of the last row as `before` to get the next page; paging walks the
+    (username, timestamp) index, so each page costs the same however deep it is.
+    """
+    if table not in ("moods", "journals"):
+        raise ValueError(f"Can't page {table}")
+    sql = f"SELECT seq, data FROM {table} WHERE username = ? AND timestamp IS NOT NULL" # As on load: skips unusable entries
+    params = [username]
+    if before is not None:
+        sql += " AND (timestamp < ? OR (timestamp = ? AND seq < ?))"
+        params += [before[0], before[0], before[1]]
+    rows = get_connection().execute(sql + " ORDER BY timestamp DESC, seq DESC LIMIT ?", params + [limit]).fetchall()
+    return [(r["seq"], json.loads(r["data"])) for r in rows]
+
+
+_STREAM_QUERIES = {
+    "goals": "SELECT data FROM goals WHERE username = ? ORDER BY rowid",
+    "moods": "SELECT data FROM moods WHERE username = ? ORDER BY timestamp, seq",
+    "journals": "SELECT data FROM journals WHERE username = ? ORDER BY seq",
+    "chat_history": "SELECT role, content FROM chat_history WHERE username = ? ORDER BY seq",
+    "chat_summaries": "SELECT content, message_count, created FROM chat_summaries WHERE username = ? ORDER BY seq",
+}
+
+
+def iter_rows(username, table, chunk_rows=500):
+    """
+    Yields the user's stored dicts from one collection (in the order get_user returns them), fetching
+    chunk_rows at a time, so exporting a large history never holds more than one chunk in memory.
+    """
+    cursor = get_connection().execute(_STREAM_QUERIES[table], (username,))
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return
+        for r in rows:
+            if table == "chat_history":
+                yield {"role": r["role"], "content": json.loads(r["content"])}
+            elif table == "chat_summaries":
+                yield dict(r)
+            else:
+                yield json.loads(r["data"])
+
+
+def insert_goal(username, goal):
+    """Adds one goal for the user. The goal dict must carry its own 'id'."""
+    with transaction() as conn:
+        _ensure_user(conn, username)
+        conn.execute(
+            "INSERT INTO goals (username, id, status, due_date, data) VALUES (?, ?, ?, ?, ?)",
+            (username, goal["id"], goal.get("status"), goal.get("due_date"), json.dumps(goal))
+        )
+        _adjust_goal_status(conn, username, goal.get("status"), 1)
+        _bump_version(conn, username)
+
+
+def update_goal(username, goal_id, changes):
+    """Applies the given field changes to one goal. Returns False if the goal doesn't exist."""
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT data FROM goals WHERE username = ? AND id = ?", (username, goal_id)
+        ).fetchone()
+        if row is None:
+            return False
+        goal = json.loads(row["data"])
+        _adjust_goal_status(conn, username, goal.get("status"), -1)
+        goal.update(changes)
+        _adjust_goal_status(conn, username, goal.get("status"), 1)
+        conn.execute(
+            "UPDATE goals SET status = ?, due_date = ?, data = ? WHERE username = ? AND id = ?",
+            (goal.get("status"), goal.get("due_date"), json.dumps(goal), username, goal_id)
+        )
+        _bump_version(conn, username)
+    return True
+
+
+def delete_goal(username, goal_id):
+    """Deletes one goal. Returns False if the goal doesn't exist."""
+    with transaction() as conn:
+        row = conn.execute("SELECT status FROM goals WHERE username = ? AND id = ?", (username, goal_id)).fetchone()
+        if row is None:
+            return False
+        conn.execute("DELETE FROM goals WHERE username = ? AND id = ?", (username, goal_id))
+        _adjust_goal_status(conn, username, row["status"], -1)
+        _bump_version(conn, username)
+    return True
+
+
+def append_chat_messages(username, messages):
+    """Appends chat turns ({"role", "content"} dicts) to the user's chat history."""
+    with transaction() as conn:
+        _ensure_user(conn, username)
+        conn.executemany(
+            "INSERT INTO chat_history (username, role, content) VALUES (?, ?, ?)",
+            [(username, m["role"], json.dumps(m["content"])) for m in messages]
+        )
+        # No version bump: chat isn't part of the cached record, so a new turn doesn't reload the user
+
+
+def restore_chat(username, summaries, messages):
+    """Stores a backed-up chat (summaries and messages) for a user who has none. Returns False if they already do."""
+    with transaction() as conn:
+        if conn.execute("SELECT 1 FROM chat_history WHERE username = ? UNION ALL "
+                        "SELECT 1 FROM chat_summaries WHERE username = ? LIMIT 1", (username, username)).fetchone():
+            return False
+        _ensure_user(conn, username)
+        conn.executemany(
+            "INSERT INTO chat_summaries (username, content, message_count, created) VALUES (?, ?, ?, ?)",
+            [(username, s["content"], s.get("message_count", 0), s.get("created", "")) for s in summaries]
+        )
+        conn.executemany(
+            "INSERT INTO chat_history (username, role, content) VALUES (?, ?, ?)",
+            [(username, m["role"], json.dumps(m["content"])) for m in messages]
+        )
+    return True
+
+
+# --- Whole-record helpers (auth.load_user/save_user, the legacy load_users/save_users and the importer) ---
+def _write_user(conn, username, user_data):
+    """
+    Replaces everything stored for one user with the given users.json-shaped record.
+    The chat tables are only replaced if the record carries a 'chat_history' key, and the credentials only
+    if it carries a non-empty 'password', which must already be hashed (see _with_hashed_password()).
+    """
+    extra = {
+        k: v for k, v in user_data.items()
+        if k not in COLLECTIONS and k not in CHAT_COLLECTIONS and k not in ("password", "email")
+    }
+    # An upsert rather than INSERT OR REPLACE, which would delete the row and cascade to every collection
+    conn.execute(
+        "INSERT INTO users (username, email, extra) VALUES (?, ?, ?) "
+        "ON CONFLICT(username) DO UPDATE SET email = excluded.email, extra = excluded.extra",
+        (username, user_data.get("email", ""), json.dumps(extra))
+    )
+    password = user_data.get("password")
+    if password:
+        if not passwords.is_hash(password):
+            raise ValueError(f"Password for {username} must be hashed before the write transaction")
+        conn.execute(
+            "INSERT INTO credentials (username, password_hash) VALUES (?, ?) "
+            "ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash",
+            (username, password)
+        )
+    for table in COLLECTIONS:
+        conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+    # Legacy goals had no id; give them one in the stored JSON too, or they'd load without one and
+    # could never be edited or deleted
+    goals = [g if g.get("id") else dict(g, id=f"legacy-{i}") for i, g in enumerate(user_data.get("goals", []))]
+    conn.executemany(
+        "INSERT OR REPLACE INTO goals (username, id, status, due_date, data) VALUES (?, ?, ?, ?, ?)",
+        [(username, g["id"], g.get("status"), g.get("due_date"), json.dumps(g)) for g in goals]
+    )
+    for table, normalize in (("moods", records.normalize_mood), ("journals", records.normalize_journal)):
+        prepared = [_prepare(records.as_dict(e), normalize) for e in user_data.get(table, [])]
+        conn.executemany(
+            f"INSERT INTO {table} (username, timestamp, data) VALUES (?, ?, ?)",
+            [(username, timestamp, json.dumps(e)) for timestamp, e in prepared]
+        )
+    if "chat_history" in user_data:
+        for table in CHAT_COLLECTIONS:
+            conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+        conn.executemany(
+            "INSERT INTO chat_summaries (username, content, message_count, created) VALUES (?, ?, ?, ?)",
+            [(username, s["content"], s.get("message_count", 0), s.get("created", "")) for s in user_data.get("chat_summaries", [])]
+        )
+        conn.executemany(
+            "INSERT INTO chat_history (username, role, content) VALUES (?, ?, ?)",
+            [(username, m["role"], json.dumps(m["content"])) for m in user_data["chat_history"]]
+        )
+    _rebuild_derived(conn, username)
+    _bump_version(conn, username)
+
+
+def _with_hashed_password(user_data):
+    """
+    Returns the record with a plaintext 'password' (from a legacy file) replaced by its hash. Call it before
+    opening the write transaction: each hash takes a noticeable fraction of a second by design.
+    """
+    password = user_data.get("password")
+    if password and not passwords.is_hash(password):
+        return dict(user_data, password=passwords.hash_password(password))
+    return user_data
+
+
+def replace_user(username, user_data):
+    """Overwrites one user's record (users.json shape) atomically; other users' rows are untouched."""
+    user_data = _with_hashed_password(user_data)
+    with metrics.span("storage.replace_user"), transaction() as conn:
+        _write_user(conn, username, user_data)
+
+
+def load_all_users():
+    """Returns every user's record as one users.json-shaped dict. Prefer get_user() where possible."""
+    with metrics.span("storage.load_all_users") as span:
+        users = {username: get_user(username, include_chat=True) for username in list_usernames()}
+        span.set(users=len(users))
+        return users
+
+
+def replace_all_users(users):
+    """Overwrites the whole store with a users.json-shaped dict in a single transaction."""
+    users = {username: _with_hashed_password(user_data) for username, user_data in users.items()}
+    with metrics.span("storage.replace_all_users", users=len(users)), transaction() as conn:
+        conn.execute("DELETE FROM users WHERE username NOT IN (SELECT value FROM json_each(?))",
+                     (json.dumps(list(users)),))
+        for table in ("mood_rollups", "goal_status_counts", "mood_stats", "search_docs", "search_postings",
+                      "search_stats", "journal_features", "insights"):
+            conn.execute(f"DELETE FROM {table} WHERE username NOT IN (SELECT value FROM json_each(?))",
+                         (json.dumps(list(users)),))
+        # Bump rather than drop removed users' counters so a cached copy of them is never served again
+        conn.execute("UPDATE user_versions SET version = version + 1 WHERE username NOT IN (SELECT value FROM json_each(?))",
+                     (json.dumps(list(users)),))
+        for username, user_data in users.items():
+            _write_user(conn, username, user_data)
+
+
+# --- users.json importer ---
+def import_users_json(path):
+    """One-shot import of a legacy users.json file. Returns the number of users imported."""
+    with open(path, "r") as file:
+        users = json.load(file)
+    users = {username: _with_hashed_password(user_data) for username, user_data in users.items()}
+    with transaction() as conn:
+        for username, user_data in users.items():
+            _write_user(conn, username, user_data)
+    return len(users)
+
+
+def import_users(users, batch_size=200):
+    """
+    Writes (username, users.json-shaped record) pairs from any iterable, batch_size users per transaction,
+    so a large import never holds the whole dataset in memory or the write lock for long. Returns the count.
+    """
+    count = 0
+    batch = []
+    for username, user_data in users:
+        batch.append((username, user_data))
+        if len(batch) >= batch_size:
+            count += _write_batch(batch)
+            batch = []
+    return count + (_write_batch(batch) if batch else 0)
+
+
+def _write_batch(batch):
+    batch = [(username, _with_hashed_password(user_data)) for username, user_data in batch]
+    with transaction() as conn:
+        for username, user_data in batch:
+            _write_user(conn, username, user_data)
+    return len(batch)
+
+
+def _import_legacy_file_once(conn):
+    """Imports users.json the first time an empty database is opened next to one."""
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+        return
+    users = {}
+    if os.path.exists(LEGACY_USERS_FILE) and not conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+        try:
+            with open(LEGACY_USERS_FILE, "r") as file:
+                users = json.load(file)
+        except (json.JSONDecodeError, OSError):
+            pass # A broken legacy file just means we start empty, same as load_users() did
+        # Hash the plaintext passwords before taking the write lock
+        users = {username: _with_hashed_password(user_data) for username, user_data in users.items()}
+    with transaction() as conn:
+        # Re-check under the write lock in case another session imported it first
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return
+        if not conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            for username, user_data in users.items():
+                _write_user(conn, username, user_data)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', '1')")
+
+
+def _migrate_records_once(conn):
+    """
+    Rewrites stored moods/journals into the canonical shape from records.py.
+    Runs once per records.SCHEMA_VERSION; every write path normalizes new entries after that.
+    """
+    if _schema_version(conn) >= records.SCHEMA_VERSION:
+        return
+    with metrics.span("records.normalize_all"), transaction() as conn:
+        if _schema_version(conn) >= records.SCHEMA_VERSION:
+            return # Another session migrated first
+        touched_users = set()
+        for table, normalize in (("moods", records.normalize_mood), ("journals", records.normalize_journal)):
+            for r in conn.execute(f"SELECT seq, username, data FROM {table}").fetchall():
+                timestamp, entry = _prepare(json.loads(r["data"]), normalize) # Unusable rows lose their timestamp
+                conn.execute(
+                    f"UPDATE {table} SET timestamp = ?, data = ? WHERE seq = ?", (timestamp, json.dumps(entry), r["seq"])
+                )
+                touched_users.add(r["username"])
+        for username in touched_users:
+            _bump_version(conn, username)
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('records_schema_version', ?)",
+            (str(records.SCHEMA_VERSION),)
+        )
+        conn.execute("DELETE FROM meta WHERE key = 'rollups_version'") # Rollups must be rebuilt from the new shape
+
+
+def _hash_plaintext_passwords_once(conn):
+    """Moves passwords stored in plaintext on the users row (before credentials existed) into hashed credentials."""
+    if _meta_int(conn, "passwords_hashed"):
+        return
+    # Hash outside the transaction: each hash takes a noticeable fraction of a second by design
+    plaintext = conn.execute("SELECT username, password FROM users WHERE password != ''").fetchall()
+    hashes = [(r["username"], r["password"], passwords.hash_password(r["password"])) for r in plaintext]
+    with transaction() as conn:
+        for username, password, password_hash in hashes:
+            # Skip users whose row changed meanwhile (e.g. another session migrated them first)
+            if conn.execute("UPDATE users SET password = '' WHERE username = ? AND password = ?",
+                            (username, password)).rowcount:
+                conn.execute(
+                    "INSERT INTO credentials (username, password_hash) VALUES (?, ?) "
+                    "ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash",
+                    (username, password_hash)
+                )
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('passwords_hashed', '1')")
+
+
+def _fill_legacy_goal_ids_once(conn):
+    """Writes the row id into goals imported from users.json without one, so they can be edited and deleted."""
+    if _meta_int(conn, "goal_ids_filled"):
+        return
+    with transaction() as conn:
+        users = [r["username"] for r in conn.execute(
+            "SELECT DISTINCT username FROM goals WHERE json_extract(data, '$.id') IS NULL")]
+        conn.execute("UPDATE goals SET data = json_set(data, '$.id', id) WHERE json_extract(data, '$.id') IS NULL")
+        for username in users:
+            _bump_version(conn, username)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('goal_ids_filled', '1')")
+
+
+def _build_rollups_once(conn):
+    """Builds rollups for data stored before they existed (or after a records migration)."""
+    if _meta_int(conn, "rollups_version") >= ROLLUPS_VERSION:
+        return
+    with transaction() as conn:
+        if _meta_int(conn, "rollups_version") >= ROLLUPS_VERSION:
+            return
+        _rebuild_derived(conn)
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('rollups_version', ?)", (str(ROLLUPS_VERSION),)
+        )
+
+
+def _meta_int(conn, key):
+    """Returns an integer setting from the meta table (0 if unset)."""
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return int(row["value"]) if row else 0
+
+
+def _schema_version(conn):
+    """Returns the records schema version the stored data was last migrated to (0 if never)."""
+    return _meta_int(conn, "records_schema_version")
+
+
+# --- Log compaction ---
+def compact():
+    """Folds the write-ahead log into the main database file and truncates the log."""
+    conn = _connect()
+    try:
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return busy == 0 # Non-zero means a reader held the log open; the next run will catch up
+    finally:
+        conn.close()
+
+
+def _compactor_loop():
+    """Background loop that periodically compacts the log."""
+    while True:
+        time.sleep(COMPACT_INTERVAL)
+        try:
+            compact()
+        except sqlite3.Error:
+            pass # Compaction is best-effort; the log stays valid and readable until the next attempt
+
+
+def start_compactor():
+    """Starts the background compactor once per process."""
+    global _compactor_thread
+    with _compactor_lock:
+        if _compactor_thread is None and COMPACT_INTERVAL > 0:
+            _compactor_thread = threading.Thread(target=_compactor_loop, name="soulsync-compactor", daemon=True)
+            _compactor_thread.start()
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 3 and sys.argv[1] == "import":
+        count = import_users_json(sys.argv[2])
+        print(f"Imported {count} user(s) into {DB_FILE}.")
+    elif len(sys.argv) == 2 and sys.argv[1] == "compact":
+        get_connection() # Make sure the database and its schema exist
+        print("Log compacted." if compact() else "Log partially compacted (database busy); try again later.")
+    else:
+        print("Usage: python storage.py import path/to/users.json | python storage.py compact")
+        sys.exit(1)
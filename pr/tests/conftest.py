@@ -0,0 +1,57 @@
+import os
+import sys
+import pytest
+
+# Every test gets its own empty database in a temporary directory. These are set before the app modules are
+# imported: no background compactor thread, and cheap password hashes so creating users stays fast.
+os.environ.setdefault("SOULSYNC_COMPACT_INTERVAL", "0")
+os.environ.setdefault("SOULSYNC_SCRYPT_LOG_N", "10")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import credentials
+import passwords
+import storage
+import user_cache
+
+
+def _close_connections():
+    conn = getattr(storage._local, "conn", None)
+    if conn is not None:
+        conn.close()
+        storage._local.conn = None
+    with storage._probe_lock:
+        if storage._probe_conn is not None:
+            storage._probe_conn.close()
+            storage._probe_conn = None
+
+
+@pytest.fixture(autouse=True)
+def db(tmp_path, monkeypatch):
+    """Points storage at a fresh database (and an absent users.json) under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    _close_connections()
+    monkeypatch.setattr(storage, "DB_FILE", str(tmp_path / "soulsync.db"))
+    monkeypatch.setattr(storage, "LEGACY_USERS_FILE", str(tmp_path / "users.json"))
+    user_cache.invalidate()
+    credentials._sessions.clear()
+    yield tmp_path
+    _close_connections()
+    user_cache.invalidate()
+    credentials._sessions.clear()
+
+
+@pytest.fixture
+def reopen():
+    """Returns a function that closes the database and opens it again, running the startup migrations."""
+    def reopen():
+        _close_connections()
+        user_cache.invalidate()
+        return storage.get_connection()
+    return reopen
+
+
+@pytest.fixture
+def user():
+    """Creates the account 'amy' (password 'secret') and returns the username."""
+    storage.create_user("amy", passwords.hash_password("secret"), "amy@example.com")
+    return "amy"
@@ -0,0 +1,128 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import api
+
+
+@pytest.fixture
+def port(monkeypatch):
+    """Serves the API on an ephemeral port from a background event loop; the workers are fresh per test."""
+    executor = ThreadPoolExecutor(max_workers=2) # New threads, so their connections open this test's database
+    monkeypatch.setattr(api, "_executor", executor)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(api._serve_connection, "127.0.0.1", 0, limit=api.MAX_LINE))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server.sockets[0].getsockname()[1]
+
+    async def shut_down():
+        server.close()
+        connections = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in connections:
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shut_down(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+    executor.shutdown()
+
+
+def _request(port, method, path, body=None, token=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        connection.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def _raw(port, data):
+    """Sends raw bytes and returns the status code of the response."""
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(data)
+        return int(sock.makefile("rb").readline().split()[1])
+
+
+@pytest.fixture
+def token(user, port):
+    status, body = _request(port, "POST", "/api/login", {"username": "Amy", "password": "secret"})
+    assert status == 200
+    return body["token"]
+
+
+def test_health(port):
+    assert _request(port, "GET", "/api/health") == (200, {"status": "ok"})
+
+
+def test_login_with_a_wrong_password(user, port):
+    status, body = _request(port, "POST", "/api/login", {"username": "amy", "password": "wrong"})
+    assert status == 401
+    assert "token" not in body
+
+
+def test_routes_need_a_session(port):
+    assert _request(port, "GET", "/api/moods")[0] == 401
+    assert _request(port, "GET", "/api/moods", token="made-up")[0] == 401
+
+
+def test_unknown_routes_and_methods(token, port):
+    assert _request(port, "GET", "/api/weather", token=token)[0] == 404
+    assert _request(port, "DELETE", "/api/moods", token=token)[0] == 405
+
+
+def test_moods_are_added_and_paged(token, port):
+    entries = [{"mood_text": "Calm", "timestamp": f"2024-03-0{day}T09:00:00"} for day in range(1, 4)]
+    status, body = _request(port, "POST", "/api/moods", {"entries": entries}, token)
+    assert (status, body["created"]) == (201, 3)
+
+    status, first = _request(port, "GET", "/api/moods?limit=2", token=token)
+    assert status == 200
+    assert [e["date"] for e in first["items"]] == ["2024-03-03", "2024-03-02"]
+    _, second = _request(port, "GET", f"/api/moods?limit=2&cursor={first['next_cursor']}", token=token)
+    assert [e["date"] for e in second["items"]] == ["2024-03-01"]
+    assert second["next_cursor"] is None
+
+
+def test_invalid_batches_are_rejected_whole(token, port):
+    status, body = _request(port, "POST", "/api/journals", {"entries": [{"content": "Fine"}, {"content": ""}]}, token)
+    assert status == 422
+    assert [e["index"] for e in body["errors"]] == [1]
+    assert _request(port, "GET", "/api/journals", token=token)[1]["items"] == []
+
+
+def test_bad_requests(token, port):
+    assert _request(port, "POST", "/api/goals", {"entries": []}, token)[0] == 400 # Goals come in "goals"
+    assert _request(port, "GET", "/api/goals?limit=many", token=token)[0] == 400
+    assert _request(port, "GET", "/api/goals?sort=Colour", token=token)[0] == 400
+    assert _request(port, "GET", "/api/moods?cursor=garbage", token=token)[0] == 400
+
+
+def test_goals_are_added_and_listed(token, port):
+    goals = [{"title": "Run", "due_date": "2024-06-01"}, {"title": "Read", "due_date": "2024-05-01", "status": "Completed"}]
+    assert _request(port, "POST", "/api/goals", {"goals": goals}, token)[0] == 201
+
+    _, body = _request(port, "GET", "/api/goals?sort=Due%20Date%20(Asc)&status=To%20Do", token=token)
+
+    assert body["total"] == 1
+    assert [g["title"] for g in body["items"]] == ["Run"]
+
+
+def test_logout_ends_the_session(token, port):
+    assert _request(port, "POST", "/api/logout", token=token)[0] == 200
+    assert _request(port, "GET", "/api/moods", token=token)[0] == 401
+
+
+def test_oversized_request_heads(port):
+    assert _raw(port, b"GET /api/health?" + b"x" * api.MAX_LINE + b" HTTP/1.1\r\n\r\n") == 431
+    headers = b"".join(b"X-Same: 1\r\n" for _ in range(api.MAX_HEADERS + 1))
+    assert _raw(port, b"GET /api/health HTTP/1.1\r\n" + headers + b"\r\n") == 431
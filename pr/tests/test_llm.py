@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+import httpx
+import pytest
+import llm
+import response_cache
+from services.journal import get_ai_reflection, REFLECTION_MODEL, REFLECTION_PROMPT_VERSION
+
+
+class _Stream:
+    """A streamed completion that yields `texts` and then, if given, raises `error` (as a dropped connection would)."""
+
+    def __init__(self, texts, error=None):
+        self.texts = texts
+        self.error = error
+        self.closed = False
+
+    def __iter__(self):
+        for text in self.texts:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """Serves the next completion from the _Stream this returns (set its texts and error first)."""
+    served = _Stream([])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **params: served)))
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "_breaker", llm._CircuitBreaker(llm.BREAKER_THRESHOLD, llm.BREAKER_COOLDOWN))
+    return served
+
+
+def test_complete_stream(stream):
+    stream.texts = ["Hello", " there"]
+    assert "".join(llm.stream_chat([{"role": "user", "content": "Hi"}], model="m")) == "Hello there"
+    assert stream.closed
+    assert llm._breaker.failures == 0
+
+
+@pytest.mark.parametrize("error", [httpx.ReadTimeout("timed out"), httpx.RemoteProtocolError("peer closed connection")])
+def test_transport_errors_mid_stream_count_as_failures(stream, error):
+    stream.texts, stream.error = ["Hello"], error
+    received = []
+
+    with pytest.raises(llm.LLMUnavailable, match="mid-reply"):
+        for text in llm.stream_chat([{"role": "user", "content": "Hi"}], model="m"):
+            received.append(text)
+
+    assert received == ["Hello"]
+    assert stream.closed
+    assert llm._breaker.failures == 1
+
+
+def test_reflection_keeps_the_partial_reply_and_adds_the_error(stream):
+    stream.texts, stream.error = ["You sound"], httpx.ReadTimeout("timed out")
+
+    reflection = "".join(get_ai_reflection("A long day.", "amy"))
+
+    assert reflection.startswith("You sound\n\nI'm sorry")
+    assert "mid-reply" in reflection
+    assert response_cache.get(response_cache.make_key(
+        REFLECTION_MODEL, REFLECTION_PROMPT_VERSION, response_cache.fingerprint("amy"), "A long day.")) is None
@@ -0,0 +1,63 @@
+import datetime
+import storage
+from mood_series import MoodSeries, to_micros, from_micros
+
+
+def _mood(timestamp, mood_text="Happy", mood_value=5, **extra):
+    return dict({"timestamp": timestamp, "mood_text": mood_text, "mood_emoji": "😀", "mood_value": mood_value,
+                 "description": ""}, **extra)
+
+
+def test_from_dicts_sorts_by_time():
+    series = MoodSeries.from_dicts([_mood("2024-01-03T09:00:00"), _mood("2024-01-01T09:00:00", "Sad", 1),
+                                    _mood("2024-01-02T09:00:00")])
+
+    assert [r.timestamp.day for r in series] == [1, 2, 3]
+    assert series.values() == [1, 5, 5]
+    assert [r.mood_text for r in series.latest(2)] == ["Happy", "Happy"]
+    assert [r.timestamp.day for r in series.between(datetime.datetime(2024, 1, 2), datetime.datetime(2024, 1, 3, 9))] == [2, 3]
+    assert series.first_timestamp() == datetime.datetime(2024, 1, 1, 9)
+
+
+def test_from_dicts_skips_entries_that_never_normalized():
+    series = MoodSeries.from_dicts([{"date": "someday"}, _mood("2024-01-01T09:00:00")])
+    assert len(series) == 1
+
+
+def test_from_dicts_skips_and_logs_a_broken_entry(caplog):
+    broken = _mood("2024-01-02T09:00:00")
+    del broken["mood_emoji"]
+
+    series = MoodSeries.from_dicts([_mood("not a timestamp"), broken, _mood("2024-01-01T09:00:00")])
+
+    assert len(series) == 1
+    assert [r.levelname for r in caplog.records] == ["WARNING", "WARNING"]
+
+
+def test_records_carry_their_extra_keys():
+    series = MoodSeries.from_dicts([_mood("2024-01-01T09:00:00", source="daylio"), _mood("2024-01-02T09:00:00")])
+    assert series[0].data["source"] == "daylio"
+    assert "source" not in series[1].data
+
+
+def test_codes_hold_more_labels_than_a_byte():
+    series = MoodSeries()
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(300):
+        series.add(start + datetime.timedelta(minutes=i), f"Mood {i}", "❓", None)
+    assert series.codes.typecode == "h"
+    assert series[-1].mood_text == "Mood 299"
+
+
+def test_aware_datetimes_become_local_time():
+    aware = datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone.utc)
+    assert from_micros(to_micros(aware)) == aware.astimezone().replace(tzinfo=None)
+
+
+def test_saved_and_loaded_through_storage(user):
+    series = MoodSeries.from_dicts([_mood("2024-01-02T09:00:00", description="walk"), _mood("2024-01-01T09:00:00", "Sad", 1)])
+    storage.replace_user("amy", {"email": "", "moods": series})
+
+    loaded = storage.get_user("amy")["moods"]
+
+    assert [r.data for r in loaded] == [r.data for r in series]
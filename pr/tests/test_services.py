@@ -0,0 +1,98 @@
+import datetime
+import pytest
+import storage
+from services import MoodService, JournalService, GoalService
+from services.batch import ValidationError, MAX_BATCH, parse_timestamp
+
+NOON = datetime.datetime(2024, 3, 1, 12)
+
+
+def test_mood_entry_is_validated():
+    entry = MoodService.new_entry("Calm", None, None, NOON)
+    assert (entry["mood_emoji"], entry["description"], entry["date"], entry["time"]) == ("😌", "", "2024-03-01", "12:00:00")
+    with pytest.raises(ValueError, match="Unknown mood"):
+        MoodService.new_entry("Meh", None, "", NOON)
+    with pytest.raises(ValueError, match="must be text"):
+        MoodService.new_entry("Calm", None, 42, NOON)
+
+
+def test_journal_entry_is_validated():
+    assert JournalService.new_entry("  Dear diary  ", NOON)["content"] == "Dear diary"
+    for content in (None, "", "   "):
+        with pytest.raises(ValueError, match="write something"):
+            JournalService.new_entry(content, NOON)
+    with pytest.raises(ValueError, match="must be text"):
+        JournalService.new_entry(["not", "text"], NOON)
+
+
+def test_goal_is_validated():
+    goal = GoalService.new_goal({"title": " Run ", "due_date": "2024-05-01"})
+    assert (goal["title"], goal["status"], goal["due_date"]) == ("Run", "To Do", "2024-05-01")
+    assert goal["id"] != GoalService.new_goal({"title": "Run"})["id"]
+    for item, message in (({}, "cannot be empty"), ({"title": "Run", "status": "Done"}, "Unknown status"),
+                          ({"title": "Run", "due_date": "May 1st"}, "Invalid due_date")):
+        with pytest.raises(ValueError, match=message):
+            GoalService.new_goal(item)
+
+
+def test_parse_timestamp():
+    assert parse_timestamp("2024-03-01T12:00:00") == NOON
+    aware = datetime.datetime(2024, 3, 1, 12, tzinfo=datetime.timezone.utc)
+    assert parse_timestamp(aware.isoformat()) == aware.astimezone().replace(tzinfo=None)
+    with pytest.raises(ValueError, match="Invalid timestamp"):
+        parse_timestamp("yesterday")
+
+
+def test_batch_is_saved_whole_or_not_at_all(user):
+    with pytest.raises(ValidationError) as raised:
+        MoodService(user).add_many([{"mood_text": "Happy"}, "Sad", {"mood_text": "Meh"}, {"mood_text": "Calm"}])
+    assert [e["index"] for e in raised.value.errors] == [1, 2]
+    assert storage.page_entries(user, "moods", 10) == []
+
+    seqs = MoodService(user).add_many([{"mood_text": "Happy", "timestamp": "2024-03-01T09:00:00"},
+                                       {"mood_text": "Calm", "description": "tea"}])
+    assert len(seqs) == 2
+    assert len(MoodService(user).moods()) == 2
+
+
+@pytest.mark.parametrize("entries", [[], {"mood_text": "Happy"}, [{"mood_text": "Happy"}] * (MAX_BATCH + 1)])
+def test_batch_shape_is_checked(user, entries):
+    with pytest.raises(ValidationError) as raised:
+        MoodService(user).add_many(entries)
+    assert raised.value.errors[0]["index"] is None
+
+
+def test_goal_batch(user):
+    with pytest.raises(ValidationError):
+        GoalService(user).add_many([{"title": "Run"}, {"title": ""}])
+    assert GoalService(user).list() == []
+
+    GoalService(user).add_many([{"title": "Run", "due_date": "2024-06-01"}, {"title": "Read", "due_date": "2024-05-01"}])
+    assert [g["title"] for g in GoalService(user).list(sort_by="Due Date (Asc)")] == ["Read", "Run"]
+
+
+def test_history_pages_follow_the_cursor(user):
+    JournalService(user).add_many([{"content": f"Entry {day}", "timestamp": f"2024-03-0{day}T21:00:00"} for day in range(1, 6)])
+    service = JournalService(user)
+
+    pages, cursor = [], None
+    while True:
+        page = service.history_page(2, cursor)
+        pages.append([e["content"] for e in page.items])
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+
+    assert pages == [["Entry 5", "Entry 4"], ["Entry 3", "Entry 2"], ["Entry 1"]]
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        service.history_page(2, "garbage")
+
+
+def test_recent_is_newest_first(user):
+    JournalService(user).add_many([{"content": "Older", "timestamp": "2024-03-01T09:00:00"},
+                                   {"content": "Newest", "timestamp": "2024-03-03T09:00:00"},
+                                   {"content": "Middle", "timestamp": "2024-03-02T09:00:00"}])
+    MoodService(user).add("Happy")
+
+    assert [r.content for r in JournalService(user).recent(2)] == ["Newest", "Middle"]
+    assert MoodService(user).recent(1)[0].mood_text == "Happy"
@@ -0,0 +1,185 @@
+import datetime
+import json
+import sqlite3
+import credentials
+import mood_analytics
+import passwords
+import storage
+
+
+def _local(iso):
+    return datetime.datetime.fromisoformat(iso).astimezone().replace(tzinfo=None).isoformat()
+
+
+def test_legacy_users_json_is_imported_on_first_start(db):
+    (db / "users.json").write_text(json.dumps({"amy": {
+        "password": "secret",
+        "email": "amy@example.com",
+        "theme": "dark",
+        "goals": [{"name": "Run", "status": "In progress"}, {"title": "Read", "status": "Completed"}],
+        "moods": [{"date": "2024-01-02", "time": "08:30:00", "mood": "happy", "notes": "sunny"},
+                  {"timestamp": "2024-01-03T12:00:00+00:00", "mood_text": "Sad"}],
+        "journals": [{"date": "2024-01-02", "content": "Dear diary"}],
+    }}))
+
+    user_data = storage.get_user("amy")
+
+    assert user_data["email"] == "amy@example.com"
+    assert user_data["theme"] == "dark"
+    assert passwords.is_hash(storage.get_password_hash("amy"))
+    assert credentials.check_password("amy", "secret")
+    assert [g["id"] for g in user_data["goals"]] == ["legacy-0", "legacy-1"]
+    assert storage.update_goal("amy", "legacy-0", {"status": "Completed"})
+    first, second = user_data["moods"]
+    assert (first.mood_text, first.mood_value, first.description) == ("Happy", 5, "sunny")
+    assert first.timestamp == datetime.datetime(2024, 1, 2, 8, 30)
+    assert second.data["timestamp"] == _local("2024-01-03T12:00:00+00:00")
+    assert [j.content for j in user_data["journals"]] == ["Dear diary"]
+
+
+def test_unusable_legacy_moods_are_kept_but_not_counted(db):
+    (db / "users.json").write_text(json.dumps({"amy": {"password": "secret", "moods": [
+        {"timestamp": "not-a-date", "mood_text": "Happy"},
+        {"mood_text": "Sad"},
+        {"timestamp": "2024-01-01T09:00:00", "mood_text": "Calm"},
+    ]}}))
+
+    user_data = storage.get_user("amy")
+
+    assert [r.mood_text for r in user_data["moods"]] == ["Calm"]
+    conn = storage.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM moods WHERE timestamp IS NULL").fetchone()[0] == 2
+    assert [r[0] for r in conn.execute("SELECT DISTINCT mood_text FROM mood_rollups")] == ["Calm"]
+    assert [e["mood_text"] for _, e in storage.page_entries("amy", "moods", 10)] == ["Calm"]
+    assert mood_analytics.summary("amy")["days_tracked"] == 1
+
+
+def test_unusable_moods_are_not_rolled_up_on_write(user):
+    storage.insert_mood("amy", {"timestamp": "yesterday", "mood_text": "Happy"})
+    storage.insert_moods("amy", [{"timestamp": "2024-01-01T09:00:00", "mood_text": "Sad"}, {"mood_text": "Happy"}])
+    storage.replace_user("amy", {"email": "", "moods": [{"timestamp": "", "mood_text": "Angry"}]})
+
+    conn = storage.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM moods").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM mood_rollups").fetchone()[0] == 0
+    assert len(storage.get_user("amy")["moods"]) == 0
+
+
+def test_unusable_rows_from_older_databases_lose_their_timestamp(user, reopen):
+    conn = storage.get_connection()
+    conn.execute("INSERT INTO moods (username, timestamp, data) VALUES (?, ?, ?)",
+                 ("amy", "not-a-date", json.dumps({"timestamp": "not-a-date", "mood_text": "Happy"})))
+    conn.execute("DELETE FROM meta WHERE key IN ('records_schema_version', 'rollups_version')")
+
+    conn = reopen()
+
+    assert [r[0] for r in conn.execute("SELECT timestamp FROM moods")] == [None]
+    assert conn.execute("SELECT COUNT(*) FROM mood_rollups").fetchone()[0] == 0
+    assert len(storage.get_user("amy")["moods"]) == 0
+
+
+def test_legacy_file_is_not_imported_over_existing_data(db, user, reopen):
+    (db / "users.json").write_text(json.dumps({"sam": {"password": "pw", "moods": []}}))
+    reopen()
+    assert storage.list_usernames() == ["amy"]
+
+
+def test_old_records_are_migrated_once(user, reopen):
+    conn = storage.get_connection()
+    conn.execute("INSERT INTO moods (username, timestamp, data) VALUES (?, ?, ?)",
+                 ("amy", None, json.dumps({"date": "2024-02-01", "time": "09:00:00", "mood": "calm", "notes": "tea"})))
+    conn.execute("INSERT INTO moods (username, timestamp, data) VALUES (?, ?, ?)",
+                 ("amy", "2024-02-01T10:00:00+00:00", json.dumps({"timestamp": "2024-02-01T10:00:00+00:00", "mood_text": "Meh"})))
+    conn.execute("INSERT INTO goals (username, id, status, due_date, data) VALUES (?, ?, ?, ?, ?)",
+                 ("amy", "7", "In progress", None, json.dumps({"title": "Swim", "status": "In progress"})))
+    conn.execute("DELETE FROM meta WHERE key IN ('records_schema_version', 'goal_ids_filled')")
+
+    reopen()
+    user_data = storage.get_user("amy")
+
+    calm, meh = user_data["moods"]
+    assert (calm.mood_text, calm.mood_value, calm.description) == ("Calm", 3.5, "tea")
+    assert meh.data["timestamp"] == _local("2024-02-01T10:00:00+00:00")
+    assert meh.mood_value is None
+    assert [g["id"] for g in user_data["goals"]] == ["7"]
+    assert storage.delete_goal("amy", "7")
+    assert storage._schema_version(storage.get_connection()) == storage.records.SCHEMA_VERSION
+
+
+def test_plaintext_passwords_are_hashed_on_start(user, reopen):
+    conn = storage.get_connection()
+    conn.execute("DELETE FROM credentials WHERE username = 'amy'")
+    conn.execute("UPDATE users SET password = 'hunter2' WHERE username = 'amy'")
+    conn.execute("DELETE FROM meta WHERE key = 'passwords_hashed'")
+
+    conn = reopen()
+
+    assert conn.execute("SELECT password FROM users WHERE username = 'amy'").fetchone()[0] == ""
+    assert credentials.check_password("amy", "hunter2")
+
+
+def test_rollups_table_from_before_value_count_is_upgraded(db):
+    old = sqlite3.connect(storage.DB_FILE)
+    old.executescript("""
+        CREATE TABLE mood_rollups (username TEXT NOT NULL, period TEXT NOT NULL, bucket TEXT NOT NULL,
+            mood_text TEXT NOT NULL, count INTEGER NOT NULL, value_sum REAL NOT NULL,
+            PRIMARY KEY (username, period, bucket, mood_text));
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        INSERT INTO meta VALUES ('rollups_version', '1');
+    """)
+    old.close()
+
+    conn = storage.get_connection()
+
+    assert "value_count" in {r["name"] for r in conn.execute("PRAGMA table_info(mood_rollups)")}
+    assert storage._meta_int(conn, "rollups_version") == storage.ROLLUPS_VERSION
+
+
+def test_unknown_moods_stay_out_of_the_means(user):
+    storage.replace_user("amy", {"email": "", "moods": [
+        {"timestamp": "2024-03-01T09:00:00", "mood_text": "Happy"},
+        {"timestamp": "2024-03-01T10:00:00", "mood_text": "Meh"},
+        {"timestamp": "2024-03-02T09:00:00", "mood_text": "Sad"},
+    ]})
+
+    summary = mood_analytics.summary("amy")
+
+    assert summary["days_tracked"] == 2
+    assert summary["latest_daily_mean"] == 1.0
+    assert summary["moving_average_7d"] == 3.0
+    assert len(storage.get_user("amy")["moods"]) == 3
+
+
+def test_replace_user_round_trip_keeps_extra_keys(user):
+    storage.replace_user("amy", {
+        "email": "amy@example.com",
+        "goals": [{"id": "g1", "title": "Run", "status": "In progress", "due_date": "2024-05-01"}],
+        "moods": [{"timestamp": "2024-03-01T09:00:00", "mood_text": "Happy", "source": "daylio"}],
+        "journals": [{"timestamp": "2024-03-01T21:00:00", "content": "Good day", "tags": ["work"]}],
+    })
+    loaded = storage.get_user("amy")
+
+    storage.replace_user("amy", loaded)
+    reloaded = storage.get_user("amy")
+
+    assert reloaded["moods"][0].data == loaded["moods"][0].data
+    assert reloaded["moods"][0].data["source"] == "daylio"
+    assert reloaded["journals"][0].data["tags"] == ["work"]
+    assert list(reloaded["goals"]) == list(loaded["goals"])
+    assert credentials.check_password("amy", "secret") # No 'password' key: the credentials are left alone
+
+
+def test_replace_user_hashes_a_plaintext_password(user):
+    storage.replace_user("amy", {"email": "", "password": "new-secret"})
+    assert passwords.is_hash(storage.get_password_hash("amy"))
+    assert credentials.check_password("amy", "new-secret")
+
+
+def test_page_entries_walks_newest_first(user):
+    storage.insert_moods("amy", [{"timestamp": f"2024-03-0{day}T09:00:00", "mood_text": "Happy"} for day in range(1, 6)])
+
+    first = storage.page_entries("amy", "moods", 2)
+    last_seq, last = first[-1]
+    second = storage.page_entries("amy", "moods", 10, (last["timestamp"], last_seq))
+
+    assert [e["date"] for _, e in first + second] == [f"2024-03-0{day}" for day in range(5, 0, -1)]
@@ -0,0 +1,121 @@
+import io
+import pytest
+import storage
+import transfer
+import user_cache
+from services import TransferService
+
+
+def _snapshot(username):
+    user_cache.invalidate()
+    user_data = storage.get_user(username, include_chat=True)
+    return {
+        "email": user_data["email"],
+        "password": user_data["password"],
+        # Restored goals are rebuilt by GoalService.new_goal, so compare the fields a backup carries
+        "goals": [(g["id"], g.get("title") or g.get("name"), g.get("description") or "", g.get("due_date"), g["status"])
+                  for g in user_data["goals"]],
+        "moods": [r.data for r in user_data["moods"]],
+        "journals": [r.data for r in user_data["journals"]],
+        "chat_history": user_data["chat_history"],
+        "chat_summaries": user_data["chat_summaries"],
+    }
+
+
+def _export(fmt, **kwargs):
+    out = io.StringIO(newline="")
+    transfer.write_records(transfer.export_records(**kwargs), out, fmt)
+    return out.getvalue()
+
+
+def _import(text, fmt, **kwargs):
+    return transfer.import_records(transfer.read_records(io.StringIO(text, newline=""), fmt), **kwargs)
+
+
+@pytest.fixture
+def history(user):
+    storage.replace_user(user, {
+        "email": "amy@example.com",
+        "goals": [{"id": "g1", "title": "Run", "description": "5k", "status": "In Progress", "due_date": "2024-05-01"},
+                  {"name": "Read", "status": "To Do"}],
+        "moods": [{"timestamp": "2024-03-01T09:00:00", "mood_text": "Happy", "description": "sun, \"finally\""},
+                  {"timestamp": "2024-03-02T09:00:00", "mood_text": "Sad"}],
+        "journals": [{"timestamp": "2024-03-01T21:00:00", "content": "Line one\nline two"}],
+        "chat_summaries": [{"content": "Talked about running", "message_count": 2, "created": "2024-03-01"}],
+        "chat_history": [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}],
+    })
+    return user
+
+
+@pytest.mark.parametrize("fmt", transfer.FORMATS)
+def test_backup_restores_into_an_empty_store(history, fmt):
+    before = _snapshot(history)
+    backup = _export(fmt)
+
+    storage.replace_all_users({})
+    report = _import(backup, fmt)
+
+    assert report.invalid == 0, report.errors
+    assert _snapshot(history) == before
+
+
+@pytest.mark.parametrize("fmt", transfer.FORMATS)
+def test_importing_twice_adds_nothing(history, fmt):
+    backup = _export(fmt)
+    before = _snapshot(history)
+
+    report = _import(backup, fmt)
+
+    assert report.imported == 0
+    assert report.invalid == 0
+    assert _snapshot(history) == before
+
+
+def test_exported_records_only_carry_their_kinds_fields(history):
+    records = list(transfer.export_records(["amy"], transfer.PERSONAL_KINDS))
+
+    assert {r["kind"] for r in records} == {"goal", "mood", "journal"}
+    for record in records:
+        assert set(record) <= {"user", "kind", *transfer.KIND_FIELDS[record["kind"]]}
+        assert record["user"] == "amy"
+    assert [r["title"] for r in records if r["kind"] == "goal"] == ["Run", "Read"]
+
+
+def test_goals_without_ids_are_matched_on_content(user):
+    text = "user,kind,title,description,due_date\namy,goal,Swim,Twice a week,2024-06-01\n"
+
+    first = _import(text, "csv")
+    second = _import(text, "csv")
+
+    assert (first.imported, second.imported, second.duplicates) == (1, 0, 1)
+    assert [g["title"] for g in storage.get_user("amy")["goals"]] == ["Swim"]
+
+
+def test_invalid_records_are_reported_and_skipped(user):
+    text = "\n".join([
+        '{"user": "amy", "kind": "mood", "timestamp": "2024-03-01T09:00:00", "mood_text": "happy"}',
+        '{"user": "amy", "kind": "mood", "timestamp": "yesterday", "mood_text": "Happy"}',
+        '{"user": "amy", "kind": "weather"}',
+        'not json',
+    ])
+
+    report = _import(text, "jsonl")
+
+    assert report.imported == 1
+    assert [number for number, _ in report.errors] == [2, 3, 4]
+    assert storage.get_user("amy")["moods"][0].mood_text == "Happy"
+
+
+def test_plaintext_account_passwords_are_refused(db):
+    report = _import('{"user": "sam", "kind": "account", "password_hash": "hunter2"}', "jsonl")
+    assert report.invalid == 1
+    assert storage.get_password_hash("sam") is None
+
+
+@pytest.mark.parametrize("fmt", transfer.FORMATS)
+def test_in_app_download_uploads_into_another_account(history, fmt):
+    with TransferService(history).export(fmt) as export_file:
+        report = TransferService("sam").import_file(export_file, TransferService.file_name(fmt))
+
+    assert (report.imported, report.invalid) == (5, 0)
+    assert _snapshot("sam")["moods"] == _snapshot(history)["moods"]
@@ -0,0 +1,96 @@
+import math
+import re
+from collections import Counter
+import pandas as pd
+
+# Small, dependency-free text helpers shared by the journal search index and text analysis:
+# tokenizing, n-gram counting and lexicon-based sentiment scoring.
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are aren't as at be because been before being below
+between both but by can can't cannot could couldn't did didn't do does doesn't doing don't down during each
+few for from further had hadn't has hasn't have haven't having he he'd he'll he's her here here's hers herself
+him himself his how how's i i'd i'll i'm i've if in into is isn't it it's its itself just let's me more most
+mustn't my myself no nor not now of off on once only or other ought our ours ourselves out over own really
+same shan't she she'd she'll she's should shouldn't so some such than that that's the their theirs them
+themselves then there there's these they they'd they'll they're they've this those through to too under until
+up very was wasn't we we'd we'll we're we've were weren't what what's when when's where where's which while
+who who's whom why why's will with won't would wouldn't you you'd you'll you're you've your yours yourself
+yourselves also get got feel feeling felt today im ive dont
+""".split())
+
+
+def tokenize(text):
+    """Lowercases text and returns its words, without stopwords or single characters."""
+    return [w for w in _WORD_RE.findall(text.lower()) if len(w) > 1 and w not in STOPWORDS]
+
+
+def tokenize_series(texts):
+    """
+    Tokenizes a pandas Series of texts like tokenize(), with vectorized string operations.
+    Returns one row per token, indexed by the position of its text in `texts`.
+    """
+    tokens = pd.Series(texts).reset_index(drop=True).fillna("").str.lower().str.findall(_WORD_RE).explode()
+    tokens = tokens.dropna()
+    return tokens[(tokens.str.len() > 1) & ~tokens.isin(STOPWORDS)]
+
+
+def ngrams(tokens, n):
+    """Returns the n-grams of a token list as space-joined strings."""
+    return [" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+
+
+def term_counts(tokens, max_n=2):
+    """Counts the unigrams and bigrams (up to max_n-grams) of a token list."""
+    counts = Counter(tokens)
+    for n in range(2, max_n + 1):
+        counts.update(ngrams(tokens, n))
+    return counts
+
+
+# --- Sentiment ---
+# Valence of common words in personal writing, from -3 (very negative) to +3 (very positive).
+_LEXICON_SOURCE = {
+    3: "amazing awesome blessed ecstatic excellent fantastic joy joyful love loved loving overjoyed thrilled wonderful",
+    2: "accomplished beautiful brave calm celebrate cheerful confident delighted energized enjoy enjoyed excited "
+       "fun glad grateful great happy hope hopeful inspired laugh laughed lovely motivated peaceful positive "
+       "productive proud refreshed relaxed relieved safe smile smiled strong success successful supported thankful",
+    1: "better comfortable content easy fine friendly gentle good helpful interesting kind nice okay ok progress "
+       "rest rested ready relax support win",
+    -1: "annoyed awkward bored busy confused distracted meh odd restless sick sore tired tense uncertain uneasy weird",
+    -2: "afraid alone angry anxious anxiety ashamed bad burnout conflict cry cried crying disappointed drained "
+        "embarrassed exhausted fail failed failure fear frustrated guilty hurt insecure irritated jealous lonely "
+        "lost mad nervous overwhelmed pain panic pressure regret sad scared stress stressed struggle struggling "
+        "unhappy upset worried worry worse",
+    -3: "awful depressed depression despair devastated hate hated hopeless horrible miserable terrible worst worthless"
+}
+SENTIMENT_LEXICON = {word: weight for weight, words in _LEXICON_SOURCE.items() for word in words.split()}
+_NEGATORS = frozenset("not no never nothing nobody without hardly isn't wasn't aren't weren't don't doesn't didn't "
+                      "can't cannot couldn't won't wouldn't shouldn't haven't hasn't hadn't".split())
+_INTENSIFIERS = {"very": 1.5, "really": 1.4, "so": 1.3, "extremely": 1.8, "incredibly": 1.7, "too": 1.3,
+                 "slightly": 0.6, "somewhat": 0.7, "little": 0.7}
+_NEGATION_SCOPE = 3 # Words after a negator whose valence is flipped
+_NORMALIZATION = 15 # Larger values make scores approach +-1 more slowly
+
+
+def sentiment(text):
+    """
+    Scores text from -1 (very negative) to +1 (very positive) with the word lexicon above, flipping the
+    words shortly after a negation ("not happy") and scaling those after an intensifier ("very tired").
+    """
+    total, negated_for, boost = 0.0, 0, 1.0
+    for word in _WORD_RE.findall(text.lower()):
+        if word in _NEGATORS:
+            negated_for = _NEGATION_SCOPE
+            continue
+        if word in _INTENSIFIERS:
+            boost = _INTENSIFIERS[word]
+            continue
+        weight = SENTIMENT_LEXICON.get(word)
+        if weight is not None:
+            total += weight * boost * (-0.75 if negated_for else 1) # "not happy" is milder than "unhappy"
+        boost = 1.0
+        negated_for = max(negated_for - 1, 0)
+    return total / math.sqrt(total * total + _NORMALIZATION)
@@ -0,0 +1,387 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import passwords
+import storage
+from records import MOOD_EMOJIS
+from services.mood import MoodService
+from services.journal import JournalService
+from services.goals import GoalService
+from services.batch import parse_timestamp
+
+# Streaming import and export of moods, journal entries and goals (and, for whole-store backups, accounts
+# and chat), in three file formats:
+#   jsonl     one record per line:  {"user": "amy", "kind": "mood", "timestamp": ..., "mood_text": ..., ...}
+#   csv       one record per row, with the columns in CSV_FIELDS (blank where a kind doesn't use them)
+#   columnar  one line per chunk of up to CHUNK_ROWS records of one kind, as column lists:
+#             {"kind": "mood", "columns": {"user": [...], "timestamp": [...], ...}}, ready to load as a
+#             DataFrame or a Parquet row group (pyarrow.Table.from_pydict(line["columns"]))
+#   python transfer.py export backup.jsonl [--user amy ...] [--format jsonl|csv|columnar]
+#   python transfer.py import daylio.csv --user amy [--format csv]
+# Both directions work on generators: export reads the database CHUNK_ROWS rows at a time and import writes
+# CHUNK_ROWS entries per transaction, so memory stays flat whatever the file size. (The in-app download is
+# built the same way, into a temporary file, but Streamlit then serves the finished file from memory.)
+# Imported entries are validated and built by the same service methods the app uses, and entries already
+# stored (same timestamp and content; for goals the same id, or the same title, description and due date if
+# the file has no ids) are skipped, so importing the same file twice adds nothing the second time.
+
+CHUNK_ROWS = int(os.environ.get("SOULSYNC_TRANSFER_CHUNK", "500")) # Rows read or written per step
+MAX_REPORTED_ERRORS = 100 # Invalid records beyond this are counted but not listed
+
+KIND_FIELDS = {
+    "account": ("email", "password_hash"),
+    "goal": ("id", "title", "description", "due_date", "status"),
+    "mood": ("timestamp", "mood_text", "mood_emoji", "description"),
+    "journal": ("timestamp", "content"),
+    "chat_summary": ("content", "message_count", "created"),
+    "chat": ("role", "content"),
+}
+KINDS = tuple(KIND_FIELDS) # Also the order each user's records are exported in
+PERSONAL_KINDS = ("goal", "mood", "journal") # What users can download and upload themselves in the app
+CSV_FIELDS = ("user", "kind") + tuple(dict.fromkeys(f for fields in KIND_FIELDS.values() for f in fields))
+FORMATS = ("jsonl", "csv", "columnar")
+
+_TABLES = {"goal": "goals", "mood": "moods", "journal": "journals", "chat_summary": "chat_summaries", "chat": "chat_history"}
+_MOOD_LABELS = {label.lower(): label for label in MOOD_EMOJIS} # Other trackers write 'happy' or 'HAPPY'
+
+
+def guess_format(path):
+    """Returns the format for a file name by its extension. Raises ValueError if it can't tell."""
+    name = path.lower()
+    if name.endswith((".columnar.jsonl", ".columnar.json")):
+        return "columnar"
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    if name.endswith(".csv"):
+        return "csv"
+    raise ValueError(f"Can't tell the format of '{path}'; expected .jsonl, .csv or .columnar.jsonl.")
+
+
+# --- Export ---
+def _export_record(username, kind, row):
+    """
+    Returns the record for one stored row: the kind's fields only (legacy goals' 'name' as their 'title'),
+    then user and kind, so nothing in the stored dict can override those two.
+    """
+    record = {field: row[field] for field in KIND_FIELDS[kind] if row.get(field) is not None}
+    if kind == "goal" and not row.get("title") and row.get("name"):
+        record["title"] = row["name"]
+    record["user"], record["kind"] = username, kind
+    return record
+
+
+def export_records(usernames=None, kinds=KINDS, chunk_rows=CHUNK_ROWS):
+    """
+    Yields {"user", "kind", ...fields} records for the given users (everyone by default), one user at a time,
+    reading each collection from the database chunk_rows rows at a time.
+    """
+    for username in usernames if usernames is not None else storage.list_usernames():
+        if "account" in kinds:
+            account = storage.get_account(username)
+            if account is None:
+                continue
+            yield {"user": username, "kind": "account", "email": account["email"],
+                   "password_hash": storage.get_password_hash(username) or ""}
+        for kind in kinds:
+            if kind == "account":
+                continue
+            for row in storage.iter_rows(username, _TABLES[kind], chunk_rows):
+                yield _export_record(username, kind, row)
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    return value if isinstance(value, (str, int, float)) else json.dumps(value, ensure_ascii=False)
+
+
+def write_records(records, out, fmt, chunk_rows=CHUNK_ROWS):
+    """Writes records to a text stream in the given format, chunk_rows at a time. Returns how many were written."""
+    count = 0
+    if fmt == "jsonl":
+        for chunk in _chunks(records, chunk_rows):
+            out.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in chunk)
+            count += len(chunk)
+    elif fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for chunk in _chunks(records, chunk_rows):
+            writer.writerows({k: _csv_value(v) for k, v in record.items()} for record in chunk)
+            count += len(chunk)
+    elif fmt == "columnar":
+        chunk, kind = [], None
+        for record in records:
+            if chunk and (record["kind"] != kind or len(chunk) >= chunk_rows):
+                count += _write_column_chunk(out, kind, chunk)
+                chunk = []
+            kind = record["kind"]
+            chunk.append(record)
+        if chunk:
+            count += _write_column_chunk(out, kind, chunk)
+    else:
+        raise ValueError(f"Unknown format '{fmt}' (expected one of: {', '.join(FORMATS)}).")
+    return count
+
+
+def _write_column_chunk(out, kind, chunk):
+    fields = ("user",) + KIND_FIELDS[kind]
+    columns = {field: [record.get(field) for record in chunk] for field in fields}
+    out.write(json.dumps({"kind": kind, "columns": columns}, ensure_ascii=False) + "\n")
+    return len(chunk)
+
+
+# --- Import ---
+def read_records(stream, fmt):
+    """Yields the records in a text stream, one at a time. Lines that can't be parsed are yielded as None."""
+    if fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+    elif fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield {k: v for k, v in row.items() if k is not None and v not in (None, "")}
+    elif fmt == "columnar":
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                chunk = json.loads(line)
+                columns = chunk["columns"]
+                names = list(columns)
+                rows = zip(*(columns[name] for name in names))
+            except (ValueError, KeyError, TypeError):
+                yield None
+                continue
+            for values in rows:
+                yield {"kind": chunk.get("kind"), **{k: v for k, v in zip(names, values) if v is not None}}
+    else:
+        raise ValueError(f"Unknown format '{fmt}' (expected one of: {', '.join(FORMATS)}).")
+
+
+class ImportReport:
+    """What an import did: entries added, duplicates skipped, and the invalid records (by position in the file)."""
+
+    def __init__(self):
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = [] # (record number, message), the first MAX_REPORTED_ERRORS only
+
+    def error(self, number, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, message))
+
+    def summary(self):
+        return f"Imported {self.imported}, skipped {self.duplicates} duplicate(s) and {self.invalid} invalid record(s)."
+
+
+def _content_key(timestamp, *content):
+    """Identifies a mood or journal entry by its time and content, for spotting ones already stored."""
+    return hashlib.blake2b(json.dumps([timestamp, *content]).encode(), digest_size=16).digest()
+
+
+def _mood_key(entry):
+    return _content_key(entry.get("timestamp"), "mood", entry.get("mood_text"), entry.get("description") or "")
+
+
+def _journal_key(entry):
+    return _content_key(entry.get("timestamp"), "journal", entry.get("content") or "")
+
+
+def _goal_key(goal):
+    """Identifies a goal by its content, for goals imported without an id."""
+    return _content_key(None, "goal", (goal.get("title") or goal.get("name") or "").strip(),
+                        goal.get("description") or "", goal.get("due_date") or None)
+
+
+def _required_timestamp(record):
+    if not record.get("timestamp"):
+        raise ValueError("A timestamp is required to import an entry.")
+    return parse_timestamp(record["timestamp"])
+
+
+class _UserImport:
+    """Imports one user's records: validates, skips duplicates and buffers entries into chunked writes."""
+
+    def __init__(self, username, report, chunk_rows):
+        self.username = username
+        self.report = report
+        self.chunk_rows = chunk_rows
+        self.pending = {"mood": [], "journal": [], "goal": []}
+        self.known = {} # kind -> keys (for goals, ids and content keys) already stored, loaded on the first such record
+        self.chat_summaries, self.chat = [], [] # A chat is restored whole, and only for users without one
+
+    def _is_new(self, kind, key):
+        if kind not in self.known:
+            if kind == "goal":
+                self.known[kind] = {key for g in storage.iter_rows(self.username, "goals") for key in (g.get("id"), _goal_key(g))}
+            else:
+                key_of = _mood_key if kind == "mood" else _journal_key
+                self.known[kind] = {key_of(e) for e in storage.iter_rows(self.username, _TABLES[kind])}
+        if key in self.known[kind]:
+            self.report.duplicates += 1
+            return False
+        self.known[kind].add(key)
+        return True
+
+    def add(self, kind, record):
+        """Validates one record and queues it (or applies it, for accounts). Raises ValueError if it is invalid."""
+        if kind == "mood":
+            mood_text = str(record.get("mood_text") or record.get("mood") or "").strip()
+            entry = MoodService.new_entry(
+                _MOOD_LABELS.get(mood_text.lower(), mood_text), record.get("mood_emoji"),
+                record.get("description") or record.get("notes"), _required_timestamp(record)
+            )
+            key = _mood_key(entry)
+        elif kind == "journal":
+            entry = JournalService.new_entry(record.get("content"), _required_timestamp(record))
+            key = _journal_key(entry)
+        elif kind == "goal":
+            entry = GoalService.new_goal(record)
+            if record.get("id"):
+                entry["id"] = str(record["id"]) # Keep ids from backups, so restoring twice is a no-op
+                key = entry["id"]
+            else:
+                key = _goal_key(entry) # Files from elsewhere have no ids; match on content instead
+        elif kind == "account":
+            return self._add_account(record)
+        elif kind == "chat_summary":
+            if not isinstance(record.get("content"), str):
+                raise ValueError("A chat summary's content must be text.")
+            self.chat_summaries.append({"content": record["content"], "message_count": int(record.get("message_count") or 0),
+                                        "created": str(record.get("created") or "")})
+            return
+        else: # chat
+            if record.get("role") not in ("user", "assistant") or record.get("content") is None:
+                raise ValueError("A chat message needs a role (user or assistant) and content.")
+            self.chat.append({"role": record["role"], "content": record["content"]})
+            return
+        if self._is_new(kind, key):
+            self.pending[kind].append(entry)
+            if len(self.pending[kind]) >= self.chunk_rows:
+                self._write(kind)
+
+    def _add_account(self, record):
+        password_hash = record.get("password_hash") or ""
+        if not passwords.is_hash(password_hash):
+            raise ValueError("An account needs its password_hash, as exported (plaintext passwords aren't imported).")
+        if storage.get_account(self.username) is None:
+            storage.create_user(self.username, password_hash, str(record.get("email") or ""))
+            self.report.imported += 1
+        elif storage.get_password_hash(self.username) is None: # Created by earlier entries in the same file
+            storage.set_password_hash(self.username, password_hash)
+            self.report.imported += 1
+        else:
+            self.report.duplicates += 1 # Never overwrite the password of an existing account
+
+    def _write(self, kind):
+        entries, self.pending[kind] = self.pending[kind], []
+        if not entries:
+            return
+        if kind == "mood":
+            MoodService(self.username).store_many(entries)
+        elif kind == "journal":
+            JournalService(self.username).store_many(entries)
+        else:
+            storage.insert_goals(self.username, entries)
+        self.report.imported += len(entries)
+
+    def finish(self):
+        for kind in self.pending:
+            self._write(kind)
+        if self.chat or self.chat_summaries:
+            count = len(self.chat) + len(self.chat_summaries)
+            if storage.restore_chat(self.username, self.chat_summaries, self.chat):
+                self.report.imported += count
+            else:
+                self.report.duplicates += count
+
+
+def import_records(records, username=None, kinds=KINDS, chunk_rows=CHUNK_ROWS):
+    """
+    Imports records (as read_records yields them). Each goes to its "user", or to `username` for every record
+    when given. Invalid records are reported and skipped; the rest are written chunk_rows per transaction,
+    skipping entries already stored. Returns an ImportReport.
+    """
+    report = ImportReport()
+    current = None
+    for number, record in enumerate(records, 1):
+        try:
+            if not isinstance(record, dict):
+                raise ValueError("Not a valid record.")
+            kind = record.get("kind")
+            if kind not in kinds:
+                raise ValueError(f"Unknown kind '{kind}' (expected one of: {', '.join(kinds)}).")
+            user = username or str(record.get("user") or "").strip() # Backups keep usernames exactly as stored
+            if not user:
+                raise ValueError("The record has no user.")
+            if current is None or current.username != user:
+                if current is not None:
+                    current.finish() # Records come grouped by user, so only one user's state is kept at a time
+                current = _UserImport(user, report, chunk_rows)
+            current.add(kind, record)
+        except ValueError as e:
+            report.error(number, str(e))
+    if current is not None:
+        current.finish()
+    return report
+
+
+def _open(path, mode):
+    if path == "-":
+        stream = sys.stdout if "w" in mode else sys.stdin
+        return io.TextIOWrapper(stream.buffer, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8" if "w" in mode else "utf-8-sig", newline="") # utf-8-sig: spreadsheet CSVs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream SoulSync data to or from JSONL, CSV or columnar files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write users' data to a file ('-' for stdout)")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--user", action="append", help="only this user (repeatable); everyone by default")
+    export_parser.add_argument("--kinds", default=",".join(KINDS), help=f"comma-separated, from: {', '.join(KINDS)}")
+    import_parser = commands.add_parser("import", help="add the records in a file ('-' for stdin)")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--user", help="import every record into this user, ignoring the file's 'user' column")
+    import_parser.add_argument("--kinds", default=",".join(KINDS), help=f"comma-separated, from: {', '.join(KINDS)}")
+    for command_parser in (export_parser, import_parser):
+        command_parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension's")
+    args = parser.parse_args()
+
+    try:
+        fmt = args.format or guess_format(args.path)
+    except ValueError as e:
+        parser.error(str(e))
+    kinds = tuple(k for k in args.kinds.split(",") if k)
+    if any(k not in KINDS for k in kinds):
+        parser.error(f"--kinds must be from: {', '.join(KINDS)}")
+    if args.command == "export":
+        with _open(args.path, "w") as out:
+            written = write_records(export_records(args.user, kinds), out, fmt)
+        print(f"Exported {written} record(s) as {fmt}.", file=sys.stderr)
+    else:
+        with _open(args.path, "r") as stream:
+            result = import_records(read_records(stream, fmt), args.user and args.user.strip().lower(), kinds)
+        for number, message in result.errors:
+            print(f"Record {number}: {message}", file=sys.stderr)
+        print(result.summary(), file=sys.stderr)
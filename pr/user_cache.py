@@ -0,0 +1,97 @@
+import threading
+import storage
+
+# Streamlit reruns the whole script on every click, and each page asks for the user's data again.
+# This process-wide cache keeps one parsed copy of each user's record and only goes back to the
+# database when that user's data has actually changed.
+#
+# Every cached record is stamped with the store's data_version (which changes on any commit, from any
+# session or process) and the user's own version counter. If data_version hasn't moved, the record is
+# served without touching the database at all. If it has, one indexed lookup of the user's counter tells
+# us whether it was this user's data that changed before we pay for a reload.
+
+_lock = threading.Lock()
+_entries = {} # username -> {"data_version": int, "user_version": int, "data": dict, "derived": dict}
+_stats = {"hits": 0, "misses": 0, "revalidations": 0}
+
+
+def _current_entry(username):
+    """Returns the user's cache entry if it is still up to date (re-stamping it if needed), else None."""
+    current_data_version = storage.data_version()
+    with _lock:
+        entry = _entries.get(username)
+        if entry and entry["data_version"] == current_data_version:
+            _stats["hits"] += 1
+            return entry
+
+    # Something was written since we cached this user; check whether it was them
+    user_version = storage.get_user_version(username)
+    with _lock:
+        entry = _entries.get(username)
+        if entry and entry["user_version"] == user_version:
+            entry["data_version"] = current_data_version
+            _stats["hits"] += 1
+            _stats["revalidations"] += 1
+            return entry
+    return None
+
+
+def _load_entry(username):
+    """Loads the user from the database into a fresh cache entry. Returns None for unknown users."""
+    current_data_version = storage.data_version()
+    user_version = storage.get_user_version(username)
+    data = storage.get_user(username)
+    with _lock:
+        _stats["misses"] += 1
+        if data is None:
+            _entries.pop(username, None)
+            return None
+        entry = {"data_version": current_data_version, "user_version": user_version, "data": data, "derived": {}}
+        _entries[username] = entry
+        return entry
+
+
+def get_user(username):
+    """
+    Returns the user's record (users.json shape), or None for unknown users.
+    The returned dict is shared between sessions: read from it, but write through auth/storage instead.
+    """
+    entry = _current_entry(username) or _load_entry(username)
+    return _view(entry) if entry else None
+
+
+def derived(username, name, compute):
+    """
+    Returns a value computed from the user's data (e.g. an aggregate), memoized alongside their record.
+    compute() is only called again after the user's data changes.
+    """
+    entry = _current_entry(username) or _load_entry(username)
+    if entry is None:
+        return compute()
+    with _lock:
+        if name in entry["derived"]:
+            return entry["derived"][name]
+    value = compute()
+    with _lock:
+        entry["derived"][name] = value
+    return value
+
+
+def _view(entry):
+    """Returns a per-caller copy of the top-level record so callers can't swap out the cached lists."""
+    return dict(entry["data"])
+
+
+def invalidate(username=None):
+    """Drops one user's cached record, or every user's if no username is given."""
+    with _lock:
+        if username is None:
+            _entries.clear()
+        else:
+            _entries.pop(username, None)
+
+
+def stats():
+    """Returns hit/miss counters and the number of cached users."""
+    with _lock:
+        return dict(_stats, cached_users=len(_entries))